@@ -0,0 +1,1063 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Headless benchmark suite for Jaaw!. It runs the real Window under the offscreen Qt platform, against generated
+# image folders and a local HTTP server standing in for the web sites it downloads from, and saves latency
+# percentiles, peak RSS and event loop blocking time for every scenario as JSON, so runs can be compared:
+#
+#     python benchmark.py --output before.json
+#     python benchmark.py --output after.json
+#     python benchmark.py --compare before.json after.json
+
+import argparse
+import collections
+import hashlib
+import http.server
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import jaaw
+from jaaw import QtWidgets, QtCore, QtGui
+
+_FORMAT_VERSION = 1
+_SCENARIOS = ("image_hd", "image_uhd", "image_large", "carousel_hd", "carousel_uhd", "carousel_large",
+              "chrome", "chrome_degraded", "chrome_offline", "bing", "video", "url", "url_snapshot",
+              "youtube", "control", "modes")
+_SERVER_IMAGES = 12
+_WARNINGS = []
+_WARNING_NAMES = {jaaw._SETTINGS_WARNING: "settings", jaaw._IMG_WARNING: "image", jaaw._FOLDER_WARNING: "folder",
+                  jaaw._VID_WARNING: "video", jaaw._YT_WARNING: "youtube", jaaw._CHROME_WARNING: "chrome",
+                  jaaw._BING_WARNING: "bing", jaaw._WEB_WARNING: "web", jaaw._HELP_MSG: "help"}
+
+_LOGGER = logging.getLogger("jaaw.benchmark")
+
+# Stand-in for YouTube IFrame player API: same calls and events jaaw uses, each video being just a colored page.
+# Ids starting with "bad" fail as not found videos. Frame counts are reported as jaaw's injected script does, with 20%
+# of frames dropped over "large" quality for ids starting with "drop". Players of ids starting with "noquality" have
+# no setPlaybackQuality()
+_YT_STUB = """
+var YT = {PlayerState: {UNSTARTED: -1, ENDED: 0, PLAYING: 1, PAUSED: 2, BUFFERING: 3, CUED: 5}};
+YT.Player = function (id, options) {
+    var self = this;
+    var events = options.events || {};
+    var element = document.getElementById(id);
+    var fire = function (name, data) {
+        if (events[name]) {
+            events[name]({target: self, data: data});
+        }
+    };
+    var setState = function (state) {
+        self.state = state;
+        fire("onStateChange", state);
+    };
+    self.state = -1;
+    self.videoId = options.videoId;
+    self.quality = "default";
+    self.frames = {dropped: 0, total: 0};
+    self.mute = function () {};
+    self.getIframe = function () { return null; };
+    if (self.videoId.indexOf("noquality") !== 0) {
+        self.setPlaybackQuality = function (quality) { self.quality = quality; };
+    }
+    self.seekTo = function () {};
+    self.pauseVideo = function () { setState(2); };
+    self.playVideo = function () {
+        if (self.videoId.indexOf("bad") === 0) {
+            setTimeout(function () { fire("onError", 100); }, 20);
+            return;
+        }
+        setState(3);
+        setTimeout(function () { setState(1); }, 50);
+    };
+    self.loadVideoById = function (videoId) {
+        self.videoId = videoId.videoId || videoId;
+        element.textContent = self.videoId;
+        setState(-1);
+        self.playVideo();
+    };
+    element.style.background = "#234";
+    element.textContent = self.videoId;
+    setTimeout(function () { fire("onReady"); }, 20);
+    setInterval(function () {
+        if (self.state === 1) {
+            var heavy = ["hd720", "hd1080", "hd1440", "hd2160", "default"].indexOf(self.quality) >= 0;
+            self.frames.total += 15;
+            self.frames.dropped += self.videoId.indexOf("drop") === 0 && heavy ? 3 : 0;
+        }
+        window.postMessage({jaaw: "quality", dropped: self.frames.dropped, total: self.frames.total, height: 720}, "*");
+    }, 500);
+};
+setTimeout(onYouTubeIframeAPIReady, 0);
+"""
+
+
+def summarize(values):
+    # Latency percentiles (linear interpolation between closest ranks), in milliseconds
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def percentile(p):
+        k = (len(values) - 1) * p / 100
+        f = int(k)
+        c = min(f + 1, len(values) - 1)
+        return values[f] + (values[c] - values[f]) * (k - f)
+
+    return {"count": len(values), "min": round(values[0], 2), "mean": round(sum(values) / len(values), 2),
+            "p50": round(percentile(50), 2), "p90": round(percentile(90), 2), "p99": round(percentile(99), 2),
+            "max": round(values[-1], 2)}
+
+
+def toMB(size):
+    return round(size / (1024 * 1024), 1)
+
+
+def readProcStatus(pid="self"):
+    # Name, parent and memory of a process, from Linux /proc (None if not available)
+    status = {}
+    try:
+        with open("/proc/%s/status" % pid, encoding="UTF-8") as file:
+            for line in file:
+                key, _, value = line.partition(":")
+                if key == "Name":
+                    status["name"] = value.strip()
+                elif key == "PPid":
+                    status["ppid"] = int(value)
+                elif key in ("VmRSS", "VmHWM"):
+                    status[key] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    return status
+
+
+def getChildProcesses():
+    # All descendants of this process as (name, rss). Chromium helpers (QtWebEngineProcess) are launched by Qt
+    if os.path.isdir("/proc"):
+        procs = {}
+        for pid in os.listdir("/proc"):
+            if pid.isdigit():
+                status = readProcStatus(pid)
+                if status is not None and "ppid" in status:
+                    procs[int(pid)] = status
+        children = []
+        parents = {os.getpid()}
+        while True:
+            found = [pid for pid, status in procs.items() if status["ppid"] in parents and pid not in parents]
+            if not found:
+                break
+            parents.update(found)
+            children.extend((procs[pid]["name"], procs[pid].get("VmRSS", 0)) for pid in found)
+        return children
+    elif psutil is not None:
+        children = []
+        for proc in psutil.Process().children(recursive=True):
+            try:
+                children.append((proc.name(), proc.memory_info().rss))
+            except psutil.Error:
+                pass
+        return children
+    return []
+
+
+def getWebEngineProcesses(children=None):
+    children = getChildProcesses() if children is None else children
+    # Process names are truncated to 15 chars in /proc
+    return len([name for name, _ in children if name.startswith("QtWebEngineProc")])
+
+
+class MemoryProbe:
+    # Peak RSS of this process. On Linux, the kernel high water mark (VmHWM) can be reset for every scenario.
+    # Elsewhere, RSS is sampled on every LoopMonitor tick, so very short peaks may be missed
+
+    def __init__(self):
+
+        self.pageSize = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self.resettable = False
+        self.peak = 0
+
+    def getRss(self):
+        try:
+            with open("/proc/self/statm", encoding="UTF-8") as file:
+                return int(file.read().split()[1]) * self.pageSize
+        except (OSError, ValueError, IndexError):
+            pass
+        if psutil is not None:
+            return psutil.Process().memory_info().rss
+        return 0
+
+    def reset(self):
+        try:
+            with open("/proc/self/clear_refs", "w", encoding="UTF-8") as file:
+                file.write("5")
+            self.resettable = True
+        except OSError:
+            self.resettable = False
+        self.peak = self.getRss()
+
+    def sample(self):
+        self.peak = max(self.peak, self.getRss())
+
+    def mark(self):
+        # Starts a nested measure (e.g. a single load) without losing the scenario peak. Returns current RSS
+        self.peak = self.getPeak()
+        rss = self.getRss()
+        if self.resettable:
+            try:
+                with open("/proc/self/clear_refs", "w", encoding="UTF-8") as file:
+                    file.write("5")
+            except OSError:
+                pass
+        return rss
+
+    def getPeakSince(self, rss):
+        # Peak growth (in bytes) over given RSS since last mark(). Without a resettable HWM this is just the RSS delta
+        if self.resettable:
+            status = readProcStatus()
+            if status is not None:
+                return max(0, status.get("VmHWM", 0) - rss)
+        return max(0, self.getRss() - rss)
+
+    def getPeak(self):
+        self.sample()
+        if self.resettable:
+            status = readProcStatus()
+            if status is not None:
+                return max(self.peak, status.get("VmHWM", 0))
+        return self.peak
+
+
+class LoopMonitor(QtCore.QObject):
+    # Heartbeat timer. Any delay over its interval means the GUI thread was busy (blocked) meanwhile
+
+    def __init__(self, memory, interval=5, threshold=16, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.memory = memory
+        self.interval = interval
+        self.threshold = threshold
+        self.last = time.perf_counter()
+        self.stalls = []
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.onTick)
+
+    def start(self):
+        self.reset()
+        self.timer.start()
+
+    def reset(self):
+        self.last = time.perf_counter()
+        self.stalls = []
+
+    @QtCore.pyqtSlot()
+    def onTick(self):
+        now = time.perf_counter()
+        lag = (now - self.last) * 1000 - self.interval
+        self.last = now
+        if lag > self.threshold:
+            self.stalls.append(lag)
+        self.memory.sample()
+
+    def stats(self):
+        return {"max": round(max(self.stalls), 2) if self.stalls else 0.0, "total": round(sum(self.stalls), 2),
+                "stalls": len(self.stalls)}
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    # Routes of the stand-in server:
+    #   /catalog.json[?degraded=1]      Chromecast catalog (degraded: 1/3 slow images, 1/3 missing)
+    #   /bing/today.json, /bing/archive.json
+    #   /img/N.jpg, /slow/N.jpg, /missing/N.jpg, /page/N.html
+    #   /yt/iframe_api.js               YouTube player API
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def do_GET(self):
+        self.respond()
+
+    def respond(self, head=False):
+        server = self.server
+        url = urllib.parse.urlparse(self.path)
+        path = url.path
+        if server.failing:
+            self.send(503, b"", "text/plain", head)
+        elif path == "/catalog.json":
+            degraded = "degraded" in urllib.parse.parse_qs(url.query)
+            catalog = [{"url": server.imageUrl(i, degraded)} for i in range(server.catalogSize)]
+            self.send(200, json.dumps(catalog).encode("utf-8"), "application/json", head)
+        elif path == "/bing/today.json":
+            self.send(200, json.dumps({"url": server.imageUrl(0)}).encode("utf-8"), "application/json", head)
+        elif path == "/bing/archive.json":
+            archive = [server.imageUrl(i) for i in range(server.catalogSize)]
+            self.send(200, json.dumps(archive).encode("utf-8"), "application/json", head)
+        elif path.startswith("/img/") or path.startswith("/slow/"):
+            try:
+                index = int(path.rsplit("/", 1)[-1].split(".")[0])
+            except ValueError:
+                self.send(404, b"", "text/plain", head)
+                return
+            if path.startswith("/slow/"):
+                time.sleep(server.delay)
+            data = server.images[index % len(server.images)]
+            etag = '"%s-%d"' % (hashlib.sha1(data).hexdigest()[:16], index)
+            if self.headers.get("If-None-Match", "") == etag:
+                self.send(304, b"", "image/jpeg", head=True, etag=etag)
+            else:
+                self.send(200, data, "image/jpeg", head, etag=etag)
+        elif path.startswith("/page/"):
+            page = ("<html><head><title>Jaaw! benchmark</title></head>"
+                    "<body style='margin:0;height:100vh;background:linear-gradient(45deg,#123,#%s)'>"
+                    "<h1 style='color:#fff'>%s</h1></body></html>") % (hashlib.sha1(path.encode()).hexdigest()[:3],
+                                                                       path)
+            self.send(200, page.encode("utf-8"), "text/html", head)
+        elif path == "/yt/iframe_api.js":
+            self.send(200, _YT_STUB.encode("utf-8"), "application/javascript", head)
+        else:
+            self.send(404, b"", "text/plain", head)
+
+    def send(self, status, data, contentType, head=False, etag=""):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", str(len(data)))
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            if not head:
+                self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # Racing downloads are aborted as soon as one of them wins
+            pass
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, images, delay=3.0):
+        http.server.ThreadingHTTPServer.__init__(self, ("127.0.0.1", 0), StandInHandler)
+
+        self.images = images
+        self.delay = delay
+        self.catalogSize = len(images) * 2
+        self.failing = False
+        self.baseUrl = "http://127.0.0.1:%d" % self.server_address[1]
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def imageUrl(self, index, degraded=False):
+        route = "img"
+        if degraded:
+            route = ("slow", "missing", "img")[index % 3]
+        return "%s/%s/%d.jpg" % (self.baseUrl, route, index)
+
+    def pageUrl(self, index):
+        return "%s/page/%d.html" % (self.baseUrl, index)
+
+
+class StandInWebutils:
+    # Same calls jaaw makes to kalmatools webutils, but pointing to the stand-in server. They block, as real ones do
+
+    def __init__(self, server, timeout=10):
+
+        self.server = server
+        self.timeout = timeout
+
+    def getJson(self, path):
+        with urllib.request.urlopen(self.server.baseUrl + path, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def getChromecastImages(self):
+        return {"chromecast": self.getJson("/catalog.json")}
+
+    def getBingTodayImage(self):
+        return self.getJson("/bing/today.json")["url"]
+
+    def getBingImages(self):
+        return self.getJson("/bing/archive.json")
+
+    def httpPing(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout):
+                return True
+        except OSError:
+            return False
+
+
+class BenchWindow(jaaw.Window):
+    # There is no desktop to attach to when running offscreen, and nobody to close message boxes
+
+    def sendBehind(self):
+        pass
+
+    def showWarning(self, msg):
+        _WARNINGS.append(_WARNING_NAMES.get(msg, str(msg)))
+
+
+def makeImage(path, width, height, seed):
+    # Gradient plus random shapes, so images are not trivially compressed (nor decoded)
+    rnd = random.Random(seed)
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    painter = QtGui.QPainter(image)
+    gradient = QtGui.QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0, QtGui.QColor(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    gradient.setColorAt(1, QtGui.QColor(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    painter.fillRect(image.rect(), QtGui.QBrush(gradient))
+    for _ in range(60):
+        color = QtGui.QColor(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256), rnd.randrange(64, 200))
+        painter.setBrush(color)
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.drawEllipse(rnd.randrange(width), rnd.randrange(height),
+                            rnd.randrange(width // 8, width // 2), rnd.randrange(height // 8, height // 2))
+    painter.end()
+    if not image.save(path, quality=90):
+        raise OSError("Unable to save benchmark image %s" % path)
+
+
+def makeFolder(folder, count, width, height, seed):
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for i in range(count):
+        path = os.path.join(folder, "img%03d.jpg" % i)
+        makeImage(path, width, height, seed + i)
+        files.append(path)
+    return files
+
+
+def makeServerImages(count, width=1920, height=1080):
+    images = []
+    for i in range(count):
+        buffer = QtCore.QBuffer()
+        buffer.open(QtCore.QIODevice.WriteOnly)
+        image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+        image.fill(QtGui.QColor((i * 37) % 256, (i * 91) % 256, (i * 53) % 256))
+        image.save(buffer, "JPG", 90)
+        images.append(bytes(buffer.data()))
+        buffer.close()
+    return images
+
+
+def isModuleAvailable(name):
+    # Checked in a separate process, so it doesn't take memory from other scenarios (and native libraries it
+    # depends on are actually loaded)
+    try:
+        return subprocess.run([sys.executable, "-c", "from PyQt5 import %s" % name], capture_output=True,
+                              timeout=60).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def getRevision():
+    try:
+        output = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                                timeout=5, cwd=os.path.dirname(os.path.abspath(jaaw.__file__)))
+        return output.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class Scenario:
+
+    def __init__(self, name):
+
+        self.name = name
+        self.latencies = collections.OrderedDict()
+        self.info = collections.OrderedDict()
+        self.errors = []
+
+    def add(self, metric, ms):
+        self.latencies.setdefault(metric, []).append(ms)
+
+
+class Benchmark:
+
+    def __init__(self, app, args, workFolder):
+
+        self.app = app
+        self.args = args
+        self.workFolder = workFolder
+        self.width, self.height = args.size
+        self.timeout = args.timeout
+        self.memory = MemoryProbe()
+        self.monitor = LoopMonitor(self.memory, parent=app)
+        self.folders = {}
+        self.server = None
+        self.win = None
+        self.fetched = None
+        self.hasWeb = isModuleAvailable("QtWebEngineWidgets")
+        self.hasVideo = isModuleAvailable("QtMultimedia")
+        self.results = collections.OrderedDict()
+
+    def pump(self, seconds):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self.app.processEvents(QtCore.QEventLoop.AllEvents | QtCore.QEventLoop.WaitForMoreEvents)
+
+    def waitFor(self, condition, timeout=None):
+        deadline = time.perf_counter() + (self.timeout if timeout is None else timeout)
+        while not condition():
+            if time.perf_counter() > deadline:
+                return False
+            self.app.processEvents(QtCore.QEventLoop.AllEvents | QtCore.QEventLoop.WaitForMoreEvents)
+        return True
+
+    @staticmethod
+    def measure(func):
+        start = time.perf_counter()
+        func()
+        return (time.perf_counter() - start) * 1000
+
+    def measureUntil(self, scenario, metric, func, condition):
+        # Latency of func() plus everything it triggers asynchronously, until condition() is met
+        warnings = len(_WARNINGS)
+        start = time.perf_counter()
+        func()
+        done = self.waitFor(lambda: condition() or len(_WARNINGS) > warnings)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not done:
+            scenario.errors.append("%s: timeout after %d s" % (metric, self.timeout))
+        elif len(_WARNINGS) > warnings:
+            scenario.errors.append("%s: %s warning" % (metric, _WARNINGS[-1]))
+        else:
+            scenario.add(metric, elapsed)
+        return done
+
+    def setup(self):
+        folder = os.path.join(self.workFolder, "images")
+        sets = (("hd", 1920, 1080, self.args.images), ("uhd", 3840, 2160, self.args.images),
+                ("large", self.args.large[0], self.args.large[1], min(4, self.args.images)))
+        for i, (name, width, height, count) in enumerate(sets):
+            if any(scenario.endswith("_" + name) for scenario in self.args.scenarios) or \
+                    (name == "hd" and ("modes" in self.args.scenarios or "control" in self.args.scenarios)):
+                start = time.perf_counter()
+                self.folders[name] = makeFolder(os.path.join(folder, name), count, width, height, i * 1000)
+                _LOGGER.info("Generated %d %dx%d images in %.1f s" % (count, width, height,
+                                                                      time.perf_counter() - start))
+
+        self.server = StandInServer(makeServerImages(_SERVER_IMAGES), delay=self.args.delay)
+        self.server.start()
+        jaaw._CHROME_CATALOG_URL = self.server.baseUrl + "/catalog.json"
+        jaaw._YT_API_URL = self.server.baseUrl + "/yt/iframe_api.js"
+        jaaw.webutils = StandInWebutils(self.server)
+
+        with open(os.path.join(os.path.dirname(os.path.abspath(jaaw.__file__)), "resources", "settings.json"),
+                  encoding="UTF-8") as file:
+            config = json.load(file)
+        hdFiles = self.folders.get("hd", [""])
+        config.update({"mode": jaaw._IMGMODE, "img_mode": jaaw._IMGFIXED, "img": hdFiles[0],
+                       "img_size_mode": jaaw._FIT, "folder": os.path.dirname(hdFiles[0]), "img_period": 3600,
+                       "video": self.args.video or "", "url": [self.server.pageUrl(0), self.server.pageUrl(1)],
+                       "url_index": 0, "url_snapshot": False, "yt_index": 0,
+                       "yt_url": ["https://youtube.com/watch?v=stubA", "https://youtube.com/watch?v=stubB"],
+                       "chrome_last": "", "bing_last": "", "pause_when_hidden": False,
+                       "backend_idle_secs": 1, "web_timeout_secs": 10})
+        with open(jaaw._SETTINGS_FILE, "w", encoding="UTF-8") as file:
+            json.dump(config, file, indent=4)
+
+    def startWindow(self):
+        scenario = Scenario("startup")
+        self.memory.reset()
+        self.monitor.start()
+        start = time.perf_counter()
+        self.win = BenchWindow()
+        self.win.show()
+        scenario.add("window", (time.perf_counter() - start) * 1000)
+        if self.waitFor(lambda: self.win.firstPaint and self.win.contentStarted):
+            scenario.add("first_paint", (time.perf_counter() - start) * 1000)
+        else:
+            scenario.errors.append("first paint: timeout")
+        self.win.fetcher.imgFetched.connect(self.onImgFetched)
+        self.win.fetcher.fetchFailed.connect(self.onFetchFailed)
+        self.results["startup"] = self.collect(scenario)
+
+    def onImgFetched(self, mode, path, fresh):
+        # Connected after Window's own slot, so the image is already on screen when this runs
+        self.fetched = "fresh" if fresh else "offline"
+
+    def onFetchFailed(self, mode):
+        self.fetched = "failed"
+
+    def getWebLoads(self, **match):
+        # Pages loaded, either in the view or swapped in from the pool
+        return self.win.metrics.getHistogram("jaaw_web_load_ms", page="url", **match)["count"]
+
+    def isVideoPlaying(self):
+        player = self.win.videoPlayer
+        return player is not None and player.isPlaying()
+
+    def getSnapshots(self):
+        return self.win.metrics.getHistogram("jaaw_web_load_ms", page="snapshot")["count"]
+
+    def isYTPlaying(self, videoId):
+        player = self.win.ytPlayer
+        return player is not None and player.isPlaying() and player.videoId == videoId
+
+    def applyConfig(self, **changes):
+        # Same path as the tray menu: change config, save it and let Window reload it
+        self.win.menu.config.update(changes)
+        self.win.menu.saveSettings()
+
+    def switchTo(self, scenario, metric, **changes):
+        self.fetched = None
+        mode = changes.get("mode", self.win.menu.config["mode"])
+        webMode = changes.get("web_mode", self.win.menu.config["web_mode"])
+        videoMode = changes.get("video_mode", self.win.menu.config["video_mode"])
+        if mode == jaaw._WEBMODE and webMode in (jaaw._CHROMEMODE, jaaw._BINGMODE):
+            # Otherwise today's image would be taken from cache, without downloading anything
+            self.win.menu.config["chrome_last"] = self.win.menu.config["bing_last"] = ""
+            condition = lambda: self.fetched is not None
+        elif mode == jaaw._WEBMODE and webMode == jaaw._URLMODE and \
+                changes.get("url_snapshot", self.win.menu.config.get("url_snapshot", False)):
+            snapshots = self.getSnapshots()
+            condition = lambda: self.getSnapshots() > snapshots
+        elif mode == jaaw._WEBMODE and webMode == jaaw._URLMODE:
+            loads = self.getWebLoads()
+            condition = lambda: self.getWebLoads() > loads
+        elif mode == jaaw._VIDMODE and videoMode == jaaw._VIDYT:
+            # Done when requested video plays (switched in place when player page is already shown)
+            url = self.win.menu.config["yt_url"][changes.get("yt_index", self.win.menu.config["yt_index"])]
+            videoId = url.split("watch?v=")[1]
+            condition = lambda: self.isYTPlaying(videoId)
+        elif mode == jaaw._VIDMODE and self.isVideoPlaying():
+            # Local videos are switched without stopping current one: done when the other player takes over
+            player, switches = self.win.videoPlayer, self.win.videoPlayer.switches
+            condition = lambda: player.switches > switches and player.isPlaying()
+        elif mode == jaaw._VIDMODE:
+            condition = self.isVideoPlaying
+        else:
+            condition = lambda: bool(self.win.currentImg)
+        return self.measureUntil(scenario, metric, lambda: self.applyConfig(**changes), condition)
+
+    def refetch(self, scenario, metric, mode):
+        # What start() does for Chromecast / Bing when today's image is not downloaded yet
+        self.fetched = None
+        self.win.hideAll()
+        if mode == jaaw._CHROMEMODE:
+            self.win.chromeLast = ""
+            func = self.win.loadChrome
+        else:
+            self.win.bingLast = ""
+            func = self.win.loadBing
+        self.measureUntil(scenario, metric, func, lambda: self.fetched is not None)
+        return self.fetched
+
+    def getBackends(self):
+        win = self.win
+        return [name for name, backend in (("label", win.bkg_label), ("video", win.videoPlayer),
+                                           ("web", win.webView), ("youtube", win.ytPlayer)) if backend is not None]
+
+    def collect(self, scenario):
+        self.pump(0.05)
+        children = getChildProcesses()
+        result = collections.OrderedDict()
+        result["latency_ms"] = collections.OrderedDict((metric, summarize(values))
+                                                       for metric, values in scenario.latencies.items())
+        result["blocking_ms"] = self.monitor.stats()
+        result["memory_mb"] = {"rss_peak": toMB(self.memory.getPeak()), "rss_end": toMB(self.memory.getRss()),
+                               "children_rss": toMB(sum(rss for _, rss in children))}
+        result["webengine_processes"] = getWebEngineProcesses(children)
+        result["backends"] = self.getBackends()
+        result.update(scenario.info)
+        result["warnings"] = list(_WARNINGS)
+        result["errors"] = scenario.errors
+        return result
+
+    def run(self):
+        self.setup()
+        self.startWindow()
+        for name in self.args.scenarios:
+            reason = self.getSkipReason(name)
+            if reason:
+                self.results[name] = {"skipped": reason}
+                _LOGGER.info("Skipping %s: %s" % (name, reason))
+                continue
+            _LOGGER.info("Running %s" % name)
+            random.seed(self.args.seed)
+            del _WARNINGS[:]
+            scenario = Scenario(name)
+            self.pump(0.05)
+            self.memory.reset()
+            self.monitor.reset()
+            try:
+                if name.startswith("image_"):
+                    self.benchImage(scenario, self.folders[name.split("_", 1)[1]])
+                elif name.startswith("carousel_"):
+                    self.benchCarousel(scenario, self.folders[name.split("_", 1)[1]])
+                elif name.startswith("chrome"):
+                    self.benchChrome(scenario, name)
+                elif name == "bing":
+                    self.benchBing(scenario)
+                elif name == "video":
+                    self.benchVideo(scenario)
+                elif name == "url":
+                    self.benchUrl(scenario)
+                elif name == "url_snapshot":
+                    self.benchUrlSnapshot(scenario)
+                elif name == "youtube":
+                    self.benchYouTube(scenario)
+                elif name == "control":
+                    self.benchControl(scenario, self.folders["hd"])
+                elif name == "modes":
+                    self.benchModes(scenario)
+            except Exception as e:
+                _LOGGER.exception("Scenario %s failed" % name)
+                scenario.errors.append("%s: %s" % (type(e).__name__, e))
+            self.results[name] = self.collect(scenario)
+        self.win.closeAll()
+        self.server.stop()
+        return self.results
+
+    def getSkipReason(self, name):
+        if name == "video":
+            if not self.args.video:
+                return "no --video file given"
+            if not self.hasVideo:
+                return "QtMultimedia not available"
+        elif name in ("url", "url_snapshot", "youtube") and not self.hasWeb:
+            return "QtWebEngineWidgets not available"
+        return ""
+
+    def benchImage(self, scenario, files):
+        # loadImg() from file (cold: decode and scale) and from memory cache (warm)
+        self.switchTo(scenario, "switch", mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=files[0])
+        peak = 0
+        for i in range(self.args.rounds):
+            img = files[i % len(files)]
+            self.win.imgCache.clear()
+            base = self.memory.mark()
+            scenario.add("loadImg_cold", self.measure(lambda: self.win.loadImg(img)))
+            peak = max(peak, self.memory.getPeakSince(base))
+            self.pump(0.02)
+            scenario.add("loadImg_warm", self.measure(lambda: self.win.loadImg(img)))
+            self.pump(0.02)
+        # Extra memory needed to decode and scale a single image
+        scenario.info["loadImg_cold_peak_mb"] = toMB(peak)
+
+    def benchCarousel(self, scenario, files):
+        # loadNextImg() as timer ticks would do it: first pass decodes (prefetched in background), second one reads
+        # from the images pack
+        self.win.imgCache.clear()
+        self.switchTo(scenario, "switch", mode=jaaw._IMGMODE, img_mode=jaaw._IMGCAROUSEL,
+                      folder=os.path.dirname(files[0]))
+        self.waitFor(lambda: len(self.win.imgList) >= len(files))
+        ticks = min(self.args.rounds, len(files) - 1)
+        for metric in ("loadNextImg_cold", "loadNextImg_pack"):
+            if metric == "loadNextImg_pack":
+                self.win.imgIndex = 0
+            for _ in range(ticks):
+                self.waitFor(lambda: not self.win.prefetcher.pending)
+                self.pump(0.02)
+                if metric == "loadNextImg_pack":
+                    self.win.imgCache.clear()
+                scenario.add(metric, self.measure(self.win.loadNextImg))
+        scenario.info["img_cache"] = self.win.imgCache.stats()
+
+    def benchChrome(self, scenario, name):
+        if name == "chrome_degraded":
+            jaaw._CHROME_CATALOG_URL = self.server.baseUrl + "/catalog.json?degraded=1"
+        self.win.fetcher.chromeImages = []
+        store = self.win.fetcher.store
+        hits, misses = store.hits, store.misses
+        results = collections.Counter()
+        try:
+            if self.win.menu.config["mode"] != jaaw._WEBMODE or self.win.menu.config["web_mode"] != jaaw._CHROMEMODE:
+                self.switchTo(scenario, "switch", mode=jaaw._WEBMODE, web_mode=jaaw._CHROMEMODE)
+            for _ in range(self.args.rounds):
+                if name == "chrome_offline":
+                    # Catalog has to be downloaded again (and fail) every time
+                    self.win.fetcher.chromeImages = []
+                    self.server.failing = True
+                results[self.refetch(scenario, "fetch", jaaw._CHROMEMODE)] += 1
+        finally:
+            self.server.failing = False
+            jaaw._CHROME_CATALOG_URL = self.server.baseUrl + "/catalog.json"
+            self.win.fetcher.chromeImages = []
+        scenario.info["fetch_results"] = dict(results)
+        scenario.info["web_cache"] = {"hits": store.hits - hits, "misses": store.misses - misses}
+
+    def benchBing(self, scenario):
+        if self.win.menu.config["mode"] != jaaw._WEBMODE or self.win.menu.config["web_mode"] != jaaw._BINGMODE:
+            self.switchTo(scenario, "switch", mode=jaaw._WEBMODE, web_mode=jaaw._BINGMODE)
+        results = collections.Counter()
+        for _ in range(self.args.rounds):
+            results[self.refetch(scenario, "fetch", jaaw._BINGMODE)] += 1
+        scenario.info["fetch_results"] = dict(results)
+
+    def benchVideo(self, scenario):
+        # Renderer is part of content, so switching it loads the video again: the default one, then the capped one
+        video = self.args.video
+        for i in range(self.args.rounds):
+            renderer = (jaaw._RENDER_DEFAULT, jaaw._RENDER_CAPPED)[i % 2]
+            self.switchTo(scenario, "switch_" + renderer.lower(), mode=jaaw._VIDMODE, video_mode=jaaw._VIDLOCAL,
+                          video=video, video_renderers={video: renderer})
+            self.pump(self.args.settle)
+        if self.win.videoPlayer is not None:
+            scenario.info["video_surfaces"] = self.win.videoPlayer.stats()
+
+    def benchUrl(self, scenario):
+        # Alternate between two local pages. Once the other one is preloaded, switches just swap it into the view
+        failed = self.getWebLoads(ok="false")
+        for i in range(self.args.rounds):
+            self.switchTo(scenario, "switch", mode=jaaw._WEBMODE, web_mode=jaaw._URLMODE, url_index=i % 2,
+                          url_snapshot=False)
+            # Time for the pool to load next page
+            self.pump(self.args.settle)
+        failed = self.getWebLoads(ok="false") - failed
+        if failed:
+            scenario.errors.append("%d pages failed to load" % failed)
+        scenario.info["pool_switches"] = self.getWebLoads(source="pool")
+        if self.win.webPool is not None:
+            scenario.info["web_pool"] = self.win.webPool.stats()
+
+    def benchUrlSnapshot(self, scenario):
+        # Same pages as url, shown as snapshots: renderer only lives while taking them
+        for i in range(self.args.rounds):
+            self.switchTo(scenario, "switch", mode=jaaw._WEBMODE, web_mode=jaaw._URLMODE, url_index=i % 2,
+                          url_snapshot=True)
+        for i in range(self.args.rounds):
+            snapshots = self.getSnapshots()
+            self.measureUntil(scenario, "refresh", self.win.refreshWebSnapshot,
+                              lambda: self.getSnapshots() > snapshots)
+        failed = self.win.metrics.getHistogram("jaaw_web_load_ms", page="snapshot", ok="false")["count"]
+        if failed:
+            scenario.errors.append("%d snapshots failed" % failed)
+        # Between snapshots, no renderer should be left running
+        self.pump(self.args.settle)
+        scenario.info["idle_webengine_processes"] = getWebEngineProcesses(getChildProcesses())
+
+    def benchYouTube(self, scenario):
+        # First switch loads player page, next ones just load another video in it
+        self.applyConfig(mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=self.folders.get("hd", [""])[0])
+        self.pump(0.1)
+        self.switchTo(scenario, "switch_cold", mode=jaaw._VIDMODE, video_mode=jaaw._VIDYT, yt_index=0)
+        for i in range(self.args.rounds):
+            self.switchTo(scenario, "switch", mode=jaaw._VIDMODE, video_mode=jaaw._VIDYT, yt_index=(i + 1) % 2)
+        if self.win.ytQuality is not None:
+            scenario.info["yt_quality"] = self.win.ytQuality.stats()
+
+    def benchControl(self, scenario, files):
+        # Commands as sent by jaawctl.py (the socket round trip itself is not included)
+        for i in range(self.args.rounds):
+            img = files[i % len(files)]
+            reply = {}
+            done = self.measureUntil(scenario, "set_image",
+                                     lambda: reply.update(self.win.runCommands({"cmd": "set_image", "path": img})),
+                                     lambda: self.win.currentImg == img)
+            if done and not reply.get("ok", False):
+                scenario.errors.append("set_image: %s" % reply)
+        scenario.add("status", self.measure(lambda: self.win.runCommands({"cmd": "status"})))
+
+    def benchModes(self, scenario):
+        # Visits every mode twice, letting idle backends unload, to see what each mode keeps in memory
+        visits = [("image", {"mode": jaaw._IMGMODE, "img_mode": jaaw._IMGFIXED, "img": self.folders["hd"][0]}),
+                  ("carousel", {"mode": jaaw._IMGMODE, "img_mode": jaaw._IMGCAROUSEL,
+                                "folder": os.path.dirname(self.folders["hd"][0])}),
+                  ("chrome", {"mode": jaaw._WEBMODE, "web_mode": jaaw._CHROMEMODE}),
+                  ("bing", {"mode": jaaw._WEBMODE, "web_mode": jaaw._BINGMODE})]
+        if self.hasWeb:
+            visits.append(("url", {"mode": jaaw._WEBMODE, "web_mode": jaaw._URLMODE, "url_index": 0,
+                                   "url_snapshot": False}))
+            visits.append(("url_snapshot", {"mode": jaaw._WEBMODE, "web_mode": jaaw._URLMODE, "url_index": 0,
+                                            "url_snapshot": True}))
+            visits.append(("youtube", {"mode": jaaw._VIDMODE, "video_mode": jaaw._VIDYT, "yt_index": 0}))
+        if self.hasVideo and self.args.video:
+            visits.append(("video", {"mode": jaaw._VIDMODE, "video_mode": jaaw._VIDLOCAL, "video": self.args.video,
+                                     "video_renderers": {}}))
+        modes = []
+        for _ in range(2):
+            for name, changes in visits:
+                self.switchTo(scenario, "switch_to_" + name, **changes)
+                # Backends not used by this mode are unloaded after backend_idle_secs
+                self.pump(self.win.backendIdle + self.args.settle)
+                children = getChildProcesses()
+                modes.append({"mode": name, "rss_mb": toMB(self.memory.getRss()),
+                              "children_rss_mb": toMB(sum(rss for _, rss in children)),
+                              "webengine_processes": getWebEngineProcesses(children), "backends": self.getBackends()})
+        scenario.info["modes"] = modes
+
+
+def printResults(results):
+    for name, result in results.items():
+        if "skipped" in result:
+            print("%-18s SKIPPED (%s)" % (name, result["skipped"]))
+            continue
+        memory = result["memory_mb"]
+        print("%-18s peak %7.1f MB  blocking max %7.1f ms total %8.1f ms  webengine %d%s" %
+              (name, memory["rss_peak"], result["blocking_ms"]["max"], result["blocking_ms"]["total"],
+               result["webengine_processes"], "  ERRORS: %d" % len(result["errors"]) if result["errors"] else ""))
+        for metric, latency in result["latency_ms"].items():
+            if latency["count"]:
+                print("    %-22s n=%-4d p50 %8.2f  p90 %8.2f  max %8.2f ms" %
+                      (metric, latency["count"], latency["p50"], latency["p90"], latency["max"]))
+
+
+def compare(basePath, newPath, threshold):
+    # Prints differences between two result files. Returns 1 if anything got slower / bigger beyond threshold
+    with open(basePath, encoding="UTF-8") as file:
+        base = json.load(file)
+    with open(newPath, encoding="UTF-8") as file:
+        new = json.load(file)
+    if base.get("environment") != new.get("environment"):
+        print("WARNING: results come from different environments\n  %s\n  %s" %
+              (base.get("environment"), new.get("environment")))
+    regressions = 0
+    print("%-44s %10s %10s %8s" % ("metric", "base", "new", "change"))
+    for name, result in new.get("scenarios", {}).items():
+        baseResult = base.get("scenarios", {}).get(name, None)
+        if baseResult is None or "skipped" in result or "skipped" in baseResult:
+            continue
+        # (label, base value, new value, minimum absolute change to care about)
+        values = []
+        for metric, latency in result["latency_ms"].items():
+            baseLatency = baseResult["latency_ms"].get(metric, {})
+            for p in ("p50", "p90"):
+                if p in latency and p in baseLatency:
+                    values.append(("%s.%s.%s" % (name, metric, p), baseLatency[p], latency[p], 1.0))
+        values.append(("%s.rss_peak_mb" % name, baseResult["memory_mb"]["rss_peak"],
+                       result["memory_mb"]["rss_peak"], 5.0))
+        values.append(("%s.blocking_total_ms" % name, baseResult["blocking_ms"]["total"],
+                       result["blocking_ms"]["total"], 5.0))
+        values.append(("%s.webengine_processes" % name, baseResult["webengine_processes"],
+                       result["webengine_processes"], 1))
+        for label, old, value, minimum in values:
+            change = (value - old) / old * 100 if old else 0.0
+            regression = value - old >= minimum and value > old * (1 + threshold)
+            regressions += regression
+            print("%-44s %10.2f %10.2f %+7.1f%%%s" % (label, old, value, change, "  REGRESSION" if regression else ""))
+    print("%d regression(s)" % regressions)
+    return 1 if regressions else 0
+
+
+def qtMessageHandler(msgType, context, msg):
+    # Offscreen platform complains about lots of things it can't do (e.g. sizing windows), which don't matter here
+    _LOGGER.debug("Qt: %s" % msg)
+
+
+def parseSize(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Jaaw! headless benchmark suite")
+    parser.add_argument("--output", default="benchmark.json", help="results file (default: %(default)s)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two results files and exit")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change considered a regression when comparing (default: %(default)s)")
+    parser.add_argument("--scenarios", default=",".join(_SCENARIOS),
+                        help="comma-separated list of scenarios (default: all)")
+    parser.add_argument("--rounds", type=int, default=20, help="samples per metric (default: %(default)s)")
+    parser.add_argument("--images", type=int, default=30, help="images per generated folder (default: %(default)s)")
+    parser.add_argument("--size", type=parseSize, default=None,
+                        help="work area size, WIDTHxHEIGHT (default: 1920x1080 when offscreen, else the real one)")
+    parser.add_argument("--large", type=parseSize, default=(8000, 6000),
+                        help="resolution of large images (default: 8000x6000)")
+    parser.add_argument("--video", default="", help="local video file for video scenarios (skipped if not given)")
+    parser.add_argument("--delay", type=float, default=3.0, help="delay of slow web images in seconds")
+    parser.add_argument("--timeout", type=float, default=30.0, help="max seconds to wait for any single operation")
+    parser.add_argument("--settle", type=float, default=0.5, help="seconds to let things settle after mode switches")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (which web candidates are picked)")
+    parser.add_argument("--strict", action="store_true",
+                        help="exit with an error code if any scenario is skipped or fails (e.g. for CI)")
+    parser.add_argument("--verbose", action="store_true", help="show jaaw logs")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in _SCENARIOS]
+    if unknown:
+        parser.error("unknown scenarios: %s (available: %s)" % (", ".join(unknown), ", ".join(_SCENARIOS)))
+    return args
+
+
+def main():
+    args = parseArgs()
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+    logging.getLogger("jaaw.benchmark").setLevel(logging.INFO)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if not args.verbose:
+        QtCore.qInstallMessageHandler(qtMessageHandler)
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        # Chromium refuses to run its sandbox as root (e.g. CI containers)
+        os.environ.setdefault("QTWEBENGINE_DISABLE_SANDBOX", "1")
+    output = os.path.abspath(args.output)
+
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
+    app = QtWidgets.QApplication(sys.argv[:1])
+    if args.size is None and QtGui.QGuiApplication.platformName() == "offscreen":
+        args.size = (1920, 1080)
+    if args.size is not None:
+        # Offscreen platform has no desktop (nor work area) at all
+        jaaw.pywinctl.getWorkArea = lambda: (0, 0, args.size[0], args.size[1])
+    else:
+        args.size = tuple(jaaw.pywinctl.getWorkArea()[2:])
+    # Settings and caches go to a temporary folder, so user's ones are never touched (on macOS they are
+    # kept inside the app resources)
+    jaaw._IS_MACOS = False
+    cwd = os.getcwd()
+    workFolder = tempfile.mkdtemp(prefix="jaaw-bench-")
+    os.chdir(workFolder)
+    try:
+        benchmark = Benchmark(app, args, workFolder)
+        results = benchmark.run()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workFolder, ignore_errors=True)
+
+    report = collections.OrderedDict()
+    report["format"] = _FORMAT_VERSION
+    report["created"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    report["revision"] = getRevision()
+    report["environment"] = {"platform": platform.platform(), "python": platform.python_version(),
+                             "qt": QtCore.QT_VERSION_STR, "pyqt": QtCore.PYQT_VERSION_STR,
+                             "qpa": QtGui.QGuiApplication.platformName(), "cpus": os.cpu_count(),
+                             "screen": list(args.size)}
+    report["options"] = {"rounds": args.rounds, "images": args.images, "large": list(args.large),
+                         "video": os.path.basename(args.video), "delay": args.delay, "seed": args.seed,
+                         "peak_rss_per_scenario": benchmark.memory.resettable}
+    report["scenarios"] = results
+    with open(output, "w", encoding="UTF-8") as file:
+        json.dump(report, file, indent=4)
+    printResults(results)
+    print("Results saved to %s" % output)
+    # Scenarios which could not run (e.g. no QtWebEngine) prove nothing, so they are not silently taken as passed
+    skipped = [name for name, result in results.items() if "skipped" in result]
+    failed = [name for name, result in results.items() if result.get("errors")]
+    if skipped:
+        print("WARNING: %d scenario(s) skipped: %s" % (len(skipped), ", ".join(skipped)), file=sys.stderr)
+    if failed:
+        print("WARNING: %d scenario(s) with errors: %s" % (len(failed), ", ".join(failed)), file=sys.stderr)
+    return 1 if args.strict and (skipped or failed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
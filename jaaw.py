@@ -1,20 +1,54 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import collections
+import copy
+import hashlib
 import json
+import logging
 import os
 import platform
-import random
 import signal
 import sys
 import time
 import traceback
 
+_STARTUP_BEGIN = time.perf_counter()
+_STARTUP_TIMES = collections.OrderedDict()
+_STARTUP_MARK = [_STARTUP_BEGIN]
+
+
+def markStartup(step):
+    # Milliseconds spent since previous mark, to measure where startup time goes (see --startup-profile)
+    now = time.perf_counter()
+    _STARTUP_TIMES[step] = round((now - _STARTUP_MARK[0]) * 1000, 2)
+    _STARTUP_MARK[0] = now
+
+
+markStartup("import stdlib")
 import pywinctl
+markStartup("import pywinctl")
 import qtutils
 import utils
-import webutils
-from PyQt5 import QtWidgets, QtCore, QtGui, QtMultimedia, QtMultimediaWidgets, QtWebEngineWidgets
+markStartup("import kalmatools")
+from PyQt5 import QtWidgets, QtCore, QtGui
+markStartup("import PyQt5")
+import jaawctl
+import jaawfolders
+import jaawimages
+import jaawmemory
+import jaawmetrics
+import jaawnet
+import jaawpack
+import jaawsettings
+import jaawvisibility
+
+# Heavy modules are only imported when configured mode actually needs them (see importVideo(), importWeb())
+QtMultimedia = None
+jaawvideo = None
+QtWebEngineWidgets = None
+jaawweb = None
+webutils = None
 
 _CAPTION = "Jaaw!"  # Just Another Animated Wallpaper!
 _CONFIG_ICON = utils.resource_path(__file__, "resources/Jaaw.png")
@@ -22,6 +56,12 @@ _SYSTEM_ICON = utils.resource_path(__file__, "resources/Jaaw.ico")
 _ICON_SELECTED = utils.resource_path(__file__, "resources/tick.png")
 _ICON_NOT_SELECTED = utils.resource_path(__file__, "resources/notick.png")
 _SETTINGS_FILE = "settings.json"
+_DEFAULT_SETTINGS_FILE = utils.resource_path(__file__, "resources/" + _SETTINGS_FILE)
+_CACHE_FOLDER = "cache"
+_LAST_WALLPAPER = "last_wallpaper.png"
+_STARTUP_PROFILE = "--startup-profile" in sys.argv
+_IMG_EXTENSIONS = ("png", "jpg", "jpeg", "bmp", "gif", "webp")
+_VIDEO_EXTENSIONS = ("flv", "ts", "mts", "avi", "wmv", "mp4", "mov", "mkv", "webm")
 
 _IMGMODE = "IMAGE"
 _IMGFIXED = "FIXED"
@@ -31,11 +71,19 @@ _FIT = "FIT"
 _STRETCH = "STRETCH"
 _VIDMODE = "VIDEO"
 _VIDLOCAL = "LOCAL"
+_VIDPLAYLIST = "PLAYLIST"
 _VIDYT = "YOUTUBE"
+_RENDER_DEFAULT = "DEFAULT"
+_RENDER_CAPPED = "CAPPED"
 _WEBMODE = "WEB"
 _CHROMEMODE = "CHROME"
 _BINGMODE = "BING"
 _URLMODE = "URL"
+_CHROME_CATALOG_URL = "https://raw.githubusercontent.com/dconnolly/chromecast-backgrounds/master/backgrounds.json"
+_YT_API_URL = "https://www.youtube.com/iframe_api"
+_YT_PAGE_URL = "http://localhost/"
+_YT_DEFAULT = "BHACKCNDMW8"
+_YT_RETRY_SECS = (5, 300)
 
 _SETTINGS_WARNING = 1
 _IMG_WARNING = 2
@@ -47,11 +95,62 @@ _BING_WARNING = 7
 _WEB_WARNING = 8
 _HELP_MSG = 9
 
+_LOGGER = logging.getLogger("jaaw")
+
 _IS_WINDOWS = "Windows" in platform.platform()
 _IS_LINUX = "Linux" in platform.platform()
 _IS_MACOS = "macOS" in platform.platform() or "Darwin" in platform.platform()
 
 
+def importVideo():
+    global QtMultimedia, jaawvideo
+    if jaawvideo is None:
+        from PyQt5 import QtMultimedia
+        import jaawvideo
+        markStartup("import QtMultimedia")
+
+
+def importWeb():
+    global QtWebEngineWidgets, jaawweb
+    if QtWebEngineWidgets is None:
+        from PyQt5 import QtWebEngineWidgets
+        import jaawweb
+        markStartup("import QtWebEngineWidgets")
+
+
+def importWebutils():
+    global webutils
+    if webutils is None:
+        import webutils
+        markStartup("import webutils")
+    return webutils
+
+
+def getCacheFolder(subfolder=""):
+    folder = _CACHE_FOLDER
+    if _IS_MACOS:
+        folder = utils.resource_path(__file__, folder)
+    folder = os.path.join(folder, subfolder)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def getVideoFiles(entries):
+    # Playlist entries can be video files or folders (their videos are played in name order)
+    videos = []
+    for entry in entries:
+        if os.path.isdir(entry):
+            try:
+                names = sorted(os.listdir(entry), key=str.lower)
+            except OSError:
+                names = []
+            videos += [os.path.join(entry, name) for name in names
+                       if name.rsplit(".", 1)[-1].lower() in _VIDEO_EXTENSIONS]
+        elif entry:
+            videos.append(entry)
+    return videos
+
+
 class Window(QtWidgets.QMainWindow):
 
     def __init__(self, *args, **kwargs):
@@ -61,24 +160,113 @@ class Window(QtWidgets.QMainWindow):
         self.setupUi()
         qtutils.initDisplay(self, caption=_CAPTION)
 
+        self.metrics = jaawmetrics.Metrics()
+        self.metricsTimer = QtCore.QTimer(self)
+        self.metricsTimer.timeout.connect(self.exportMetrics)
+
         self.timer = QtCore.QTimer(self)
         self.timer.timeout.connect(self.loadNextImg)
+        self.timerDue = 0.0
+        self.snapshotTimer = QtCore.QTimer(self)
+        self.snapshotTimer.setSingleShot(True)
+        self.snapshotTimer.timeout.connect(self.takeWebSnapshot)
+        # Retries loading YouTube player when its API could not be loaded, waiting longer after each failure
+        self.ytRetryTimer = QtCore.QTimer(self)
+        self.ytRetryTimer.setSingleShot(True)
+        self.ytRetryTimer.timeout.connect(self.retryYTVideo)
+        self.ytRetryDelay = _YT_RETRY_SECS[0]
+        self.ytRetrying = False
 
         self.imgList = []
         self.imgIndex = 0
-        self.chrome = dict({"chromecast": []})
-
+        self.currentImg = ""
+        self.surfaces = collections.OrderedDict()
+        self.prefetcher = jaawimages.ImgPrefetcher(self)
+        self.imgCache = jaawimages.ImgCache()
+        self.animation = jaawimages.ImgAnimation(self)
+        self.animation.frameReady.connect(self.showAnimationFrame)
+        self.imgPack = None
+        self.folderIndex = None
+        self.waitingImgs = False
+        self.reachability = jaawnet.Reachability(self)
+        self.reachability.probed.connect(self.onUrlProbed)
+        self.fetcher = jaawnet.WebFetcher(getCacheFolder("web"), importWebutils, self, self.metrics)
+        self.fetcher.imgFetched.connect(self.onImgFetched)
+        self.fetcher.fetchFailed.connect(self.onFetchFailed)
+        self.governor = jaawmemory.MemoryGovernor(self)
+        self.governor.shrinkCaches.connect(self.shrinkCaches)
+        self.governor.recycleWeb.connect(self.recycleWebPage)
+        self.renderingPaused = {}
+        self.userPaused = False
+
+        self.settings = jaawsettings.SettingsStore(_DEFAULT_SETTINGS_FILE if _IS_MACOS else _SETTINGS_FILE,
+                                                   _DEFAULT_SETTINGS_FILE, self)
         self.loadSettings()
+        self.appliedConfig = None
+
+        self.idleProvider = jaawvisibility.IdleProvider(self.idlePause)
+        self.policy = jaawvisibility.VisibilityPolicy([jaawvisibility.OcclusionProvider(self), self.idleProvider,
+                                                       jaawvisibility.LockProvider()], self.visibilityCheck * 1000, self)
+        self.policy.paused.connect(self.pauseRendering)
+        self.policy.resumed.connect(self.resumeRendering)
+        self.policy.setEnabled(self.pauseWhenHidden)
 
-        self.menu = Config(self, self.config)
+        self.menu = Config(self, self.config, self.settings)
         self.menu.reloadSettings.connect(self.reloadSettings)
         self.menu.closeAll.connect(self.closeAll)
         self.menu.showHelp.connect(self.showHelp)
+        self.menu.refreshSnapshot.connect(self.refreshWebSnapshot)
         self.menu.show()
-
-        self.start()
+        self.metricsTimer.start()
+
+        app = QtWidgets.QApplication.instance()
+        app.screenAdded.connect(self.onScreenAdded)
+        app.screenRemoved.connect(self.onScreenRemoved)
+        app.primaryScreenChanged.connect(self.onScreenAdded)
+        self.updateScreens()
+
+        markStartup("init window")
+        self.firstPaint = False
+        self.contentStarted = False
+        if self.needsHeavyBackend():
+            # Fast path: show tray icon and last wallpaper first. Heavy modules are imported after first paint
+            lastWallpaper = os.path.join(getCacheFolder(), _LAST_WALLPAPER)
+            if os.path.isfile(lastWallpaper):
+                self.loadImg(lastWallpaper, fallback=False)
+            QtCore.QTimer.singleShot(1000, self.startContent)
+        else:
+            self.startContent()
         QtCore.QTimer.singleShot(1000, self.sendBehind)
 
+    def needsHeavyBackend(self):
+        return self.wallPaperMode == _VIDMODE or (self.wallPaperMode == _WEBMODE and self.webMode == _URLMODE)
+
+    @QtCore.pyqtSlot()
+    def startContent(self):
+        if not self.contentStarted:
+            self.contentStarted = True
+            self.reconfigure(None, self.config)
+            markStartup("start content")
+            self.checkStartupProfile()
+
+    def paintEvent(self, event):
+        QtWidgets.QMainWindow.paintEvent(self, event)
+        if not self.firstPaint:
+            self.firstPaint = True
+            markStartup("first paint")
+            _STARTUP_TIMES["time to first paint"] = round((time.perf_counter() - _STARTUP_BEGIN) * 1000, 2)
+            QtCore.QTimer.singleShot(0, self.startContent)
+            self.checkStartupProfile()
+
+    def checkStartupProfile(self):
+        if _STARTUP_PROFILE and self.firstPaint and self.contentStarted:
+            _STARTUP_TIMES["total"] = round((time.perf_counter() - _STARTUP_BEGIN) * 1000, 2)
+            heavy = [name for name in ("PyQt5.QtMultimedia", "PyQt5.QtWebEngineWidgets", "webutils")
+                     if name in sys.modules]
+            print(json.dumps({"platform": QtGui.QGuiApplication.platformName(), "mode": self.wallPaperMode,
+                              "startup_ms": _STARTUP_TIMES, "heavy_modules": heavy}, indent=4))
+            QtCore.QTimer.singleShot(0, self.closeAll)
+
     def setupUi(self):
 
         self.setStyleSheet("background-color:black")
@@ -89,58 +277,152 @@ class Window(QtWidgets.QMainWindow):
         self.myLayout = QtWidgets.QHBoxLayout()
         self.myLayout.setContentsMargins(0, 0, 0, 0)
 
-        self.bkg_label = QtWidgets.QLabel()
-        self.bkg_label.hide()
-        self.bkg_label.setGeometry(0, 0, self.xmax, self.ymax)
-        self.bkg_label.setStyleSheet("background-color:black")
-        self.bkg_label.setAlignment(QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
-
-        # Reduce CPU?
-        #        Explorer.exe shell:appsFolder\Microsoft.ZuneVideo_8wekyb3d8bbwe!Microsoft.ZuneVideo
-        #        https://stackoverflow.com/questions/57015932/how-to-attach-and-detach-an-external-app-with-pyqt5-or-dock-an-external-applicat
-        self.videoWidget = QtMultimediaWidgets.QVideoWidget()
-        self.videoWidget.hide()
-        self.videoWidget.setGeometry(0, 0, self.xmax, self.ymax)
-        self.videoWidget.setStyleSheet("background-color:black")
-        # Use this to stretch video to screen (but distorting it)
-        # self.videoWidget.setAspectRatioMode(QtCore.Qt.IgnoreAspectRatio)
-        self.mediaPlayer = QtMultimedia.QMediaPlayer(None, QtMultimedia.QMediaPlayer.VideoSurface)
-        self.mediaPlayer.setVideoOutput(self.videoWidget)
-        self.mediaPlayer.setMuted(True)
-        self.mediaPlayer.error.connect(self.handlePlayError)
-        self.playlist = QtMultimedia.QMediaPlaylist()
-        self.playlist.setPlaybackMode(QtMultimedia.QMediaPlaylist.CurrentItemInLoop)
-
-        self.webView = QtWebEngineWidgets.QWebEngineView()
-        self.webView.hide()
-        self.webView.setGeometry(0, 0, self.xmax, self.ymax)
-        self.webView.setStyleSheet("background-color:black")
-        self.webFrame = self.webView.page()
-        self.webFrame.setAudioMuted(True)
-        # Use this to stretch page/video to screen (but possibly cutting the page/video)
-        # self.webFrame.setZoomFactor(1.5)
+        # Backends are created on first use, and destroyed after being unused for a while (see unloadIdleBackends)
+        self.bkg_label = None
+        self.videoPlayer = None
+        self.videoWidget = None
+        self.webView = None
+        self.webFrame = None
+        self.recycledView = None
+        self.ytView = None
+        self.ytPlayer = None
+        self.ytQuality = None
+        self.snapshotter = None
+        self.webProfile = None
+        self.webPool = None
+        self.webUsage = collections.Counter()
+        self.webUrl = ""
+        self.webIsYT = False
+        self.webLoadStarted = 0.0
+        self.activeBackends = set()
+        self.unloadTimer = QtCore.QTimer(self)
+        self.unloadTimer.setSingleShot(True)
+        self.unloadTimer.timeout.connect(self.unloadIdleBackends)
 
-        self.myLayout.addWidget(self.bkg_label)
-        self.myLayout.addWidget(self.videoWidget)
-        self.myLayout.addWidget(self.webView)
         self.widget.setLayout(self.myLayout)
         self.setCentralWidget(self.widget)
 
         self.msgBox = QtWidgets.QMessageBox()
 
-    def loadSettings(self):
-
-        if not _IS_MACOS and os.path.isfile(_SETTINGS_FILE):
-            file = _SETTINGS_FILE
-        else:
-            file = utils.resource_path(__file__, "resources/" + _SETTINGS_FILE)
+    def addBackendWidget(self, widget):
+        widget.hide()
+        widget.setGeometry(0, 0, self.xmax, self.ymax)
+        widget.setStyleSheet("background-color:black")
+        self.myLayout.addWidget(widget)
+
+    def removeBackendWidget(self, widget):
+        self.myLayout.removeWidget(widget)
+        widget.hide()
+        widget.deleteLater()
+
+    def getLabelBackend(self):
+        if self.bkg_label is None:
+            self.bkg_label = QtWidgets.QLabel()
+            self.bkg_label.setAlignment(QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
+            self.addBackendWidget(self.bkg_label)
+        self.activeBackends.add("label")
+        return self.bkg_label
+
+    def getVideoBackend(self):
+        if self.videoPlayer is None:
+            importVideo()
+            # Reduce CPU?
+            #        Explorer.exe shell:appsFolder\Microsoft.ZuneVideo_8wekyb3d8bbwe!Microsoft.ZuneVideo
+            #        https://stackoverflow.com/questions/57015932/how-to-attach-and-detach-an-external-app-with-pyqt5-or-dock-an-external-applicat
+            # Two players with stacked outputs, so next video (or next loop) starts with no black frames
+            self.videoWidget = jaawvideo.VideoWidget()
+            self.addBackendWidget(self.videoWidget)
+            self.videoPlayer = jaawvideo.GaplessPlayer(self.videoWidget, self)
+            self.videoPlayer.itemFailed.connect(self.handlePlayError)
+        self.activeBackends.add("video")
+        return self.videoPlayer
+
+    def getWebBackend(self):
+        if self.webView is None:
+            importWeb()
+            self.webView = self.createWebView()
+            self.webFrame = self.webView.page()
+            self.webView.loadFinished.connect(self.onWebLoadFinished)
+        if self.webPool is None and self.urlPoolSize > 0:
+            self.webPool = jaawweb.WebPagePool(self.getWebProfile(), self.urlPoolSize, self)
+        self.activeBackends.add("web")
+        return self.webView
+
+    def getYTBackend(self):
+        # Page hosting YouTube player is kept loaded, so next videos are switched in place
+        if self.ytPlayer is None:
+            importWeb()
+            self.ytView = self.createWebView()
+            self.ytPlayer = jaawweb.YTPlayer(self.ytView, _YT_API_URL, _YT_PAGE_URL, self)
+            self.ytPlayer.stateChanged.connect(self.onYTStateChanged)
+            self.ytPlayer.failed.connect(self.onYTFailed)
+            self.ytPlayer.qualitySampled.connect(self.onYTQualitySampled)
+            self.ytPlayer.qualityUnsupported.connect(self.onYTQualityUnsupported)
+        if self.ytQuality is None:
+            self.ytQuality = jaawweb.YTQuality(os.path.join(getCacheFolder("youtube"), "quality.json"),
+                                               self.ytMaxDrop, self.ytQualityCheck)
+        self.activeBackends.add("youtube")
+        return self.ytPlayer
+
+    def getSnapshotBackend(self):
+        # Holds no renderer between snapshots, so it is never unloaded
+        if self.snapshotter is None:
+            importWeb()
+            self.snapshotter = jaawweb.PageSnapshot(self.getWebProfile(), parent=self)
+            self.snapshotter.ready.connect(self.onWebSnapshotReady)
+            self.snapshotter.failed.connect(self.onWebSnapshotFailed)
+        return self.snapshotter
+
+    def getWebProfile(self):
+        # Shared by all pages, with a persistent disk cache
+        if self.webProfile is None:
+            folder = getCacheFolder("webengine")
+            self.webProfile = QtWebEngineWidgets.QWebEngineProfile("jaaw", self)
+            self.webProfile.setCachePath(folder)
+            self.webProfile.setPersistentStoragePath(folder)
+            self.webProfile.setHttpCacheType(QtWebEngineWidgets.QWebEngineProfile.DiskHttpCache)
+        self.webProfile.setHttpCacheMaximumSize(self.webDiskCache)
+        return self.webProfile
+
+    def createWebView(self):
+        webView = QtWebEngineWidgets.QWebEngineView()
+        webView.setPage(QtWebEngineWidgets.QWebEnginePage(self.getWebProfile(), webView))
+        self.addBackendWidget(webView)
+        webView.page().setAudioMuted(True)
+        # Use this to stretch page/video to screen (but possibly cutting the page/video)
+        # webView.page().setZoomFactor(1.5)
+        return webView
 
-        try:
-            with open(file, encoding='UTF-8') as file:
-                self.config = json.load(file)
-        except:
-            pass
+    @QtCore.pyqtSlot()
+    def unloadIdleBackends(self):
+        if "video" not in self.activeBackends and self.videoPlayer is not None:
+            _LOGGER.info("Unloading idle video backend")
+            self.videoPlayer.stop()
+            self.videoPlayer.deleteLater()
+            self.removeBackendWidget(self.videoWidget)
+            self.videoPlayer = self.videoWidget = None
+        if "web" not in self.activeBackends and self.webView is not None:
+            # Deleting the page also ends its Chromium renderer process
+            _LOGGER.info("Unloading idle web backend")
+            self.webView.stop()
+            self.removeBackendWidget(self.webView)
+            self.webView = self.webFrame = None
+            if self.webPool is not None:
+                self.webPool.clear()
+                self.webPool.deleteLater()
+                self.webPool = None
+        if "youtube" not in self.activeBackends and self.ytPlayer is not None:
+            _LOGGER.info("Unloading idle YouTube backend")
+            self.ytPlayer.deleteLater()
+            self.ytView.stop()
+            self.removeBackendWidget(self.ytView)
+            self.ytPlayer = self.ytView = None
+        if "label" not in self.activeBackends and self.bkg_label is not None:
+            self.removeBackendWidget(self.bkg_label)
+            self.bkg_label = None
 
+    def loadSettings(self):
+        self.config = self.settings.load()
         self.loadSettingsValues()
 
     def loadSettingsValues(self):
@@ -149,11 +431,34 @@ class Window(QtWidgets.QMainWindow):
         self.img = self.config["img"]
         self.imgSizeMode = self.config["img_size_mode"]
         self.contentFolder = self.config["folder"]
+        self.folderRecursive = self.config.get("folder_recursive", False)
+        self.allScreens = self.config.get("all_screens", True)
+        self.backendIdle = int(self.config.get("backend_idle_secs", 60))
+        self.pauseWhenHidden = self.config.get("pause_when_hidden", True)
+        self.idlePause = int(self.config.get("idle_pause_secs", 600))
+        self.visibilityCheck = max(1, int(self.config.get("visibility_check_secs", 2)))
         self.imgPeriods = self.config["Available_periods"]
         self.imgPeriod = self.config["img_period"]
+        self.imgPrefetch = max(0, int(self.config.get("img_prefetch", 2)))
+        self.imgCache.setBudget(int(self.config.get("img_cache_mb", 256)) * 1024 * 1024)
+        self.imgPackEnabled = self.config.get("img_pack", True)
+        self.imgPackBudget = int(self.config.get("img_pack_mb", 1024)) * 1024 * 1024
+        self.animation.setLimits(int(self.config.get("img_anim_fps", 24)),
+                                 int(self.config.get("img_anim_cache_mb", 128)) * 1024 * 1024)
         self.videoMode = self.config["video_mode"]
         self.video = self.config["video"]
+        self.videoPlaylist = self.config.get("video_playlist", [])
+        self.videoRenderers = self.config.get("video_renderers", {})
+        self.videoFps = max(1, int(self.config.get("video_fps", 24)))
         self.prevVideo = None
+        self.videoError = (self.video, "")
+        self.prevYTVideo = None
+        self.ytAdaptive = self.config.get("yt_adaptive_quality", True)
+        self.ytMaxDrop = max(0, int(self.config.get("yt_max_drop_pct", 5))) / 100
+        self.ytQualityCheck = max(1, int(self.config.get("yt_quality_check_secs", 10)))
+        if self.ytQuality is not None:
+            self.ytQuality.budget = self.ytMaxDrop
+            self.ytQuality.interval = self.ytQualityCheck
         self.ytUrl = ""
         index = self.config["yt_index"] if 0 <= self.config["yt_index"] < len(self.config["yt_url"]) else 0
         if index < len(self.config["yt_url"]):
@@ -161,6 +466,26 @@ class Window(QtWidgets.QMainWindow):
         self.webMode = self.config["web_mode"]
         self.chromeLast = self.config["chrome_last"]
         self.bingLast = self.config["bing_last"]
+        self.fetcher.timeout = int(self.config.get("web_timeout_secs", 10)) * 1000
+        self.fetcher.parallel = max(1, int(self.config.get("web_parallel", 3)))
+        self.fetcher.store.budget = int(self.config.get("web_cache_mb", 100)) * 1024 * 1024
+        self.reachability.ttl = int(self.config.get("reachability_ttl_secs", 300))
+        self.metricsFile = self.config.get("metrics_file", "")
+        self.metricsFormat = self.config.get("metrics_format", "prometheus")
+        self.metricsTooltip = self.config.get("metrics_tooltip", True)
+        self.metricsTimer.setInterval(max(1, int(self.config.get("metrics_interval_secs", 15))) * 1000)
+        self.governor.configure(int(self.config.get("memory_limit_mb", 1024)) * 1024 * 1024,
+                                int(self.config.get("web_memory_limit_mb", 768)) * 1024 * 1024,
+                                int(self.config.get("memory_check_secs", 60)) * 1000,
+                                int(self.config.get("web_recycle_min_secs", 600)))
+        self.urlPoolSize = max(0, int(self.config.get("url_pool_size", 2)))
+        if self.webPool is not None:
+            self.webPool.setSize(self.urlPoolSize)
+        self.webDiskCache = int(self.config.get("web_disk_cache_mb", 200)) * 1024 * 1024
+        if self.webProfile is not None:
+            self.webProfile.setHttpCacheMaximumSize(self.webDiskCache)
+        self.urlSnapshot = self.config.get("url_snapshot", False)
+        self.urlSnapshotPeriod = max(0, int(self.config.get("url_snapshot_secs", 900)))
         self.url = ""
         index = self.config["url_index"] if 0 <= self.config["url_index"] < len(self.config["url"]) else 0
         if index < len(self.config["url"]):
@@ -168,27 +493,137 @@ class Window(QtWidgets.QMainWindow):
 
     @QtCore.pyqtSlot()
     def reloadSettings(self):
-        self.hideAll()
         self.loadSettings()
-        self.start()
+        self.idleProvider.threshold = self.idlePause
+        self.policy.setEnabled(self.pauseWhenHidden)
+        self.updateScreens()
+        self.reconfigure(self.appliedConfig, self.config)
+
+    @staticmethod
+    def getContentKey(config):
+        # Identifies what is shown on screen for a given config, regardless of how it is sized
+        mode = config["mode"]
+        if mode == _IMGMODE:
+            if config["img_mode"] == _IMGCAROUSEL:
+                return mode, config["img_mode"], config["folder"], config.get("folder_recursive", False)
+            return mode, config["img_mode"], config["img"]
+        elif mode == _VIDMODE:
+            if config["video_mode"] == _VIDYT:
+                urls = config["yt_url"]
+                index = config["yt_index"] if 0 <= config["yt_index"] < len(urls) else 0
+                return mode, config["video_mode"], urls[index] if index < len(urls) else ""
+            if config["video_mode"] == _VIDPLAYLIST:
+                videos = tuple(config.get("video_playlist", []))
+            else:
+                videos = (config["video"],)
+            renderers = tuple(config.get("video_renderers", {}).get(video, _RENDER_DEFAULT) for video in videos)
+            return (mode, config["video_mode"], videos, renderers,
+                    config.get("video_fps", 24) if _RENDER_CAPPED in renderers else None)
+        elif mode == _WEBMODE:
+            if config["web_mode"] == _URLMODE:
+                urls = config["url"]
+                index = config["url_index"] if 0 <= config["url_index"] < len(urls) else 0
+                return (mode, config["web_mode"], urls[index] if index < len(urls) else "",
+                        config.get("url_snapshot", False))
+            return mode, config["web_mode"]
+        return (mode,)
+
+    def reconfigure(self, old, new):
+        # Applies only what changed. Returns which backends were touched ("restart" if everything was restarted)
+        touched = []
+        if old is not None and self.getContentKey(old) != self.getContentKey(new) and self.isVideoSwitch(old, new):
+            # Current video keeps playing until the new one is ready
+            self.loadVideo(self.getVideoItems())
+            touched.append("video")
+
+        elif old is not None and self.getContentKey(old) != self.getContentKey(new) and self.isYTSwitch(old, new):
+            self.loadYTVideo(self.ytUrl)
+            touched.append("youtube")
+
+        elif old is None or self.getContentKey(old) != self.getContentKey(new):
+            self.hideAll()
+            self.start()
+            if self.policy.isPaused or self.userPaused:
+                self.pauseRendering()
+            touched.append("restart")
+
+        else:
+            if old["img_size_mode"] != new["img_size_mode"]:
+                touched.append(self.rescale())
+            if self.wallPaperMode == _IMGMODE and self.imgMode == _IMGCAROUSEL:
+                if old["img_period"] != new["img_period"]:
+                    if "timer" in self.renderingPaused:
+                        self.renderingPaused["timer"] = self.imgPeriod * 1000
+                    else:
+                        self.startCarouselTimer(self.imgPeriod * 1000)
+                    touched.append("timer")
+                self.openImgPack()
+            if self.isWebSnapshot() and old.get("url_snapshot_secs") != new.get("url_snapshot_secs"):
+                self.snapshotTimer.stop()
+                self.renderingPaused.pop("snapshot", None)
+                self.startSnapshotTimer()
+                touched.append("timer")
+
+        self.appliedConfig = copy.deepcopy(new)
+        _LOGGER.debug("Settings applied. Touched: %s" % (", ".join(touched) or "nothing"))
+        return touched
+
+    def isVideoSwitch(self, old, new):
+        return (old["mode"] == new["mode"] == _VIDMODE and old["video_mode"] in (_VIDLOCAL, _VIDPLAYLIST) and
+                new["video_mode"] in (_VIDLOCAL, _VIDPLAYLIST) and self.videoPlayer is not None and
+                self.videoPlayer.isStarted() and not self.renderingPaused)
+
+    def isYTSwitch(self, old, new):
+        return (old["mode"] == new["mode"] == _VIDMODE and old["video_mode"] == new["video_mode"] == _VIDYT and
+                self.isYTShown() and not self.renderingPaused)
+
+    def isYTShown(self):
+        return self.ytPlayer is not None and self.ytPlayer.isReady and self.ytView.isVisible()
+
+    def rescale(self):
+        if self.wallPaperMode == _VIDMODE and self.videoMode in (_VIDLOCAL, _VIDPLAYLIST):
+            self.getVideoBackend().setTarget(self.xmax, self.ymax, self.getVideoAspectMode())
+            return "video"
+        elif (self.wallPaperMode == _VIDMODE and self.videoMode == _VIDYT) or \
+                (self.wallPaperMode == _WEBMODE and self.webMode == _URLMODE and not self.urlSnapshot):
+            self.resizeWebView()
+            return "web"
+        else:
+            self.openImgPack()
+            if self.currentImg and self.wallPaperMode == _IMGMODE and self.imgMode == _IMGFIXED:
+                self.loadFixedImg(self.currentImg, fallback=False)
+            elif self.currentImg:
+                self.loadImg(self.currentImg, fallback=False)
+            if self.wallPaperMode == _IMGMODE and self.imgMode == _IMGCAROUSEL:
+                self.prefetchNextImgs()
+            return "label"
 
     def start(self):
 
+        # Work area may have changed since last start (e.g. resolution change)
+        _, _, self.xmax, self.ymax = pywinctl.getWorkArea()
         self.setGeometry(0, 0, self.xmax, self.ymax)
+        self.openImgPack()
+        if self.wallPaperMode != _IMGMODE or self.imgMode != _IMGCAROUSEL:
+            self.closeFolderIndex()
 
         if self.wallPaperMode == _IMGMODE:
             if self.imgMode == _IMGFIXED:
-                self.loadImg(self.img)
+                self.loadFixedImg(self.img)
             elif self.imgMode == _IMGCAROUSEL:
-                self.imgList = utils.getFilesInFolder(self.contentFolder, ("png", "jpg", "jpeg", "bmp"))
-                self.timer.start(self.imgPeriod * 1000)
-                self.loadNextImg()
+                self.openFolderIndex()
+                self.startCarouselTimer(self.imgPeriod * 1000)
+                if self.imgList:
+                    self.loadNextImg()
+                else:
+                    # Folder is still being indexed. First image will show as soon as it is found
+                    self.waitingImgs = True
             else:
                 self.showWarning(_SETTINGS_WARNING)
 
         elif self.wallPaperMode == _VIDMODE:
-            if self.videoMode == _VIDLOCAL:
-                self.loadVideo(self.video)
+            if self.videoMode in (_VIDLOCAL, _VIDPLAYLIST):
+                self.loadVideo(self.getVideoItems())
             elif self.videoMode == _VIDYT:
                 self.loadYTVideo(self.ytUrl)
             else:
@@ -199,6 +634,8 @@ class Window(QtWidgets.QMainWindow):
                 self.loadChrome()
             elif self.webMode == _BINGMODE:
                 self.loadBing()
+            elif self.webMode == _URLMODE and self.urlSnapshot:
+                self.loadWebSnapshot(self.url)
             elif self.webMode == _URLMODE:
                 self.loadWebPage(self.url)
             else:
@@ -207,10 +644,134 @@ class Window(QtWidgets.QMainWindow):
         else:
             self.showWarning(_SETTINGS_WARNING)
 
+    def openImgPack(self):
+        if self.imgPackEnabled and self.wallPaperMode == _IMGMODE and self.imgMode == _IMGCAROUSEL:
+            if self.imgPack is not None and self.imgPack.matches(self.contentFolder, self.imgSizeMode,
+                                                                 self.xmax, self.ymax):
+                self.imgPack.budget = self.imgPackBudget
+                return
+            self.closeImgPack()
+            self.imgPack = jaawpack.ImgPack(getCacheFolder("packs"), self.contentFolder, self.imgSizeMode, self.xmax,
+                                            self.ymax, self.imgPackBudget)
+        else:
+            self.closeImgPack()
+
+    def closeImgPack(self):
+        if self.imgPack is not None:
+            self.imgPack.close()
+            self.imgPack = None
+
+    def openFolderIndex(self):
+        if self.folderIndex is None or not self.folderIndex.matches(self.contentFolder, self.folderRecursive):
+            self.closeFolderIndex()
+            self.folderIndex = jaawfolders.FolderIndex(getCacheFolder("index"), self.contentFolder, _IMG_EXTENSIONS,
+                                                       self.folderRecursive, self)
+            self.folderIndex.filesAdded.connect(self.onImgsAdded)
+            self.folderIndex.scanFinished.connect(self.onImgsScanned)
+            self.folderIndex.start()
+        self.imgList = self.folderIndex.files
+
+    def closeFolderIndex(self):
+        if self.folderIndex is not None:
+            self.folderIndex.close()
+            self.folderIndex.deleteLater()
+            self.folderIndex = None
+        self.imgList = []
+        self.waitingImgs = False
+
+    @QtCore.pyqtSlot(list)
+    def onImgsAdded(self, files):
+        if self.waitingImgs and self.imgList:
+            self.waitingImgs = False
+            self.loadNextImg()
+
+    @QtCore.pyqtSlot()
+    def onImgsScanned(self):
+        if self.waitingImgs and not self.imgList:
+            self.waitingImgs = False
+            self.showWarning(_FOLDER_WARNING)
+
     def sendBehind(self):
         pywinctl.Window(self.winId()).sendBehind()
 
-    def loadImg(self, img, keepAspect=True, expand=True, fallback=True):
+    def getSecondaryScreens(self):
+        primary = QtGui.QGuiApplication.primaryScreen()
+        return [screen for screen in QtGui.QGuiApplication.screens() if screen is not primary]
+
+    def isOnAllScreens(self):
+        # Videos and live web pages would need a decoder / renderer per screen, so they stay on primary one
+        return self.allScreens and (self.wallPaperMode == _IMGMODE or
+                                    (self.wallPaperMode == _WEBMODE and (self.webMode != _URLMODE or self.urlSnapshot)))
+
+    def updateScreens(self, removed=None):
+        screens = [screen for screen in self.getSecondaryScreens() if screen is not removed] \
+            if self.isOnAllScreens() else []
+        for screen in [screen for screen in self.surfaces.keys() if screen not in screens]:
+            surface = self.surfaces.pop(screen)
+            surface.close()
+            surface.deleteLater()
+        added = []
+        for screen in screens:
+            if screen not in self.surfaces:
+                surface = ScreenSurface(screen)
+                surface.screenChanged.connect(self.onSurfaceChanged)
+                self.surfaces[screen] = surface
+                added.append(surface)
+        if added and self.currentImg:
+            self.showOnScreens(self.currentImg, surfaces=added)
+
+    @QtCore.pyqtSlot(QtGui.QScreen)
+    def onScreenAdded(self, screen):
+        self.onScreensChanged()
+
+    @QtCore.pyqtSlot(QtGui.QScreen)
+    def onScreenRemoved(self, screen):
+        self.onScreensChanged(removed=screen)
+
+    def onScreensChanged(self, removed=None):
+        # Screens plugged / unplugged while running: no need to restart everything
+        _, _, xmax, ymax = pywinctl.getWorkArea()
+        self.updateScreens(removed)
+        if (xmax, ymax) != (self.xmax, self.ymax) and self.contentStarted:
+            _LOGGER.info("Work area changed to %dx%d" % (xmax, ymax))
+            self.xmax, self.ymax = xmax, ymax
+            self.setGeometry(0, 0, self.xmax, self.ymax)
+            self.rescale()
+
+    @QtCore.pyqtSlot(object)
+    def onSurfaceChanged(self, surface):
+        if self.currentImg:
+            self.showOnScreens(self.currentImg, surfaces=[surface])
+
+    def getDecodeSize(self):
+        # Decoded once, at the size of the largest screen (by area), then just scaled for each one
+        sizes = [(self.xmax, self.ymax)] + [surface.getTargetSize() for surface in self.surfaces.values()]
+        return max(sizes, key=lambda size: size[0] * size[1])
+
+    def showOnScreens(self, img, decoded=None, surfaces=None):
+        keepAspect, expand = self.getScaleFlags()
+        for surface in list(self.surfaces.values()) if surfaces is None else surfaces:
+            width, height = surface.getTargetSize()
+            key = self.getCacheKey(img, width, height)
+            pixmap = self.imgCache.get(key)
+            if pixmap is None:
+                if decoded is None:
+                    decoded = self.prefetcher.take(img, *self.getDecodeSize(), keepAspect, expand)
+                    if decoded is None:
+                        decoded = jaawimages.loadScaledImage(img, *self.getDecodeSize(), keepAspectRatio=keepAspect,
+                                                             expand=expand)
+                pixmap = QtGui.QPixmap.fromImage(jaawimages.loadScaledImage(decoded, width, height,
+                                                                            keepAspectRatio=keepAspect, expand=expand))
+                if pixmap.isNull():
+                    continue
+                self.imgCache.put(key, pixmap)
+            surface.setPixmap(pixmap)
+
+    def hideScreens(self):
+        for surface in self.surfaces.values():
+            surface.clear()
+
+    def getScaleFlags(self, keepAspect=True, expand=True):
         if self.imgSizeMode == _ORIGINAL:
             keepAspect = True
             expand = False
@@ -220,8 +781,49 @@ class Window(QtWidgets.QMainWindow):
         elif self.imgSizeMode == _STRETCH:
             keepAspect = False
             expand = True
-        pixmap = qtutils.resizeImageWithQT(img, self.xmax, self.ymax, keepAspectRatio=keepAspect,
-                                           expand=(expand and not _IS_LINUX))
+        return keepAspect, (expand and not _IS_LINUX)
+
+    def getCacheKey(self, img, width=None, height=None):
+        try:
+            mtime = os.path.getmtime(img)
+        except OSError:
+            mtime = None
+        return img, mtime, self.imgSizeMode, width or self.xmax, height or self.ymax
+
+    def isImgReady(self, img):
+        if self.getCacheKey(img) not in self.imgCache and (self.imgPack is None or not self.imgPack.contains(img)):
+            return False
+        return all(self.getCacheKey(img, *surface.getTargetSize()) in self.imgCache
+                   for surface in self.surfaces.values())
+
+    def loadImg(self, img, keepAspect=True, expand=True, fallback=True):
+        start = time.perf_counter()
+        source = "cache"
+        keepAspect, expand = self.getScaleFlags(keepAspect, expand)
+        key = self.getCacheKey(img)
+        pixmap = self.imgCache.get(key)
+        if pixmap is None and self.imgPack is not None:
+            pixmap = self.imgPack.getPixmap(img)
+            if pixmap is not None:
+                source = "pack"
+                self.imgCache.put(key, pixmap)
+        decoded = None
+        if pixmap is None:
+            source = "prefetch"
+            decodeSize = self.getDecodeSize()
+            decoded = self.prefetcher.take(img, *decodeSize, keepAspect, expand)
+            if decoded is None:
+                source = "decode"
+                decoded = jaawimages.loadScaledImage(img, *decodeSize, keepAspectRatio=keepAspect, expand=expand)
+            image = decoded
+            if decodeSize != (self.xmax, self.ymax):
+                image = jaawimages.loadScaledImage(decoded, self.xmax, self.ymax, keepAspectRatio=keepAspect,
+                                                   expand=expand)
+            pixmap = QtGui.QPixmap.fromImage(image.copy())
+            if not pixmap.isNull():
+                self.imgCache.put(key, pixmap)
+                if self.imgPack is not None:
+                    self.imgPack.add(img, image)
         if not pixmap.isNull():
             x = min(0, int((self.xmax - pixmap.width()) / 2))
             y = min(0, int((self.ymax - pixmap.height()) / 2))
@@ -229,21 +831,67 @@ class Window(QtWidgets.QMainWindow):
             h = max(self.ymax, pixmap.height())
             self.setFixedSize(w, h)
             self.move(x, y)
-            self.bkg_label.setPixmap(pixmap)
-            self.bkg_label.show()
+            label = self.getLabelBackend()
+            label.setPixmap(pixmap)
+            label.show()
+            self.currentImg = img
+            if self.surfaces:
+                self.showOnScreens(img, decoded)
+            self.metrics.observe("jaaw_image_load_ms", (time.perf_counter() - start) * 1000, {"source": source})
             # QtCore.QTimer.singleShot(300, lambda: self.setProps(labelRect, pixmap))
 
-        elif fallback:
-            self.showWarning(_IMG_WARNING)
+        else:
+            self.metrics.inc("jaaw_image_errors_total")
+            if fallback:
+                self.showWarning(_IMG_WARNING)
+
+    def loadFixedImg(self, img, fallback=True):
+        # Animated images are shown as any other image (their first frame), then their animation is played
+        self.loadImg(img, fallback=fallback)
+        if self.currentImg == img and jaawimages.ImgAnimation.isAnimated(img):
+            keepAspect, expand = self.getScaleFlags()
+            self.animation.start(img, self.xmax, self.ymax, keepAspect, expand)
+            if self.renderingPaused:
+                self.renderingPaused["animation"] = True
+                self.animation.pause()
+
+    @QtCore.pyqtSlot(QtGui.QPixmap)
+    def showAnimationFrame(self, pixmap):
+        if self.bkg_label is not None:
+            self.bkg_label.setPixmap(pixmap)
+
+    def startCarouselTimer(self, msecs):
+        self.timer.start(msecs)
+        self.timerDue = time.monotonic() + msecs / 1000
 
     def loadNextImg(self):
+        if self.sender() is self.timer:
+            # How late timer ticks are (e.g. because GUI thread was busy)
+            now = time.monotonic()
+            self.metrics.observe("jaaw_carousel_drift_ms", max(0.0, (now - self.timerDue) * 1000))
+            self.timerDue += self.imgPeriod
+            if self.timerDue < now:
+                self.timerDue = now + self.imgPeriod
+        if self.timer.interval() != self.imgPeriod * 1000:
+            # Timer was resumed with the remaining time of a paused period
+            self.startCarouselTimer(self.imgPeriod * 1000)
         if self.imgList:
+            self.imgIndex %= len(self.imgList)
             self.loadImg(self.imgList[self.imgIndex])
             self.imgIndex = (self.imgIndex + 1) % len(self.imgList)
-        else:
+            self.prefetchNextImgs()
+        elif not self.waitingImgs:
             self.showWarning(_FOLDER_WARNING)
 
-    def loadVideo(self, video):
+    def prefetchNextImgs(self):
+        # Decode and scale next images in background, so timer ticks only have to swap the pixmap
+        depth = min(self.imgPrefetch, len(self.imgList))
+        imgs = [self.imgList[(self.imgIndex + i) % len(self.imgList)] for i in range(depth)]
+        imgs = [img for img in imgs if not self.isImgReady(img)]
+        keepAspect, expand = self.getScaleFlags()
+        self.prefetcher.prefetch(imgs, *self.getDecodeSize(), keepAspect, expand)
+
+    def getVideoAspectMode(self):
         flag = QtCore.Qt.KeepAspectRatio
         if self.imgSizeMode == _ORIGINAL:
             flag = QtCore.Qt.KeepAspectRatio
@@ -251,109 +899,314 @@ class Window(QtWidgets.QMainWindow):
             flag = QtCore.Qt.KeepAspectRatioByExpanding
         elif self.imgSizeMode == _STRETCH:
             flag = QtCore.Qt.IgnoreAspectRatio
-        self.videoWidget.setAspectRatioMode(flag)
+        return flag
+
+    def getVideoItems(self):
+        # (file, fps) of each video to play. fps is only set (to cap frame rate) for videos using the CAPPED renderer
+        if self.videoMode == _VIDPLAYLIST:
+            videos = getVideoFiles(self.videoPlaylist)
+        else:
+            videos = [self.video]
+        return [(video, self.videoFps if self.videoRenderers.get(video, _RENDER_DEFAULT) == _RENDER_CAPPED else None)
+                for video in videos]
+
+    def loadVideo(self, items):
+        if not items:
+            self.videoError = (" ".join(self.videoPlaylist), "No videos found")
+            self.showWarning(_VID_WARNING)
+            return
+        player = self.getVideoBackend()
+        if player.isStarted():
+            player.setTarget(self.xmax, self.ymax, self.getVideoAspectMode())
+            player.setItems(items)
+            return
         # Don't know how, but this fixes issues between video and transparent background (win10)
         self.hideAll()
-        self.playlist.addMedia(QtMultimedia.QMediaContent(QtCore.QUrl.fromLocalFile(video)))
-        self.mediaPlayer.setPlaylist(self.playlist)
+        self.getVideoBackend()
+        player.setTarget(self.xmax, self.ymax, self.getVideoAspectMode())
         self.setFixedSize(self.xmax, self.ymax)
         self.move(0, 0)
         # These two setGeometry() is a weird hack to avoid video stretching
         self.videoWidget.setGeometry(0, 0, self.xmax, self.ymax)
         self.videoWidget.show()
-        self.mediaPlayer.play()
+        player.setItems(items)
         self.videoWidget.setGeometry(0, 0, self.xmax, self.ymax)
 
     def loadChrome(self):
-        filename = "032k-8738jd7-00"
-        if _IS_MACOS:
-            filename = utils.resource_path(__file__, filename)
         current = time.strftime("%Y%m%d")
-        found = True
-        if not os.path.isfile(filename) or self.chromeLast < current:
-            self.chromeLast = current
-            if not self.chrome["chromecast"]:
-                self.chrome = webutils.getChromecastImages()
-            rand = random.Random()
-            found = False
-            tries = 0
-            while not found and tries < 10:
-                index = rand.randint(0, len(self.chrome["chromecast"]))
-                img = self.chrome["chromecast"][index]["url"]
-                try:
-                    webutils.download(img, filename)
-                    found = True
-                except:
-                    tries += 1
-        if found:
-            self.loadImg(filename)
-            self.menu.saveLast(chrome=self.chromeLast)
+        latest = self.fetcher.store.latest(_CHROMEMODE)
+        if latest is None or self.chromeLast < current:
+            if latest is not None:
+                # Keep showing previous image while downloading a new one
+                self.loadImg(latest, fallback=False)
+            self.fetcher.fetchChrome(_CHROME_CATALOG_URL)
         else:
-            self.showWarning(_CHROME_WARNING)
+            self.loadImg(latest)
+            self.menu.saveLast(chrome=self.chromeLast)
 
     def loadBing(self):
-        filename = "032k-8738jd7-01"
-        if _IS_MACOS:
-            filename = utils.resource_path(__file__, filename)
         current = time.strftime("%Y%m%d")
-        found = True
-        if not os.path.isfile(filename) or self.bingLast < current:
-            self.bingLast = current
-            img = webutils.getBingTodayImage()
-            try:
-                webutils.download(img, filename)
-            except:
-                images = webutils.getBingImages()
-                rand = random.Random()
-                found = False
-                tries = 0
-                while not found and tries < 10:
-                    index = rand.randint(0, len(images))
-                    try:
-                        webutils.download(images[index], filename)
-                        found = True
-                    except:
-                        tries += 1
-        if found:
-            self.loadImg(filename)
-            self.menu.saveLast(bing=self.bingLast)
+        latest = self.fetcher.store.latest(_BINGMODE)
+        if latest is None or self.bingLast < current:
+            if latest is not None:
+                self.loadImg(latest, fallback=False)
+            self.fetcher.fetchBing()
         else:
+            self.loadImg(latest)
+            self.menu.saveLast(bing=self.bingLast)
+
+    @QtCore.pyqtSlot(str, str, bool)
+    def onImgFetched(self, mode, filename, fresh):
+        # Images from offline history don't count as today's image, so download will be retried next time
+        if mode == _CHROMEMODE:
+            if fresh:
+                self.chromeLast = time.strftime("%Y%m%d")
+                self.menu.saveLast(chrome=self.chromeLast)
+            self.loadImg(filename)
+        elif mode == _BINGMODE:
+            if fresh:
+                self.bingLast = time.strftime("%Y%m%d")
+                self.menu.saveLast(bing=self.bingLast)
+            self.loadImg(filename)
+
+    @QtCore.pyqtSlot(str)
+    def onFetchFailed(self, mode):
+        if mode == _CHROMEMODE:
+            self.showWarning(_CHROME_WARNING)
+        elif mode == _BINGMODE:
             self.showWarning(_BING_WARNING)
 
     def loadYTVideo(self, url):
-        self.hideAll()
+        # If player is already on screen, current video keeps playing until the new one starts
+        if not self.isYTShown():
+            self.hideAll()
         try:
             ytRef = url.split("watch?v=")[1].split("&")[0]
         except:
             try:
                 ytRef = url.split("playlist=")[1].split("&")[0]
             except:
-                ytRef = "BHACKCNDMW8"
+                ytRef = _YT_DEFAULT
+                self.showWarning(_YT_WARNING)
+        if self.reachability.status(_YT_API_URL) is False:
+            self.showWebWarning(True)
+            return
+        self.webUrl = _YT_API_URL
+        self.webIsYT = True
+        self.webLoadStarted = time.perf_counter()
+        player = self.getYTBackend()
+        quality = ""
+        if self.ytAdaptive:
+            quality = self.ytQuality.start(ytRef, self.xmax, self.ymax)
+            _LOGGER.info("YouTube video %s: starting at %s quality" % (ytRef, quality))
+        player.load(ytRef, quality)
+        if not self.ytView.isVisible():
+            self.resizeWebView()
+            self.ytView.show()
+        self.reachability.probe(_YT_API_URL)
+
+    @QtCore.pyqtSlot(str, int)
+    def onYTStateChanged(self, videoId, state):
+        if state == jaawweb.YT_PLAYING:
+            self.ytRetryDelay = _YT_RETRY_SECS[0]
+        if state == jaawweb.YT_PLAYING and self.webLoadStarted:
+            self.metrics.observe("jaaw_web_load_ms", (time.perf_counter() - self.webLoadStarted) * 1000,
+                                 {"page": "youtube", "ok": "true"})
+            self.webLoadStarted = 0.0
+
+    @QtCore.pyqtSlot(str, int, int, int)
+    def onYTQualitySampled(self, videoId, dropped, total, height):
+        if not self.ytAdaptive or self.ytQuality is None or videoId != self.ytQuality.videoId or self.renderingPaused:
+            return
+        change = self.ytQuality.sample(dropped, total)
+        if change is not None:
+            quality, reason = change
+            _LOGGER.info("YouTube video %s: switching to %s quality (%s, playing at %dp)" %
+                         (videoId, quality, reason, height))
+            self.metrics.inc("jaaw_yt_quality_changes_total", {"quality": quality})
+            self.ytPlayer.setQuality(quality)
+
+    @QtCore.pyqtSlot(str)
+    def onYTQualityUnsupported(self, videoId):
+        _LOGGER.warning("YouTube player offers no way to set playback quality (video %s): "
+                        "quality is left to the player" % videoId)
+
+    @QtCore.pyqtSlot(str, int)
+    def onYTFailed(self, videoId, code):
+        # Failed videos are replaced by default one, warning only once for each of them
+        _LOGGER.info("Unable to play YouTube video %s: error %d" % (videoId, code))
+        self.metrics.inc("jaaw_video_errors_total", {"error": "youtube_%d" % code})
+        if self.webLoadStarted:
+            self.metrics.observe("jaaw_web_load_ms", (time.perf_counter() - self.webLoadStarted) * 1000,
+                                 {"page": "youtube", "ok": "false"})
+            self.webLoadStarted = 0.0
+        if code == jaawweb.YT_API_ERROR:
+            # Player itself could not be loaded (e.g. network blip): retried later, see onUrlProbed
+            self.ytRetrying = True
+            self.reachability.probe(_YT_API_URL, force=True)
+        elif videoId != _YT_DEFAULT:
+            if videoId != self.prevYTVideo:
+                self.prevYTVideo = videoId
                 self.showWarning(_YT_WARNING)
-        # Remove "&qv=hd720" in case videos with lower quality do not load
-        urlEmbed = "https://www.youtube.com/embed/%s?autoplay=1&loop=1&playlist=%s&mute=1&controls=0&rel=0&qv=hd720" \
-                   % (ytRef, ytRef)
-        self.loadWebPage(urlEmbed, isYTUrl=True)
-
-    def loadWebPage(self, url, isYTUrl=False):
-        if webutils.httpPing(url):
-            # First resize, then move or a gap may show up on the upper side of the screen
-            if self.imgSizeMode == _ORIGINAL:
-                self.setFixedSize(self.xmax, self.ymax)
-                self.move(0, 0)
+            self.loadYTVideo("watch?v=" + _YT_DEFAULT)
+
+    @QtCore.pyqtSlot()
+    def retryYTVideo(self):
+        if self.reachability.status(_YT_API_URL) is False:
+            self.reachability.probe(_YT_API_URL, force=True)
+        else:
+            self.ytRetrying = False
+            _LOGGER.info("Loading YouTube player again")
+            self.loadYTVideo(self.ytUrl)
+
+    def loadWebPage(self, url):
+        # Load optimistically. Reachability is checked in background, falling back only if it fails
+        if self.reachability.status(url) is not False:
+            self.resizeWebView()
+            self.webUrl = url
+            self.webIsYT = False
+            self.webUsage[url] += 1
+            webView = self.getWebBackend()
+            page = self.webPool.take(url) if self.webPool is not None else None
+            if page is not None:
+                # Already loaded in background: just swap it in, and keep previous page for next switches
+                previous = webView.page()
+                previous.setParent(self.webPool)
+                webView.setPage(page)
+                page.setParent(webView)
+                self.webFrame = page
+                self.webPool.give(previous.requestedUrl().toString(), previous)
+                self.metrics.observe("jaaw_web_load_ms", 0.0, {"page": "url", "ok": "true", "source": "pool"})
+                self.webLoadStarted = 0.0
+                self.preloadWebPages()
             else:
-                ratio = (self.xmax / (1920 * (self.ymax / 1080)))
-                width = max(self.xmax, int(self.xmax * ratio))
-                height = max(self.ymax, int(self.ymax * ratio))
-                self.setFixedSize(width, height)
-                self.move(min(0, -int((width - self.xmax) / 2)), min(0, -int((height - self.ymax) / 2)))
-            self.webView.load(QtCore.QUrl(url))
-            self.webView.show()
-        elif isYTUrl:
+                self.webLoadStarted = time.perf_counter()
+                webView.load(QtCore.QUrl(url))
+            webView.show()
+            self.reachability.probe(url)
+        else:
+            self.showWebWarning(False)
+
+    def preloadWebPages(self):
+        # Next pages in the list first, then most used ones
+        if self.webPool is None or self.wallPaperMode != _WEBMODE or self.webMode != _URLMODE or self.urlSnapshot:
+            return
+        urls = self.config["url"]
+        index = urls.index(self.url) if self.url in urls else 0
+        others = [url for url in urls[index + 1:] + urls[:index] if url != self.url]
+        self.webPool.preload(sorted(others, key=lambda url: -self.webUsage[url]))
+
+    def isWebSnapshot(self):
+        return self.wallPaperMode == _WEBMODE and self.webMode == _URLMODE and self.urlSnapshot
+
+    def getSnapshotPath(self, url):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(getCacheFolder("snapshots"), "%s_%dx%d.png" % (name, self.xmax, self.ymax))
+
+    def loadWebSnapshot(self, url):
+        # Page is shown as an image, so no renderer is kept running. Last snapshot shows up first
+        snapshot = self.getSnapshotPath(url)
+        if os.path.isfile(snapshot):
+            self.loadImg(snapshot, fallback=False)
+        if self.reachability.status(url) is not False:
+            self.takeWebSnapshot()
+        elif self.currentImg:
+            self.startSnapshotTimer()
+        else:
+            self.showWebWarning(False)
+
+    @QtCore.pyqtSlot()
+    def takeWebSnapshot(self):
+        if self.isWebSnapshot() and self.url:
+            self.snapshotTimer.stop()
+            self.webLoadStarted = time.perf_counter()
+            self.getSnapshotBackend().take(self.url, self.xmax, self.ymax)
+
+    @QtCore.pyqtSlot()
+    def refreshWebSnapshot(self):
+        if self.isWebSnapshot() and not self.renderingPaused and \
+                (self.snapshotter is None or not self.snapshotter.isBusy()):
+            self.takeWebSnapshot()
+
+    def startSnapshotTimer(self):
+        if self.urlSnapshotPeriod <= 0:
+            return
+        if self.renderingPaused:
+            self.renderingPaused["snapshot"] = self.urlSnapshotPeriod * 1000
+        else:
+            self.snapshotTimer.start(self.urlSnapshotPeriod * 1000)
+
+    def observeSnapshot(self, ok):
+        if self.webLoadStarted:
+            self.metrics.observe("jaaw_web_load_ms", (time.perf_counter() - self.webLoadStarted) * 1000,
+                                 {"page": "snapshot", "ok": str(ok).lower()})
+            self.webLoadStarted = 0.0
+
+    @QtCore.pyqtSlot(str, QtGui.QImage)
+    def onWebSnapshotReady(self, url, image):
+        if not self.isWebSnapshot() or url != self.url:
+            return
+        snapshot = self.getSnapshotPath(url)
+        saved = image.save(snapshot)
+        self.observeSnapshot(saved)
+        if saved:
+            self.loadImg(snapshot, fallback=False)
+        else:
+            _LOGGER.info("Unable to save snapshot of %s to %s" % (url, snapshot))
+        jaawmemory.releaseMemory()
+        self.startSnapshotTimer()
+
+    @QtCore.pyqtSlot(str)
+    def onWebSnapshotFailed(self, url):
+        if not self.isWebSnapshot() or url != self.url:
+            return
+        _LOGGER.info("Unable to take snapshot of %s" % url)
+        self.observeSnapshot(False)
+        if self.currentImg:
+            # Keep showing last snapshot, and try again later
+            self.startSnapshotTimer()
+        else:
+            self.showWebWarning(False)
+
+    def resizeWebView(self):
+        # First resize, then move or a gap may show up on the upper side of the screen
+        if self.imgSizeMode == _ORIGINAL:
+            self.setFixedSize(self.xmax, self.ymax)
+            self.move(0, 0)
+        else:
+            ratio = (self.xmax / (1920 * (self.ymax / 1080)))
+            width = max(self.xmax, int(self.xmax * ratio))
+            height = max(self.ymax, int(self.ymax * ratio))
+            self.setFixedSize(width, height)
+            self.move(min(0, -int((width - self.xmax) / 2)), min(0, -int((height - self.ymax) / 2)))
+
+    def showWebWarning(self, isYTUrl):
+        if isYTUrl:
             self.showWarning(_YT_WARNING)
         else:
             self.showWarning(_WEB_WARNING)
 
+    @QtCore.pyqtSlot(str, bool)
+    def onUrlProbed(self, url, reachable):
+        if not reachable and url == self.webUrl:
+            self.webUrl = ""
+            self.showWebWarning(self.webIsYT)
+        if url == _YT_API_URL and self.ytRetrying and not self.ytRetryTimer.isActive():
+            self.ytRetryTimer.start(self.ytRetryDelay * 1000)
+            self.ytRetryDelay = min(self.ytRetryDelay * 2, _YT_RETRY_SECS[1])
+
+    @QtCore.pyqtSlot(bool)
+    def onWebLoadFinished(self, ok):
+        if self.webLoadStarted:
+            self.metrics.observe("jaaw_web_load_ms", (time.perf_counter() - self.webLoadStarted) * 1000,
+                                 {"page": "url", "ok": str(ok).lower(), "source": "load"})
+            self.webLoadStarted = 0.0
+            if ok:
+                self.preloadWebPages()
+        if not ok and self.webUrl:
+            # Also happens when loading is stopped or replaced, so confirm it before falling back
+            self.reachability.probe(self.webUrl, force=True)
+
     @QtCore.pyqtSlot()
     def showHelp(self):
         self.showWarning(_HELP_MSG)
@@ -396,10 +1249,10 @@ class Window(QtWidgets.QMainWindow):
             self.msgBox.setIcon(QtWidgets.QMessageBox.Warning)
             self.msgBox.setText("Video not supported, moved or corrupted")
             self.msgBox.setWindowTitle("Jaaw! Warning")
-            self.msgBox.setDetailedText(self.video + " failed to load\n"
+            self.msgBox.setDetailedText(self.videoError[0] + " failed to load\n"
                                         "Right-click the Jaaw! tray icon to open settings and select a new one"
                                         "\nNot all video formats can be played out-of-the-box depending on the OS you're using. Be sure you installed all required codecs for the selected format\n"
-                                        + str(self.mediaPlayer.error()) + " " + self.mediaPlayer.errorString())
+                                        + self.videoError[1])
             self.msgBox.setStandardButtons(QtWidgets.QMessageBox.Ok)
             self.msgBox.exec_()
 
@@ -455,41 +1308,363 @@ class Window(QtWidgets.QMainWindow):
             self.msgBox.setStandardButtons(QtWidgets.QMessageBox.Ok)
             self.msgBox.exec_()
 
-    def handlePlayError(self):
-        if self.video != self.prevVideo:
-            self.prevVideo = self.video
+    @QtCore.pyqtSlot(str, int, str)
+    def handlePlayError(self, video, error, message):
+        # Failed videos are skipped. Warning is only shown when there is nothing left to play
+        _LOGGER.info("Unable to play video %s: %s" % (video, message))
+        self.metrics.inc("jaaw_video_errors_total", {"error": error})
+        self.videoError = (video, str(error) + " " + message)
+        if self.videoPlayer is not None and not self.videoPlayer.items and video != self.prevVideo:
+            self.prevVideo = video
             self.showWarning(_VID_WARNING)
 
+    @QtCore.pyqtSlot()
+    def pauseRendering(self):
+        if self.renderingPaused:
+            return
+        if self.timer.isActive():
+            self.renderingPaused["timer"] = self.timer.remainingTime()
+            self.timer.stop()
+        if self.videoPlayer is not None and self.videoPlayer.isPlaying():
+            self.renderingPaused["video"] = True
+            self.videoPlayer.pause()
+        if self.animation.isActive():
+            self.renderingPaused["animation"] = True
+            self.animation.pause()
+        if self.snapshotTimer.isActive():
+            self.renderingPaused["snapshot"] = self.snapshotTimer.remainingTime()
+            self.snapshotTimer.stop()
+        if self.ytRetryTimer.isActive():
+            self.renderingPaused["ytretry"] = self.ytRetryTimer.remainingTime()
+            self.ytRetryTimer.stop()
+        if self.webView is not None and self.webView.isVisible():
+            # Visible pages can not be frozen
+            self.renderingPaused["web"] = True
+            self.webView.hide()
+            self.webFrame.setLifecycleState(QtWebEngineWidgets.QWebEnginePage.LifecycleState.Frozen)
+        if self.ytView is not None and self.ytView.isVisible():
+            # Paused through player API instead of freezing the page, so it is not reloaded when resumed
+            self.renderingPaused["youtube"] = True
+            self.ytPlayer.pause()
+            self.ytView.hide()
+
+    @QtCore.pyqtSlot()
+    def resumeRendering(self):
+        if self.userPaused and self.sender() is self.policy:
+            # Paused on request (see runCommands), so it stays paused even if wallpaper can be seen again
+            return
+        paused = self.renderingPaused
+        self.renderingPaused = {}
+        if "web" in paused and self.webView is not None:
+            self.webFrame.setLifecycleState(QtWebEngineWidgets.QWebEnginePage.LifecycleState.Active)
+            self.webView.show()
+        if "youtube" in paused and self.ytPlayer is not None:
+            self.ytView.show()
+            self.ytPlayer.play()
+            if self.ytQuality is not None:
+                # Frames are not counted while paused
+                self.ytQuality.reset()
+        if "video" in paused and self.videoPlayer is not None:
+            self.videoPlayer.play()
+        if "animation" in paused:
+            self.animation.resume()
+        if "timer" in paused:
+            self.startCarouselTimer(max(0, paused["timer"]))
+        if "snapshot" in paused:
+            self.snapshotTimer.start(max(0, paused["snapshot"]))
+        if "ytretry" in paused:
+            self.ytRetryTimer.start(max(0, paused["ytretry"]))
+
     def hideAll(self):
-        self.bkg_label.clear()
-        self.bkg_label.hide()
+        if self.bkg_label is not None:
+            self.bkg_label.clear()
+            self.bkg_label.hide()
+        self.hideScreens()
+        self.currentImg = ""
         self.timer.stop()
-        if self.mediaPlayer.isVideoAvailable(): self.mediaPlayer.stop()
-        self.playlist.clear()
-        self.mediaPlayer.setPlaylist(self.playlist)
-        self.videoWidget.hide()
-        self.webView.stop()
-        self.webView.hide()
+        self.snapshotTimer.stop()
+        if self.snapshotter is not None:
+            self.snapshotter.cancel()
+        self.ytRetryTimer.stop()
+        self.ytRetrying = False
+        self.animation.stop()
+        self.prefetcher.cancel()
+        self.fetcher.cancel()
+        self.waitingImgs = False
+        self.renderingPaused = {}
+        if self.videoPlayer is not None:
+            self.videoPlayer.stop()
+            self.videoWidget.hide()
+            self.videoWidget.clear()
+        self.webUrl = ""
+        self.webLoadStarted = 0.0
+        if self.webView is not None:
+            self.webView.stop()
+            self.webView.hide()
+        if self.ytPlayer is not None:
+            # Not stopped, so page (and player) are still loaded if next content is a YouTube video
+            self.ytPlayer.pause()
+            self.ytView.hide()
+        self.dropRecycledView()
         self.setFixedSize(1, 1)
         self.move(0, 0)
+        self.activeBackends = set()
+        if self.backendIdle > 0:
+            self.unloadTimer.start(self.backendIdle * 1000)
+
+    @QtCore.pyqtSlot()
+    def exportMetrics(self):
+        self.metrics.set("jaaw_uptime_seconds", int(time.monotonic() - self.metrics.started))
+        self.metrics.set("jaaw_rendering_paused", 1 if self.renderingPaused else 0)
+        self.metrics.set("jaaw_img_cache_bytes", self.imgCache.size)
+        self.metrics.set("jaaw_web_cache_bytes", self.fetcher.store.stats()["bytes"])
+        if self.webPool is not None:
+            self.metrics.set("jaaw_web_pool_pages", len(self.webPool.pages))
+        if self.governor.rss:
+            self.metrics.set("jaaw_memory_rss_bytes", self.governor.rss, {"process": "main"})
+            self.metrics.set("jaaw_memory_rss_bytes", self.governor.webRss, {"process": "web"})
+        if self.metricsTooltip:
+            self.menu.setSummary(self.getMetricsSummary())
+        if self.metricsFile:
+            self.metrics.save(self.metricsFile, self.metricsFormat)
+
+    @QtCore.pyqtSlot()
+    def shrinkCaches(self):
+        # Halves in-memory caches. Whatever is on screen is still referenced by its widget, so it is not lost
+        imgCache, animation = self.imgCache.size, self.animation.size
+        self.imgCache.trim(self.imgCache.size // 2)
+        self.animation.trim(self.animation.size // 2)
+        QtGui.QPixmapCache.clear()
+        if self.webPool is not None and self.webPool.size:
+            self.webPool.shrink()
+            _LOGGER.info("Web page pool shrunk to %d pages" % self.webPool.size)
+        jaawmemory.releaseMemory()
+        self.metrics.inc("jaaw_memory_actions_total", {"action": "shrink"})
+        _LOGGER.info("Image cache shrunk from %d to %d MB, animation frames from %d to %d MB" %
+                     (imgCache >> 20, self.imgCache.size >> 20, animation >> 20, self.animation.size >> 20))
+
+    @QtCore.pyqtSlot()
+    def recycleWebPage(self):
+        # A new page (so a new renderer process) is loaded hidden, and replaces current one once loaded
+        if self.webView is None:
+            return
+        if self.webPool is not None and self.webPool.pages:
+            # Pooled pages go first: each one has its own renderer
+            self.metrics.inc("jaaw_memory_actions_total", {"action": "pool"})
+            self.webPool.shrink()
+            _LOGGER.info("Web page pool shrunk to %d pages to free memory" % self.webPool.size)
+        elif "web" not in self.activeBackends:
+            _LOGGER.info("Unloading idle web backend to free memory")
+            self.unloadIdleBackends()
+        elif self.webUrl and self.recycledView is None and not self.renderingPaused:
+            self.metrics.inc("jaaw_memory_actions_total", {"action": "recycle"})
+            self.recycledView = self.createWebView()
+            view = self.recycledView
+            view.setGeometry(self.webView.geometry())
+            view.loadFinished.connect(lambda ok: self.onRecycledPageLoaded(view, ok))
+            view.load(self.webView.url())
+
+    def onRecycledPageLoaded(self, view, ok):
+        if view is not self.recycledView:
+            return
+        self.recycledView = None
+        if not ok or self.webView is None:
+            _LOGGER.info("Web page could not be recycled, keeping current one")
+            self.removeBackendWidget(view)
+            return
+        old = self.webView
+        self.webView = view
+        self.webFrame = view.page()
+        view.loadFinished.connect(self.onWebLoadFinished)
+        view.show()
+        old.stop()
+        self.removeBackendWidget(old)
+        jaawmemory.releaseMemory()
+        _LOGGER.info("Web page recycled")
+
+    def dropRecycledView(self):
+        if self.recycledView is not None:
+            self.recycledView.stop()
+            self.removeBackendWidget(self.recycledView)
+            self.recycledView = None
+
+    def runCommands(self, request):
+        # Commands from ControlServer (a dict or a list of them). Settings changes are applied once per batch
+        commands = request if isinstance(request, list) else [request]
+        results = []
+        pending = False
+        for command in commands:
+            name = command.get("cmd", "") if isinstance(command, dict) else ""
+            if pending and name in ("next_image", "pause", "resume", "status"):
+                # These act on current content, so previous settings changes have to be applied first
+                self.menu.saveSettings()
+                pending = False
+            try:
+                result = self.runCommand(name, command)
+                pending = pending or name in ("set_image", "set_folder", "set_url")
+            except (ValueError, TypeError) as e:
+                result = {"ok": False, "error": str(e)}
+            _LOGGER.info("Command %s: %s" % (name or "?", "done" if result["ok"] else result["error"]))
+            results.append(result)
+        if pending:
+            self.menu.saveSettings()
+        return {"ok": all(result["ok"] for result in results), "results": results}
+
+    def runCommand(self, name, command):
+        if name == "set_image":
+            path = command.get("path", "")
+            if not os.path.isfile(path) or not path.lower().endswith(_IMG_EXTENSIONS):
+                raise ValueError("not a valid image file: %s" % path)
+            self.menu.setImage(path, apply=False)
+        elif name == "set_folder":
+            path = command.get("path", "")
+            if not os.path.isdir(path):
+                raise ValueError("not a folder: %s" % path)
+            recursive = command.get("recursive", None)
+            if recursive is not None and not isinstance(recursive, bool):
+                raise ValueError("recursive must be true or false: %s" % recursive)
+            self.menu.setFolder(path, recursive, apply=False)
+        elif name == "next_image":
+            if self.wallPaperMode != _IMGMODE or self.imgMode != _IMGCAROUSEL:
+                raise ValueError("not showing a folder")
+            if not self.imgList and self.waitingImgs:
+                return {"ok": True, "pending": True}
+            if not self.imgList:
+                raise ValueError("folder has no images")
+            self.loadNextImg()
+            if self.timer.isActive():
+                self.startCarouselTimer(self.imgPeriod * 1000)
+            elif "timer" in self.renderingPaused:
+                self.renderingPaused["timer"] = self.imgPeriod * 1000
+        elif name == "set_url":
+            url = command.get("url", "")
+            if not QtCore.QUrl(url, QtCore.QUrl.StrictMode).isValid() or "://" not in url:
+                raise ValueError("not a valid URL: %s" % url)
+            self.menu.setUrl(url, apply=False)
+        elif name == "pause":
+            self.userPaused = True
+            self.pauseRendering()
+        elif name == "resume":
+            self.userPaused = False
+            if not self.policy.isPaused:
+                self.resumeRendering()
+        elif name == "status":
+            return {"ok": True, "status": self.getStatus()}
+        else:
+            raise ValueError("unknown command: %s" % (name or command))
+        return {"ok": True}
+
+    def getStatus(self):
+        return {"content": self.getContentKey(self.config), "image": self.currentImg,
+                "paused": bool(self.renderingPaused), "paused_by_user": self.userPaused,
+                "backends": sorted(self.activeBackends), "pid": os.getpid(), "summary": self.getMetricsSummary()}
+
+    def getMetricsSummary(self):
+        # Short enough for a tray icon tooltip (Windows truncates them to 127 chars)
+        lines = []
+        images = self.metrics.getHistogram("jaaw_image_load_ms")
+        if images["count"]:
+            lines.append("Images: %d ms avg, %d max" % (images["avg"], images["max"]))
+        drift = self.metrics.getHistogram("jaaw_carousel_drift_ms")
+        if drift["count"]:
+            lines.append("Timer drift: %d ms max" % drift["max"])
+        fetches = self.metrics.getHistogram("jaaw_fetch_ms")
+        if fetches["count"]:
+            lines.append("Downloads: %d ms avg, %d failed" % (fetches["avg"],
+                                                             self.metrics.getCounter("jaaw_download_errors_total")))
+        pages = self.metrics.getHistogram("jaaw_web_load_ms")
+        if pages["count"]:
+            failed = self.metrics.getHistogram("jaaw_web_load_ms", ok="false")["count"]
+            lines.append("Web: %d ms avg, %d failed" % (pages["avg"], failed))
+        videoErrors = self.metrics.getCounter("jaaw_video_errors_total")
+        if videoErrors:
+            lines.append("Video errors: %d" % videoErrors)
+        if self.renderingPaused:
+            lines.append("Paused")
+        return "\n".join(lines)
 
     @QtCore.pyqtSlot()
     def closeAll(self):
+        if self.needsHeavyBackend() and self.contentStarted and not _STARTUP_PROFILE:
+            # Shown at next startup, while video / web engines load
+            self.grab().scaled(self.xmax, self.ymax, QtCore.Qt.KeepAspectRatioByExpanding).save(
+                os.path.join(getCacheFolder(), _LAST_WALLPAPER))
+        _LOGGER.info("Image cache stats: %s" % self.imgCache.stats())
+        _LOGGER.info("Web cache stats: %s" % self.fetcher.store.stats())
+        self.exportMetrics()
+        self.settings.flush()
         self.hideAll()
+        self.closeImgPack()
+        self.closeFolderIndex()
+        self.allScreens = False
+        self.updateScreens()
         # QtCore.QCoreApplication.instance().quit()
         QtWidgets.QApplication.quit()
 
 
+class ScreenSurface(QtWidgets.QMainWindow):
+    # Wallpaper window for a secondary screen, showing images already decoded and scaled by Window
+
+    screenChanged = QtCore.pyqtSignal(object)
+
+    def __init__(self, screen, *args, **kwargs):
+        QtWidgets.QMainWindow.__init__(self, *args, **kwargs)
+
+        self.targetScreen = screen
+        qtutils.initDisplay(self, caption=_CAPTION)
+        self.setStyleSheet("background-color:black")
+        self.label = QtWidgets.QLabel()
+        self.label.setAlignment(QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter)
+        self.setCentralWidget(self.label)
+        self.sentBehind = False
+        self.relocate()
+        screen.availableGeometryChanged.connect(self.onScreenChanged)
+        screen.logicalDotsPerInchChanged.connect(self.onScreenChanged)
+
+    def relocate(self):
+        self.setGeometry(self.targetScreen.availableGeometry())
+        self.setFixedSize(self.targetScreen.availableGeometry().size())
+
+    def getTargetSize(self):
+        # In physical pixels, so images look sharp on high DPI screens
+        size = self.targetScreen.availableGeometry().size() * self.targetScreen.devicePixelRatio()
+        return size.width(), size.height()
+
+    @QtCore.pyqtSlot()
+    def onScreenChanged(self):
+        self.relocate()
+        self.screenChanged.emit(self)
+
+    def setPixmap(self, pixmap):
+        # On a copy, since pixmap is shared with cache (and other screens)
+        pixmap = QtGui.QPixmap(pixmap)
+        pixmap.setDevicePixelRatio(self.targetScreen.devicePixelRatio())
+        self.label.setPixmap(pixmap)
+        self.show()
+        if not self.sentBehind:
+            self.sentBehind = True
+            QtCore.QTimer.singleShot(1000, self.sendBehind)
+
+    def clear(self):
+        self.label.clear()
+        self.hide()
+
+    def sendBehind(self):
+        pywinctl.Window(self.winId()).sendBehind()
+
+
 class Config(QtWidgets.QWidget):
 
     reloadSettings = QtCore.pyqtSignal()
     closeAll = QtCore.pyqtSignal()
     showHelp = QtCore.pyqtSignal()
+    refreshSnapshot = QtCore.pyqtSignal()
 
-    def __init__(self, parent, config):
+    def __init__(self, parent, config, settings):
         QtWidgets.QWidget.__init__(self, parent)
 
         self.config = config
+        self.settings = settings
         self.setupUI()
 
     def setupUI(self):
@@ -517,6 +1692,8 @@ class Config(QtWidgets.QWidget):
 
         self.videoAct = self.contextMenu.addMenu("Video")
         self.lvideoAct = self.videoAct.addAction("Local video file", self.openVideo)
+        self.pvideoAct = self.videoAct.addAction("Local videos folder (playlist)", self.openVideoFolder)
+        self.cvideoAct = self.videoAct.addAction("Low CPU renderer (this video)", self.toggleVideoRenderer)
         self.yvideoAct = self.videoAct.addMenu("YouTube video")
         ytUrls = self.config["yt_url"]
         ytUrl = self.config["yt_url"][self.config["yt_index"] if 0 <= self.config["yt_index"] < len(ytUrls) else 0]
@@ -534,12 +1711,15 @@ class Config(QtWidgets.QWidget):
         self.uwebAct.addAction("-- Enter New Web Page URL --", self.addNewUrl)
         for item in urls:
             self.addUrlOpts(self.uwebAct, item, selected=(url == item))
+        self.swebAct = self.webAct.addAction("Static snapshot (web page)", self.toggleUrlSnapshot)
+        self.rwebAct = self.webAct.addAction("Refresh snapshot now", self.sendRefreshSnapshot)
 
         self.contextMenu.addSeparator()
         self.imgmAct = self.contextMenu.addMenu("Image size mode")
         self.imgmoAct = self.imgmAct.addAction("Original size", (lambda: self.changeMode(_ORIGINAL)))
         self.imgmfAct = self.imgmAct.addAction("Fit screen (keep ratio)", (lambda: self.changeMode(_FIT)))
         self.imgmsAct = self.imgmAct.addAction("Fit screen (stretch)", (lambda: self.changeMode(_STRETCH)))
+        self.screensAct = self.contextMenu.addAction("All screens (images only)", self.toggleAllScreens)
         self.helpAct = self.contextMenu.addAction("Help", self.sendShowHelp)
         self.quitAct = self.contextMenu.addAction("Quit", self.sendCloseAll)
 
@@ -553,7 +1733,7 @@ class Config(QtWidgets.QWidget):
         self.imgDialog = QtWidgets.QFileDialog()
         self.imgDialog.setFileMode(QtWidgets.QFileDialog.ExistingFile)
         self.imgDialog.setWindowTitle("Select Image")
-        self.imgDialog.setNameFilter("Image Files (*.png *.jpg *.jpeg *.bmp)")
+        self.imgDialog.setNameFilter("Image Files (*.png *.jpg *.jpeg *.bmp *.gif *.webp)")
 
         self.folderDialog = QtWidgets.QFileDialog()
         self.folderDialog.setFileMode(QtWidgets.QFileDialog.DirectoryOnly)
@@ -564,6 +1744,10 @@ class Config(QtWidgets.QWidget):
         self.videoDialog.setWindowTitle("Select video")
         self.videoDialog.setNameFilter("Video Files (*.flv *.ts *.mts *.avi *.wmv *.mp4 *.mov")
 
+        self.videoFolderDialog = QtWidgets.QFileDialog()
+        self.videoFolderDialog.setFileMode(QtWidgets.QFileDialog.DirectoryOnly)
+        self.videoFolderDialog.setWindowTitle("Select videos folder")
+
         self.ytDialog = QtWidgets.QDialog()
         self.ytDialog.setWindowTitle("Enter YouTube URL")
         self.ytDialog.setWhatsThis("Enter Youtube URL\nBe aware some videos may not work")
@@ -667,11 +1851,15 @@ class Config(QtWidgets.QWidget):
         self.imgmsAct.setIcon(self.iconNotSelected)
         self.videoAct.setIcon(self.iconNotSelected)
         self.lvideoAct.setIcon(self.iconNotSelected)
+        self.pvideoAct.setIcon(self.iconNotSelected)
+        self.cvideoAct.setIcon(self.iconNotSelected)
         self.yvideoAct.setIcon(self.iconNotSelected)
         self.webAct.setIcon(self.iconNotSelected)
         self.chromeAct.setIcon(self.iconNotSelected)
         self.bingAct.setIcon(self.iconNotSelected)
         self.uwebAct.setIcon(self.iconNotSelected)
+        self.swebAct.setIcon(self.iconNotSelected)
+        self.screensAct.setIcon(self.iconNotSelected)
 
         if self.config["img_size_mode"] == _ORIGINAL:
             self.imgmoAct.setIcon(self.iconSelected)
@@ -680,6 +1868,15 @@ class Config(QtWidgets.QWidget):
         elif self.config["img_size_mode"] == _STRETCH:
             self.imgmsAct.setIcon(self.iconSelected)
 
+        if self.config.get("video_renderers", {}).get(self.config["video"], _RENDER_DEFAULT) == _RENDER_CAPPED:
+            self.cvideoAct.setIcon(self.iconSelected)
+        if self.config.get("url_snapshot", False):
+            self.swebAct.setIcon(self.iconSelected)
+        if self.config.get("all_screens", True):
+            self.screensAct.setIcon(self.iconSelected)
+        self.rwebAct.setEnabled(self.config["mode"] == _WEBMODE and self.config["web_mode"] == _URLMODE and
+                                self.config.get("url_snapshot", False))
+
         if self.config["mode"] == _IMGMODE:
             self.imgAct.setIcon(self.iconSelected)
             if self.config["img_mode"] == _IMGFIXED:
@@ -691,6 +1888,8 @@ class Config(QtWidgets.QWidget):
             self.videoAct.setIcon(self.iconSelected)
             if self.config["video_mode"] == _VIDLOCAL:
                 self.lvideoAct.setIcon(self.iconSelected)
+            elif self.config["video_mode"] == _VIDPLAYLIST:
+                self.pvideoAct.setIcon(self.iconSelected)
             elif self.config["video_mode"] == _VIDYT:
                 self.yvideoAct.setIcon(self.iconSelected)
 
@@ -716,10 +1915,14 @@ class Config(QtWidgets.QWidget):
             fileName = self.imgDialog.selectedFiles()[0]
 
         if fileName:
-            self.config["img"] = fileName
-            self.config["mode"] = _IMGMODE
-            self.config["img_mode"] = _IMGFIXED
-            self.updateCheck()
+            self.setImage(fileName)
+
+    def setImage(self, fileName, apply=True):
+        self.config["img"] = fileName
+        self.config["mode"] = _IMGMODE
+        self.config["img_mode"] = _IMGFIXED
+        self.updateCheck()
+        if apply:
             self.saveSettings()
 
     def openFolder(self):
@@ -733,10 +1936,16 @@ class Config(QtWidgets.QWidget):
             fileName = self.folderDialog.selectedFiles()[0]
 
         if fileName:
-            self.config["folder"] = fileName
-            self.config["mode"] = _IMGMODE
-            self.config["img_mode"] = _IMGCAROUSEL
-            self.updateCheck()
+            self.setFolder(fileName)
+
+    def setFolder(self, fileName, recursive=None, apply=True):
+        self.config["folder"] = fileName
+        if recursive is not None:
+            self.config["folder_recursive"] = bool(recursive)
+        self.config["mode"] = _IMGMODE
+        self.config["img_mode"] = _IMGCAROUSEL
+        self.updateCheck()
+        if apply:
             self.saveSettings()
 
     def changeMode(self, mode):
@@ -762,6 +1971,46 @@ class Config(QtWidgets.QWidget):
             self.updateCheck()
             self.saveSettings()
 
+    def openVideoFolder(self):
+
+        fileName = ""
+        playlist = self.config.get("video_playlist", [])
+        folder = playlist[0] if playlist else os.path.dirname(self.config["video"])
+        if not os.path.isdir(folder):
+            folder = "."
+        self.videoFolderDialog.setDirectory(folder)
+        if self.videoFolderDialog.exec_() == QtWidgets.QFileDialog.Accepted:
+            fileName = self.videoFolderDialog.selectedFiles()[0]
+
+        if fileName:
+            self.config["video_playlist"] = [fileName]
+            self.config["mode"] = _VIDMODE
+            self.config["video_mode"] = _VIDPLAYLIST
+            self.updateCheck()
+            self.saveSettings()
+
+    def toggleVideoRenderer(self):
+        renderers = self.config.setdefault("video_renderers", {})
+        if renderers.get(self.config["video"], _RENDER_DEFAULT) == _RENDER_CAPPED:
+            renderers.pop(self.config["video"], None)
+        else:
+            renderers[self.config["video"]] = _RENDER_CAPPED
+        self.updateCheck()
+        self.saveSettings()
+
+    def toggleUrlSnapshot(self):
+        self.config["url_snapshot"] = not self.config.get("url_snapshot", False)
+        self.updateCheck()
+        self.saveSettings()
+
+    def toggleAllScreens(self):
+        self.config["all_screens"] = not self.config.get("all_screens", True)
+        self.updateCheck()
+        self.saveSettings()
+
+    def sendRefreshSnapshot(self):
+        self.refreshSnapshot.emit()
+
     def openYT(self):
         self.ytDialog.close()
         self.config["mode"] = _VIDMODE
@@ -794,22 +2043,31 @@ class Config(QtWidgets.QWidget):
 
     def openURL(self):
         self.urlDialog.close()
+        text = self.urlEdit.text()
+        if text:
+            self.setUrl(text)
+
+    def setUrl(self, text, apply=True):
         self.config["mode"] = _WEBMODE
         self.config["web_mode"] = _URLMODE
-        text = self.urlEdit.text()
-        if text and text not in self.config["url"]:
+        if text in self.config["url"]:
+            self.config["url_index"] = self.config["url"].index(text)
+        else:
             if len(self.config["url"]) >= 10:
                 self.config["url"].pop(0)
-                self.uwebAct.removeAction(self.yvideoAct.actions()[1])
+                self.uwebAct.removeAction(self.uwebAct.actions()[1])
             self.config["url"].append(text)
-            for option in self.uwebAct.actions():
-                option.setIcon(self.iconNotSelected)
-            option = self.uwebAct.addAction(text, (lambda: self.execUrlAct(text)))
-            option.setIcon(self.iconSelected)
+            self.uwebAct.addAction(text, (lambda: self.execUrlAct(text)))
             self.config["url_index"] = len(self.config["url"]) - 1
-            self.updateCheck()
+        for i, option in enumerate(self.uwebAct.actions()):
+            option.setIcon(self.iconSelected if i > 0 and option.text() == text else self.iconNotSelected)
+        self.updateCheck()
+        if apply:
             self.saveSettings()
 
+    def setSummary(self, summary):
+        self.trayIcon.setToolTip("Jaaw!" + ("\n" + summary if summary else ""))
+
     def sendShowHelp(self):
         self.showHelp.emit()
 
@@ -818,15 +2076,8 @@ class Config(QtWidgets.QWidget):
 
     def saveSettings(self, reload=True):
 
-        if not _IS_MACOS:
-            file = _SETTINGS_FILE
-        else:
-            file = utils.resource_path(__file__, "resources/" + _SETTINGS_FILE)
-        try:
-            with open(file, "w", encoding='UTF-8') as file:
-                json.dump(self.config, file, ensure_ascii=False, sort_keys=False, indent=4)
-        except:
-            pass
+        # Actual writing is delayed, so bursts of changes end up in just one write
+        self.settings.save(self.config)
 
         if reload:
             self.reloadSettings.emit()
@@ -853,7 +2104,11 @@ def exception_hook(exctype, value, tb):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+    # Required to import QtWebEngineWidgets once QApplication exists
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
     app = QtWidgets.QApplication(sys.argv)
+    markStartup("create QApplication")
     if "python" in sys.executable.lower():
         # This will let the script catching Ctl-C interruption (e.g. when running from IDE)
         signal.signal(signal.SIGINT, sigint_handler)
@@ -863,7 +2118,13 @@ if __name__ == "__main__":
         # This will allow to show some tracebacks (not all, anyway)
         sys._excepthook = sys.excepthook
         sys.excepthook = exception_hook
+    if jaawctl.isRunning():
+        # Two instances would fight over the desktop. Running one can be controlled with jaawctl.py instead
+        _LOGGER.info("Jaaw! is already running. Use jaawctl.py to change wallpaper")
+        sys.exit(0)
     win = Window()
+    control = jaawctl.ControlServer(jaawctl.getServerName(), win.runCommands, win)
+    control.listen()
     win.show()
     try:
         app.exec_()
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Command line client to control a running Jaaw! (e.g. from scripts), with no need to edit settings and restart it.
+# Kept apart from jaaw.py, so it starts in milliseconds. Examples:
+#     python jaawctl.py image /path/to/image.jpg
+#     python jaawctl.py folder /path/to/images [--recursive | --no-recursive]
+#     python jaawctl.py next
+#     python jaawctl.py url https://www.nasa.gov
+#     python jaawctl.py pause | resume | status
+#     python jaawctl.py batch '[{"cmd": "set_folder", "path": "/path/to/images"}, {"cmd": "next_image"}]'
+# Server side (ControlServer) is here too, so both ends of the protocol are kept together
+
+import argparse
+import getpass
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from PyQt5 import QtCore, QtNetwork
+
+_LOGGER = logging.getLogger("jaaw")
+
+_TIMEOUT = 5000
+
+
+def getServerName():
+    # One server per user, so several users can run Jaaw! on the same machine
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = ""
+    return "jaaw-" + hashlib.sha1(user.encode("utf-8")).hexdigest()[:10]
+
+
+def isRunning(name=None, timeout=500):
+    socket = QtNetwork.QLocalSocket()
+    socket.connectToServer(name or getServerName())
+    running = socket.waitForConnected(timeout)
+    socket.abort()
+    return running
+
+
+def send(commands, name=None, timeout=_TIMEOUT):
+    # Sends a command (or a list of them, applied in order) and returns the reply: {"ok": ..., "results": [...]}.
+    # Returns None if Jaaw! is not running
+    socket = QtNetwork.QLocalSocket()
+    socket.connectToServer(name or getServerName())
+    if not socket.waitForConnected(timeout):
+        return None
+    socket.write((json.dumps(commands) + "\n").encode("utf-8"))
+    socket.waitForBytesWritten(timeout)
+    data = b""
+    while not data.endswith(b"\n") and socket.waitForReadyRead(timeout):
+        data += bytes(socket.readAll())
+    socket.disconnectFromServer()
+    try:
+        return json.loads(data.decode("utf-8"))
+    except ValueError:
+        return {"ok": False, "error": "no valid reply received"}
+
+
+class ControlServer(QtCore.QObject):
+    # Local socket (named pipe on Windows) accepting commands from scripts (see jaawctl.py). Each request is a line
+    # of JSON (a command or a list of them), answered with a line of JSON returned by handler
+
+    _MAX_REQUEST = 1024 * 1024
+
+    def __init__(self, name, handler, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.name = name
+        self.handler = handler
+        self.server = QtNetwork.QLocalServer(self)
+        self.server.setSocketOptions(QtNetwork.QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.onNewConnection)
+
+    def listen(self):
+        if not self.server.listen(self.name):
+            # Left behind by an instance that crashed (running ones are checked for before starting)
+            QtNetwork.QLocalServer.removeServer(self.name)
+            if not self.server.listen(self.name):
+                _LOGGER.error("Unable to start control server %s: %s" % (self.name, self.server.errorString()))
+                return False
+        return True
+
+    @QtCore.pyqtSlot()
+    def onNewConnection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.readyRead.connect(lambda socket=socket: self.onReadyRead(socket))
+            socket.disconnected.connect(socket.deleteLater)
+            if socket.bytesAvailable():
+                # Request arrived before readyRead was connected, so it won't be signalled again
+                self.onReadyRead(socket)
+
+    def onReadyRead(self, socket):
+        while socket.canReadLine():
+            line = bytes(socket.readLine()).decode("utf-8", "replace").strip()
+            if not line:
+                continue
+            try:
+                reply = self.handler(json.loads(line))
+            except ValueError as e:
+                reply = {"ok": False, "error": "invalid JSON: %s" % e}
+            socket.write((json.dumps(reply) + "\n").encode("utf-8"))
+        if socket.bytesAvailable() > self._MAX_REQUEST:
+            socket.abort()
+
+    def close(self):
+        self.server.close()
+
+
+def getCommands(args):
+    if args.command == "image":
+        return {"cmd": "set_image", "path": os.path.abspath(args.path)}
+    elif args.command == "folder":
+        command = {"cmd": "set_folder", "path": os.path.abspath(args.path)}
+        if args.recursive is not None:
+            # Otherwise, current setting is kept
+            command["recursive"] = args.recursive
+        return command
+    elif args.command == "next":
+        return {"cmd": "next_image"}
+    elif args.command == "url":
+        return {"cmd": "set_url", "url": args.url}
+    elif args.command == "batch":
+        return json.loads(args.commands)
+    return {"cmd": args.command}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control a running Jaaw!")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+    image = commands.add_parser("image", help="show an image")
+    image.add_argument("path")
+    folder = commands.add_parser("folder", help="show images in a folder (carousel)")
+    folder.add_argument("path")
+    folder.add_argument("--recursive", action="store_const", const=True, default=None,
+                        help="include images in subfolders")
+    folder.add_argument("--no-recursive", dest="recursive", action="store_const", const=False,
+                        help="don't include images in subfolders")
+    commands.add_parser("next", help="show next image of the carousel")
+    url = commands.add_parser("url", help="show a web page")
+    url.add_argument("url")
+    commands.add_parser("pause", help="pause video, web pages and carousel")
+    commands.add_parser("resume", help="resume what was paused")
+    commands.add_parser("status", help="show what is being shown")
+    batch = commands.add_parser("batch", help="send a JSON list of commands, applied in order")
+    batch.add_argument("commands")
+    args = parser.parse_args()
+
+    try:
+        request = getCommands(args)
+    except ValueError as e:
+        parser.error("invalid JSON: %s" % e)
+    # Not run, but local sockets need one to exist (e.g. Windows named pipes are read through its event dispatcher)
+    app = QtCore.QCoreApplication(sys.argv)
+    reply = send(request)
+    del app
+    if reply is None:
+        print("Jaaw! is not running", file=sys.stderr)
+        return 2
+    print(json.dumps(reply, indent=4))
+    return 0 if reply.get("ok", False) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
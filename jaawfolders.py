@@ -0,0 +1,184 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Persistent, watched index of the images in a carousel folder
+
+import hashlib
+import json
+import logging
+import os
+
+from PyQt5 import QtCore
+
+_LOGGER = logging.getLogger("jaaw")
+
+
+class FolderScanner(QtCore.QThread):
+    # Streams folder contents using os.scandir(), listing only those folders which changed since last scan
+
+    dirListed = QtCore.pyqtSignal(str, float, list, list)
+    scanDone = QtCore.pyqtSignal(str, list)
+
+    def __init__(self, root, known, extensions, recursive, parent=None):
+        QtCore.QThread.__init__(self, parent)
+
+        self.root = root
+        self.known = known
+        self.extensions = extensions
+        self.recursive = recursive
+
+    def run(self):
+        visited = []
+        stack = [self.root]
+        while stack and not self.isInterruptionRequested():
+            folder = stack.pop()
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                continue
+            visited.append(folder)
+            entry = self.known.get(folder, None)
+            if entry is not None and entry["mtime"] == mtime:
+                if self.recursive:
+                    stack.extend(os.path.join(folder, subdir) for subdir in reversed(entry["subdirs"]))
+                continue
+            files = []
+            subdirs = []
+            try:
+                with os.scandir(folder) as it:
+                    for item in it:
+                        try:
+                            if item.is_dir():
+                                subdirs.append(item.name)
+                            elif item.name.rsplit(".", 1)[-1].lower() in self.extensions and item.is_file():
+                                files.append(item.name)
+                        except OSError:
+                            pass
+            except OSError:
+                continue
+            files.sort()
+            subdirs.sort()
+            self.dirListed.emit(folder, mtime, files, subdirs)
+            if self.recursive:
+                stack.extend(os.path.join(folder, subdir) for subdir in reversed(subdirs))
+        self.scanDone.emit(self.root, visited)
+
+
+class FolderIndex(QtCore.QObject):
+    # Persistent index of a folder's images. Loaded from disk at once, then validated in background and kept
+    # up-to-date using file system notifications, so the folder never needs to be fully listed again
+
+    filesAdded = QtCore.pyqtSignal(list)
+    filesRemoved = QtCore.pyqtSignal(list)
+    scanFinished = QtCore.pyqtSignal()
+
+    _VERSION = 1
+
+    def __init__(self, cacheFolder, folder, extensions, recursive=False, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.folder = os.path.normpath(folder)
+        self.extensions = extensions
+        self.recursive = recursive
+        name = hashlib.sha1(("%s|%s" % (os.path.abspath(folder), recursive)).encode("utf-8")).hexdigest()[:16]
+        self.indexFile = os.path.join(cacheFolder, name + ".json")
+        self.dirs = {}
+        self.files = []
+        self.scanner = None
+        self.pendingRoots = []
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.onDirChanged)
+
+    def matches(self, folder, recursive):
+        return self.folder == os.path.normpath(folder) and self.recursive == recursive
+
+    def start(self):
+        try:
+            with open(self.indexFile, encoding="UTF-8") as file:
+                index = json.load(file)
+            if index["version"] == self._VERSION:
+                self.dirs = index["dirs"]
+        except (OSError, ValueError, KeyError):
+            self.dirs = {}
+        for folder, entry in self.dirs.items():
+            self.files.extend(os.path.join(folder, name) for name in entry["files"])
+        if self.dirs:
+            self.watcher.addPaths(list(self.dirs.keys()))
+        self.scan(self.folder)
+
+    def save(self):
+        try:
+            with open(self.indexFile + ".tmp", "w", encoding="UTF-8") as file:
+                json.dump({"version": self._VERSION, "folder": self.folder, "dirs": self.dirs}, file)
+            os.replace(self.indexFile + ".tmp", self.indexFile)
+        except OSError as e:
+            _LOGGER.warning("Unable to save folder index %s: %s" % (self.indexFile, e))
+
+    def scan(self, root):
+        if self.scanner is not None:
+            if root not in self.pendingRoots:
+                self.pendingRoots.append(root)
+            return
+        self.scanner = FolderScanner(root, dict(self.dirs), self.extensions, self.recursive)
+        self.scanner.dirListed.connect(self.onDirListed)
+        self.scanner.scanDone.connect(self.onScanDone)
+        self.scanner.start()
+
+    @QtCore.pyqtSlot(str, float, list, list)
+    def onDirListed(self, folder, mtime, files, subdirs):
+        if self.sender() is not self.scanner:
+            return
+        entry = self.dirs.get(folder, None)
+        if entry is None:
+            self.watcher.addPath(folder)
+            oldFiles = set()
+        else:
+            oldFiles = set(entry["files"])
+        self.dirs[folder] = {"mtime": mtime, "files": files, "subdirs": subdirs}
+        added = [os.path.join(folder, name) for name in files if name not in oldFiles]
+        removed = oldFiles.difference(files)
+        if removed:
+            self.removeFiles([os.path.join(folder, name) for name in removed])
+        if added:
+            self.files.extend(added)
+            self.filesAdded.emit(added)
+
+    @QtCore.pyqtSlot(str, list)
+    def onScanDone(self, root, visited):
+        if self.sender() is not self.scanner:
+            return
+        self.scanner.wait()
+        self.scanner.deleteLater()
+        self.scanner = None
+        visited = set(visited)
+        # Folders which were indexed but no longer exist
+        for folder in [folder for folder in self.dirs.keys() if folder not in visited and
+                       (folder == root or folder.startswith(os.path.join(root, "")))]:
+            entry = self.dirs.pop(folder)
+            self.watcher.removePath(folder)
+            self.removeFiles([os.path.join(folder, name) for name in entry["files"]])
+        self.save()
+        if self.pendingRoots:
+            self.scan(self.pendingRoots.pop(0))
+        else:
+            self.scanFinished.emit()
+
+    def removeFiles(self, removed):
+        if removed:
+            removedSet = set(removed)
+            self.files[:] = [file for file in self.files if file not in removedSet]
+            self.filesRemoved.emit(removed)
+
+    @QtCore.pyqtSlot(str)
+    def onDirChanged(self, folder):
+        self.scan(os.path.normpath(folder))
+
+    def close(self):
+        self.pendingRoots = []
+        if self.scanner is not None:
+            self.scanner.requestInterruption()
+            self.scanner.wait()
+            self.scanner = None
+        paths = self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
@@ -0,0 +1,312 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Image decoding, background prefetching, scaled pixmaps cache and animated images
+
+import collections
+import logging
+
+from PyQt5 import QtCore, QtGui
+
+_LOGGER = logging.getLogger("jaaw")
+
+
+def readImage(img, width, height, mode):
+    # Decodes a file directly at (or near) the size it will be shown (e.g. JPEG at 1/2, 1/4 or 1/8 scale)
+    reader = QtGui.QImageReader(img)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid() and width > 0 and height > 0:
+        rotated = bool(reader.transformation() & QtGui.QImageIOHandler.TransformationRotate90)
+        if rotated:
+            size.transpose()
+        target = size.scaled(width, height, mode)
+        if target.width() < size.width() and target.height() < size.height():
+            # Scaled size applies to the stored image, before it is rotated
+            if rotated:
+                target.transpose()
+            reader.setScaledSize(target)
+    image = reader.read()
+    if image.isNull():
+        _LOGGER.info("Unable to read image %s: %s" % (img, reader.errorString()))
+    return image
+
+
+def loadScaledImage(img, width, height, keepAspectRatio=True, expand=True):
+    # Returns a QImage, so it is safe to call it from worker threads (QPixmap is not). img can be a file or a QImage
+    if keepAspectRatio:
+        mode = QtCore.Qt.KeepAspectRatioByExpanding if expand else QtCore.Qt.KeepAspectRatio
+    else:
+        mode = QtCore.Qt.IgnoreAspectRatio
+    image = img if isinstance(img, QtGui.QImage) else readImage(img, width, height, mode)
+    if image.isNull() or (image.width() == width and image.height() == height):
+        return image
+    return image.scaled(width, height, mode, QtCore.Qt.SmoothTransformation)
+
+
+class ImgLoaderSignals(QtCore.QObject):
+
+    loaded = QtCore.pyqtSignal(int, tuple, QtGui.QImage)
+
+
+class ImgLoader(QtCore.QRunnable):
+
+    def __init__(self, signals, generation, key):
+        QtCore.QRunnable.__init__(self)
+
+        self.signals = signals
+        self.generation = generation
+        self.key = key
+
+    def run(self):
+        img, width, height, keepAspect, expand = self.key
+        image = loadScaledImage(img, width, height, keepAspectRatio=keepAspect, expand=expand)
+        self.signals.loaded.emit(self.generation, self.key, image)
+
+
+class ImgPrefetcher(QtCore.QObject):
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(2, QtCore.QThread.idealThreadCount() - 1)))
+        self.signals = ImgLoaderSignals(self)
+        self.signals.loaded.connect(self.onLoaded)
+        self.generation = 0
+        self.pending = set()
+        self.ready = {}
+
+    def prefetch(self, imgs, width, height, keepAspect, expand):
+        keys = [(img, width, height, keepAspect, expand) for img in imgs]
+        # Forget whatever is not going to be shown soon (e.g. after a size mode change)
+        for key in list(self.ready.keys()):
+            if key not in keys:
+                del self.ready[key]
+        for key in keys:
+            if key not in self.ready and key not in self.pending:
+                self.pending.add(key)
+                self.pool.start(ImgLoader(self.signals, self.generation, key))
+
+    def take(self, img, width, height, keepAspect, expand):
+        return self.ready.pop((img, width, height, keepAspect, expand), None)
+
+    @QtCore.pyqtSlot(int, tuple, QtGui.QImage)
+    def onLoaded(self, generation, key, image):
+        if generation == self.generation:
+            self.pending.discard(key)
+            if not image.isNull():
+                self.ready[key] = image
+
+    def cancel(self):
+        self.generation += 1
+        self.pool.clear()
+        self.pending.clear()
+        self.ready.clear()
+
+
+class ImgCache:
+    # LRU cache of final (already scaled) pixmaps, bounded by memory size instead of number of items
+
+    def __init__(self, budget=256 * 1024 * 1024):
+
+        self.budget = budget
+        self.items = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    @staticmethod
+    def pixmapSize(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def setBudget(self, budget):
+        self.budget = max(0, budget)
+        self.trim()
+
+    def get(self, key):
+        pixmap = self.items.get(key, None)
+        if pixmap is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        size = self.pixmapSize(pixmap)
+        if size > self.budget:
+            return
+        if key in self.items:
+            self.size -= self.pixmapSize(self.items.pop(key))
+        self.items[key] = pixmap
+        self.size += size
+        self.trim()
+
+    def trim(self, budget=None):
+        budget = self.budget if budget is None else budget
+        while self.items and self.size > budget:
+            _, pixmap = self.items.popitem(last=False)
+            self.size -= self.pixmapSize(pixmap)
+            self.evictions += 1
+
+    def clear(self):
+        self.items.clear()
+        self.size = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions, "items": len(self.items), "bytes": self.size, "budget": self.budget}
+
+
+class ImgAnimation(QtCore.QObject):
+    # Plays an animated image (GIF, WebP...) on a label. Frames are scaled just once, and kept in memory up to a
+    # budget. Frames already due when next one is shown are skipped, so animation keeps its pace at a capped rate
+
+    frameReady = QtCore.pyqtSignal(QtGui.QPixmap)
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.img = ""
+        self.width = 0
+        self.height = 0
+        self.keepAspect = True
+        self.expand = True
+        self.period = 1000 // 24
+        self.budget = 128 * 1024 * 1024
+        self.reader = None
+        self.readerIndex = 0
+        self.frames = []
+        self.size = 0
+        self.frameCount = 0
+        self.index = -1
+        self.due = 0
+        self.shown = 0
+        self.skipped = 0
+        self.clock = QtCore.QElapsedTimer()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.showNextFrame)
+
+    @staticmethod
+    def isAnimated(img):
+        reader = QtGui.QImageReader(img)
+        return reader.supportsAnimation() and reader.imageCount() != 1
+
+    def setLimits(self, fps, budget):
+        self.period = 1000 // max(1, fps)
+        self.budget = max(0, budget)
+        self.trim(self.budget)
+
+    def trim(self, budget):
+        # Frames are dropped from the end, so the cached ones are always the first part of the animation
+        while self.frames and self.size > budget:
+            self.size -= ImgCache.pixmapSize(self.frames.pop()[0])
+
+    def start(self, img, width, height, keepAspect, expand):
+        if (img, width, height, keepAspect, expand) != \
+                (self.img, self.width, self.height, self.keepAspect, self.expand):
+            self.stop()
+            self.frames = []
+            self.size = 0
+            self.frameCount = 0
+            self.img = img
+            self.width = width
+            self.height = height
+            self.keepAspect = keepAspect
+            self.expand = expand
+        self.index = -1
+        self.resume()
+
+    def resume(self):
+        self.clock.start()
+        self.due = 0
+        self.showNextFrame()
+
+    def pause(self):
+        self.timer.stop()
+
+    def stop(self):
+        self.timer.stop()
+        self.reader = None
+        self.index = -1
+
+    def isActive(self):
+        return self.timer.isActive()
+
+    def openReader(self):
+        self.reader = QtGui.QImageReader(self.img)
+        self.readerIndex = 0
+
+    def getFrame(self, index):
+        # Returns (pixmap, delay) of given frame, or None if there is no such frame
+        if index < len(self.frames):
+            return self.frames[index]
+        if self.reader is None or self.readerIndex > index:
+            self.openReader()
+        while self.readerIndex <= index:
+            image = self.reader.read()
+            if image.isNull():
+                return None
+            # Same as browsers, very short delays are not honored
+            delay = self.reader.nextImageDelay()
+            delay = delay if delay > 10 else 100
+            self.readerIndex += 1
+            if self.readerIndex <= index:
+                # Frames are decoded in sequence, but only the requested one needs to be scaled
+                continue
+            pixmap = QtGui.QPixmap.fromImage(loadScaledImage(image, self.width, self.height,
+                                                             keepAspectRatio=self.keepAspect, expand=self.expand))
+            frame = (pixmap, delay)
+            size = ImgCache.pixmapSize(pixmap)
+            if index == len(self.frames) and self.size + size <= self.budget:
+                self.frames.append(frame)
+                self.size += size
+            return frame
+        return None
+
+    def getNextFrame(self):
+        index = self.index + 1
+        if self.frameCount and index >= self.frameCount:
+            index = 0
+        frame = self.getFrame(index)
+        if frame is None and index > 0:
+            # End of animation. Play it again (always in a loop, regardless of its own loop count)
+            self.frameCount = index
+            index = 0
+            frame = self.getFrame(index)
+        if frame is not None:
+            self.index = index
+        return frame
+
+    @QtCore.pyqtSlot()
+    def showNextFrame(self):
+        now = self.clock.elapsed()
+        if now - self.due > 1000:
+            # Too late (e.g. system was suspended): don't try to catch up
+            self.due = now
+        frame = self.getNextFrame()
+        if frame is None:
+            self.stop()
+            return
+        self.due += frame[1]
+        while self.due <= now:
+            nextFrame = self.getNextFrame()
+            if nextFrame is None:
+                break
+            frame = nextFrame
+            self.due += frame[1]
+            self.skipped += 1
+        self.shown += 1
+        self.frameReady.emit(frame[0])
+        self.timer.start(max(self.period, self.due - now))
+
+    def stats(self):
+        return {"frames": len(self.frames), "bytes": self.size, "budget": self.budget, "shown": self.shown,
+                "skipped": self.skipped}
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Memory usage of this process and its web renderers, and limits on it for long running sessions
+
+import collections
+import ctypes
+import logging
+import os
+import platform
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+from PyQt5 import QtCore
+
+_LOGGER = logging.getLogger("jaaw")
+
+_IS_LINUX = "Linux" in platform.platform()
+
+
+def getMemoryUsage():
+    # RSS (in bytes) of this process and of its web renderers. Without psutil, only known on Linux (0, 0 otherwise)
+    if psutil is not None:
+        try:
+            process = psutil.Process()
+            rss = process.memory_info().rss
+            webRss = 0
+            for child in process.children(recursive=True):
+                try:
+                    if child.name().startswith("QtWebEngineProc"):
+                        webRss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return rss, webRss
+        except psutil.Error:
+            return 0, 0
+    elif os.path.isdir("/proc"):
+        procs = {}
+        for pid in os.listdir("/proc"):
+            if pid.isdigit():
+                try:
+                    with open("/proc/%s/status" % pid, encoding="UTF-8") as file:
+                        status = dict(line.split(":", 1) for line in file if ":" in line)
+                    procs[int(pid)] = (status["Name"].strip(), int(status["PPid"]),
+                                       int(status.get("VmRSS", "0 kB").split()[0]) * 1024)
+                except (OSError, ValueError, KeyError):
+                    pass
+        rss = procs.get(os.getpid(), ("", 0, 0))[2]
+        webRss = 0
+        parents = {os.getpid()}
+        while True:
+            children = [pid for pid, (_, ppid, _) in procs.items() if ppid in parents and pid not in parents]
+            if not children:
+                break
+            parents.update(children)
+            # Process names are truncated to 15 chars in /proc
+            webRss += sum(procs[pid][2] for pid in children if procs[pid][0].startswith("QtWebEngineProc"))
+        return rss, webRss
+    return 0, 0
+
+
+def releaseMemory():
+    # Memory freed by Python and Qt is not always given back to the system by malloc. This asks it to do so (glibc)
+    if _IS_LINUX:
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class MemoryGovernor(QtCore.QObject):
+    # Over the limit, caches are shrunk first and, if that is not enough, web page is recycled (loaded again in a
+    # fresh renderer). Renderers over their own limit are recycled right away
+
+    shrinkCaches = QtCore.pyqtSignal()
+    recycleWeb = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.limit = 0
+        self.webLimit = 0
+        self.cooldown = 600
+        self.rss = 0
+        self.webRss = 0
+        self.shrunk = False
+        self.lastRecycle = None
+        self.actions = collections.Counter()
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.check)
+
+    def configure(self, limit, webLimit, interval, cooldown):
+        self.limit = max(0, limit)
+        self.webLimit = max(0, webLimit)
+        self.cooldown = max(0, cooldown)
+        self.timer.setInterval(max(1000, interval))
+        if self.limit or self.webLimit:
+            if not self.timer.isActive():
+                self.timer.start()
+        else:
+            self.timer.stop()
+
+    @QtCore.pyqtSlot()
+    def check(self):
+        self.rss, self.webRss = getMemoryUsage()
+        total = self.rss + self.webRss
+        if self.webLimit and self.webRss > self.webLimit:
+            self.recycle("web renderers use %d MB (limit %d MB)" % (self.webRss >> 20, self.webLimit >> 20))
+        elif self.limit and total > self.limit:
+            reason = "process uses %d MB, web renderers %d MB (limit %d MB)" % (self.rss >> 20, self.webRss >> 20,
+                                                                               self.limit >> 20)
+            if self.shrunk and self.webRss and self.recycle(reason):
+                return
+            _LOGGER.info("Memory over limit, %s. Shrinking caches" % reason)
+            self.shrunk = True
+            self.actions["shrink"] += 1
+            self.shrinkCaches.emit()
+        else:
+            self.shrunk = False
+
+    def recycle(self, reason):
+        now = time.monotonic()
+        if self.lastRecycle is not None and now - self.lastRecycle < self.cooldown:
+            _LOGGER.debug("Memory over limit, %s. Web page was recycled %d secs ago" % (reason, now - self.lastRecycle))
+            return False
+        _LOGGER.info("Memory over limit, %s. Recycling web page" % reason)
+        self.lastRecycle = now
+        self.shrunk = False
+        self.actions["recycle"] += 1
+        self.recycleWeb.emit()
+        return True
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Runtime metrics of the wallpaper hot paths, exported in prometheus or json format
+
+import collections
+import json
+import logging
+import os
+import time
+
+_LOGGER = logging.getLogger("jaaw")
+
+
+class Metrics:
+    # Counters, gauges and histograms of hot paths. Recording is just a few dict operations, so it's always on.
+    # Labels are passed as dicts, e.g. observe("jaaw_image_load_ms", 12.5, {"source": "decode"})
+
+    _BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)  # milliseconds
+
+    def __init__(self):
+
+        self.started = time.monotonic()
+        self.counters = collections.OrderedDict()
+        self.gauges = collections.OrderedDict()
+        self.histograms = collections.OrderedDict()
+
+    @staticmethod
+    def getKey(name, labels):
+        return name, tuple(sorted(labels.items())) if labels else ()
+
+    def inc(self, name, labels=None, value=1):
+        key = self.getKey(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        self.gauges[self.getKey(name, labels)] = value
+
+    def observe(self, name, value, labels=None):
+        key = self.getKey(name, labels)
+        histogram = self.histograms.get(key, None)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(self._BUCKETS), "count": 0, "sum": 0.0, "max": 0.0, "last": 0.0}
+            self.histograms[key] = histogram
+        for i, bound in enumerate(self._BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+                break
+        histogram["count"] += 1
+        histogram["sum"] += value
+        histogram["max"] = max(histogram["max"], value)
+        histogram["last"] = value
+
+    @staticmethod
+    def matches(labels, match):
+        labels = dict(labels)
+        return all(labels.get(label, None) == value for label, value in match.items())
+
+    def getCounter(self, name, **match):
+        # Sum of all label sets matching given labels
+        return sum(value for (key, labels), value in self.counters.items() if key == name and
+                   self.matches(labels, match))
+
+    def getHistogram(self, name, **match):
+        # Merge of all label sets matching given labels
+        merged = {"count": 0, "sum": 0.0, "max": 0.0}
+        for (key, labels), histogram in self.histograms.items():
+            if key == name and self.matches(labels, match):
+                merged["count"] += histogram["count"]
+                merged["sum"] += histogram["sum"]
+                merged["max"] = max(merged["max"], histogram["max"])
+        merged["avg"] = merged["sum"] / merged["count"] if merged["count"] else 0.0
+        return merged
+
+    @staticmethod
+    def formatLabels(labels, extra=()):
+        labels = list(labels) + list(extra)
+        if not labels:
+            return ""
+        return "{%s}" % ",".join('%s="%s"' % (label, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                                 for label, value in labels)
+
+    @staticmethod
+    def groupByName(metrics):
+        # All series of a metric must be together in exported file
+        groups = collections.OrderedDict()
+        for (name, labels), value in metrics.items():
+            groups.setdefault(name, []).append((labels, value))
+        return groups
+
+    def toPrometheus(self):
+        # Prometheus text exposition format (e.g. for node_exporter's textfile collector)
+        lines = []
+        for metrics, metricType in ((self.counters, "counter"), (self.gauges, "gauge")):
+            for name, series in self.groupByName(metrics).items():
+                lines.append("# TYPE %s %s" % (name, metricType))
+                for labels, value in series:
+                    lines.append("%s%s %s" % (name, self.formatLabels(labels), value))
+        for name, series in self.groupByName(self.histograms).items():
+            lines.append("# TYPE %s histogram" % name)
+            for labels, histogram in series:
+                lines.extend(self.formatHistogram(name, labels, histogram))
+        return "\n".join(lines) + "\n"
+
+    def formatHistogram(self, name, labels, histogram):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._BUCKETS, histogram["buckets"]):
+            cumulative += count
+            lines.append("%s_bucket%s %d" % (name, self.formatLabels(labels, [("le", bound)]), cumulative))
+        lines.append("%s_bucket%s %d" % (name, self.formatLabels(labels, [("le", "+Inf")]), histogram["count"]))
+        lines.append("%s_sum%s %.3f" % (name, self.formatLabels(labels), histogram["sum"]))
+        lines.append("%s_count%s %d" % (name, self.formatLabels(labels), histogram["count"]))
+        return lines
+
+    def toJson(self):
+        def items(metrics):
+            return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in metrics.items()]
+        histograms = [dict({"name": name, "labels": dict(labels), "bounds": list(self._BUCKETS)},
+                           **{key: (round(value, 3) if isinstance(value, float) else value)
+                              for key, value in histogram.items()})
+                      for (name, labels), histogram in self.histograms.items()]
+        return {"timestamp": time.time(), "counters": items(self.counters), "gauges": items(self.gauges),
+                "histograms": histograms}
+
+    def save(self, file, fileFormat="prometheus"):
+        try:
+            with open(file + ".tmp", "w", encoding="UTF-8") as f:
+                if fileFormat == "json":
+                    json.dump(self.toJson(), f, indent=4)
+                else:
+                    f.write(self.toPrometheus())
+            os.replace(file + ".tmp", file)
+        except OSError as e:
+            _LOGGER.warning("Unable to save metrics file %s: %s" % (file, e))
@@ -0,0 +1,451 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Asynchronous downloads of Chromecast and Bing images, their disk cache, and web hosts reachability
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+
+from PyQt5 import QtCore, QtNetwork
+
+import jaawmetrics
+
+_LOGGER = logging.getLogger("jaaw")
+
+# Same values as web_mode setting
+CHROMEMODE = "CHROME"
+BINGMODE = "BING"
+
+
+class CatalogLoaderSignals(QtCore.QObject):
+
+    loaded = QtCore.pyqtSignal(int, object)
+
+
+class CatalogLoader(QtCore.QRunnable):
+    # Runs blocking webutils calls out of the GUI thread
+
+    def __init__(self, signals, generation, func):
+        QtCore.QRunnable.__init__(self)
+
+        self.signals = signals
+        self.generation = generation
+        self.func = func
+
+    def run(self):
+        try:
+            result = self.func()
+        except Exception as e:
+            _LOGGER.warning("Unable to get images list: %s" % e)
+            result = None
+        self.signals.loaded.emit(self.generation, result)
+
+
+class WebStore:
+    # Content-addressed store of downloaded images and catalogs, revalidated (ETag / Last-Modified) instead of
+    # downloaded again, and used as offline fallback
+
+    _VERSION = 1
+    _CATALOG = "catalog"
+
+    def __init__(self, folder, budget=100 * 1024 * 1024):
+
+        self.folder = folder
+        self.indexFile = os.path.join(self.folder, "index.json")
+        self.budget = budget
+        self.objects = {}
+        self.urls = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.indexFile, encoding="UTF-8") as file:
+                index = json.load(file)
+            if index["version"] == self._VERSION:
+                self.objects = index["objects"]
+                self.urls = index["urls"]
+        except (OSError, ValueError, KeyError):
+            self.objects = {}
+            self.urls = {}
+        # Forget objects whose file is gone
+        for digest in [digest for digest in self.objects.keys() if not os.path.isfile(self.objectPath(digest))]:
+            del self.objects[digest]
+
+    def save(self):
+        try:
+            with open(self.indexFile + ".tmp", "w", encoding="UTF-8") as file:
+                json.dump({"version": self._VERSION, "objects": self.objects, "urls": self.urls}, file)
+            os.replace(self.indexFile + ".tmp", self.indexFile)
+        except OSError as e:
+            _LOGGER.warning("Unable to save web cache index %s: %s" % (self.indexFile, e))
+
+    def objectPath(self, digest):
+        return os.path.join(self.folder, digest)
+
+    def lookup(self, url):
+        entry = self.urls.get(url, None)
+        if entry is not None and entry["hash"] in self.objects:
+            return entry
+        return None
+
+    def validators(self, url):
+        entry = self.lookup(url)
+        if entry is None:
+            return "", ""
+        return entry["etag"], entry["last_modified"]
+
+    def put(self, mode, url, data, etag="", lastModified=""):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.objectPath(digest)
+        if digest in self.objects:
+            self.hits += 1
+        else:
+            self.misses += 1
+            with open(path + ".tmp", "wb") as file:
+                file.write(data)
+            os.replace(path + ".tmp", path)
+            self.objects[digest] = {"size": len(data), "mode": mode, "url": url}
+        self.objects[digest]["fetched"] = time.time()
+        self.urls[url] = {"hash": digest, "etag": etag, "last_modified": lastModified}
+        self.evict(keep=digest)
+        self.save()
+        return path
+
+    def revalidated(self, url):
+        # Server answered "304 Not Modified"
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        self.hits += 1
+        self.objects[entry["hash"]]["fetched"] = time.time()
+        self.save()
+        return self.objectPath(entry["hash"])
+
+    def get(self, url):
+        entry = self.lookup(url)
+        return None if entry is None else self.objectPath(entry["hash"])
+
+    def putCatalog(self, url, catalog, etag="", lastModified=""):
+        return self.put(self._CATALOG, url, json.dumps(catalog).encode("utf-8"), etag, lastModified)
+
+    def getCatalog(self, url):
+        path = self.get(url)
+        if path is not None:
+            try:
+                with open(path, encoding="UTF-8") as file:
+                    return json.load(file)
+            except (OSError, ValueError):
+                pass
+        return None
+
+    def history(self, mode):
+        return [self.objectPath(digest) for digest, item in
+                sorted(self.objects.items(), key=lambda item: item[1]["fetched"]) if item["mode"] == mode]
+
+    def latest(self, mode):
+        history = self.history(mode)
+        return history[-1] if history else None
+
+    def offline(self, mode, exclude=None):
+        history = [path for path in self.history(mode) if path != exclude]
+        return random.choice(history) if history else None
+
+    def evict(self, keep=None):
+        size = sum(item["size"] for item in self.objects.values())
+        if size <= self.budget:
+            return
+        catalogs = set(entry["hash"] for entry in self.urls.values())
+        candidates = sorted([(item["fetched"], digest) for digest, item in self.objects.items()
+                             if digest != keep and not (item["mode"] == self._CATALOG and digest in catalogs)])
+        for _, digest in candidates:
+            if size <= self.budget:
+                break
+            item = self.objects.pop(digest)
+            size -= item["size"]
+            self.evictions += 1
+            _LOGGER.info("Web cache: evicted %s (%s, %d bytes)" % (digest, item["url"], item["size"]))
+            try:
+                os.remove(self.objectPath(digest))
+            except OSError:
+                pass
+        self.urls = {url: entry for url, entry in self.urls.items() if entry["hash"] in self.objects}
+
+    def stats(self):
+        return {"objects": len(self.objects), "bytes": sum(item["size"] for item in self.objects.values()),
+                "budget": self.budget, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class WebFetcher(QtCore.QObject):
+    # Downloads web images asynchronously. Several candidates are requested in parallel, and the first one
+    # successfully downloaded wins
+
+    imgFetched = QtCore.pyqtSignal(str, str, bool)
+    fetchFailed = QtCore.pyqtSignal(str)
+
+    _MAX_CANDIDATES = 10
+
+    def __init__(self, folder, getWebutils, parent=None, metrics=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.timeout = 10000
+        self.parallel = 3
+        self.metrics = jaawmetrics.Metrics() if metrics is None else metrics
+        self.fetchStarted = 0.0
+        self.store = WebStore(folder)
+        # Blocking (and loaded on first use), so only called from CatalogLoader
+        self.getWebutils = getWebutils
+        self.manager = QtNetwork.QNetworkAccessManager(self)
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = CatalogLoaderSignals(self)
+        self.signals.loaded.connect(self.onCatalogLoaded)
+        self.generation = 0
+        self.replies = []
+        self.pending = []
+        self.mode = ""
+        self.fallback = None
+        self.onCatalog = None
+        self.chromeImages = []
+
+    def fetchChrome(self, catalogUrl):
+        self.cancel()
+        self.fetchStarted = time.perf_counter()
+        self.mode = CHROMEMODE
+        if self.chromeImages:
+            self.race(CHROMEMODE, self.pickCandidates(self.chromeImages))
+        else:
+            self.requestCatalog(catalogUrl, self.onChromeCatalog)
+
+    def onChromeCatalog(self, catalog):
+        if isinstance(catalog, dict):
+            catalog = catalog.get("chromecast", [])
+        images = [item["url"] for item in catalog or [] if isinstance(item, dict) and "url" in item]
+        if images:
+            self.chromeImages = images
+            self.race(CHROMEMODE, self.pickCandidates(images))
+        else:
+            self.loadCatalog(lambda: self.getWebutils().getChromecastImages()["chromecast"], "webutils:chromecast",
+                             lambda catalog: self.onChromeWebutilsCatalog(catalog))
+
+    def onChromeWebutilsCatalog(self, catalog):
+        images = [item["url"] for item in catalog or []]
+        if images:
+            self.chromeImages = images
+        self.race(CHROMEMODE, self.pickCandidates(images))
+
+    def fetchBing(self):
+        self.cancel()
+        self.fetchStarted = time.perf_counter()
+        self.mode = BINGMODE
+        # Today's image first. Only if it fails, try a random one from the archive
+        self.loadCatalog(lambda: self.getWebutils().getBingTodayImage(), "webutils:bing_today",
+                         lambda img: self.race(BINGMODE, [img] if img else [], fallback=self.fetchBingArchive))
+
+    def fetchBingArchive(self):
+        self.loadCatalog(lambda: self.getWebutils().getBingImages(), "webutils:bing",
+                         lambda images: self.race(BINGMODE, self.pickCandidates(images or [])))
+
+    def pickCandidates(self, images):
+        return random.sample(images, min(self._MAX_CANDIDATES, len(images)))
+
+    def loadCatalog(self, func, cacheUrl, onCatalog):
+        # Blocking webutils calls. Last good result is kept in the store in case they fail later
+        self.onCatalog = lambda result: onCatalog(self.cacheCatalog(cacheUrl, result))
+        self.pool.start(CatalogLoader(self.signals, self.generation, func))
+
+    def cacheCatalog(self, cacheUrl, result):
+        if result:
+            self.store.putCatalog(cacheUrl, result)
+            return result
+        return self.store.getCatalog(cacheUrl)
+
+    @QtCore.pyqtSlot(int, object)
+    def onCatalogLoaded(self, generation, result):
+        if generation == self.generation and self.onCatalog is not None:
+            onCatalog = self.onCatalog
+            self.onCatalog = None
+            onCatalog(result)
+
+    def newRequest(self, url):
+        request = QtNetwork.QNetworkRequest(QtCore.QUrl(url))
+        request.setAttribute(QtNetwork.QNetworkRequest.RedirectPolicyAttribute,
+                             QtNetwork.QNetworkRequest.NoLessSafeRedirectPolicy)
+        request.setTransferTimeout(self.timeout)
+        etag, lastModified = self.store.validators(url)
+        if etag:
+            request.setRawHeader(b"If-None-Match", etag.encode("utf-8"))
+        if lastModified:
+            request.setRawHeader(b"If-Modified-Since", lastModified.encode("utf-8"))
+        return request
+
+    @staticmethod
+    def replyValidators(reply):
+        return (bytes(reply.rawHeader(b"ETag")).decode("utf-8", "ignore"),
+                bytes(reply.rawHeader(b"Last-Modified")).decode("utf-8", "ignore"))
+
+    @staticmethod
+    def replyStatus(reply):
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        if reply.error() != QtNetwork.QNetworkReply.NoError:
+            return 0
+        return 200 if status is None else status
+
+    def requestCatalog(self, url, onCatalog):
+        reply = self.manager.get(self.newRequest(url))
+        generation = self.generation
+        reply.finished.connect(lambda: self.onCatalogReplyFinished(reply, generation, url, onCatalog))
+        self.replies.append(reply)
+
+    def onCatalogReplyFinished(self, reply, generation, url, onCatalog):
+        if reply in self.replies:
+            self.replies.remove(reply)
+        reply.deleteLater()
+        if generation != self.generation:
+            return
+        status = self.replyStatus(reply)
+        catalog = None
+        if 200 <= status < 300:
+            try:
+                catalog = json.loads(bytes(reply.readAll()).decode("utf-8"))
+                self.store.putCatalog(url, catalog, *self.replyValidators(reply))
+            except (ValueError, OSError) as e:
+                _LOGGER.info("Invalid catalog %s: %s" % (url, e))
+        if catalog is None:
+            # Not modified, or not available: use last good one
+            if status != 304:
+                _LOGGER.info("Unable to download %s: %s" % (url, reply.errorString()))
+            catalog = self.store.getCatalog(url)
+        onCatalog(catalog)
+
+    def race(self, mode, urls, fallback=None):
+        self.pending = list(urls)
+        self.mode = mode
+        self.fallback = fallback
+        if not self.pending:
+            self.onRaceLost()
+        for _ in range(min(self.parallel, len(self.pending))):
+            self.requestNext()
+
+    def requestNext(self):
+        url = self.pending.pop(0)
+        reply = self.manager.get(self.newRequest(url))
+        generation = self.generation
+        started = time.perf_counter()
+        reply.finished.connect(lambda: self.onReplyFinished(reply, generation, url, started))
+        self.replies.append(reply)
+
+    def onReplyFinished(self, reply, generation, url, started):
+        if reply in self.replies:
+            self.replies.remove(reply)
+        reply.deleteLater()
+        if generation != self.generation:
+            return
+        status = self.replyStatus(reply)
+        self.metrics.observe("jaaw_download_ms", (time.perf_counter() - started) * 1000,
+                             {"mode": self.mode, "status": status})
+        path = None
+        if status == 304:
+            path = self.store.revalidated(url)
+        elif 200 <= status < 300:
+            data = bytes(reply.readAll())
+            if data:
+                try:
+                    path = self.store.put(self.mode, url, data, *self.replyValidators(reply))
+                except OSError as e:
+                    _LOGGER.warning("Unable to save %s: %s" % (url, e))
+        else:
+            _LOGGER.info("Unable to download %s: %s" % (url, reply.errorString()))
+        if path is None:
+            self.metrics.inc("jaaw_download_errors_total", {"mode": self.mode})
+        if path is not None:
+            self.cancel()
+            self.observeFetch("fresh")
+            self.imgFetched.emit(self.mode, path, True)
+        elif self.pending:
+            self.requestNext()
+        elif not self.replies:
+            self.onRaceLost()
+
+    def onRaceLost(self):
+        if self.fallback is not None:
+            fallback = self.fallback
+            self.fallback = None
+            fallback()
+            return
+        path = self.store.offline(self.mode)
+        if path is not None:
+            _LOGGER.info("Network not available. Using a previously downloaded %s image" % self.mode)
+            self.observeFetch("offline")
+            self.imgFetched.emit(self.mode, path, False)
+        else:
+            self.observeFetch("failed")
+            self.fetchFailed.emit(self.mode)
+
+    def observeFetch(self, result):
+        # Whole fetch, from catalog request to image on disk
+        if self.fetchStarted:
+            self.metrics.observe("jaaw_fetch_ms", (time.perf_counter() - self.fetchStarted) * 1000,
+                                 {"mode": self.mode, "result": result})
+            self.fetchStarted = 0.0
+
+    def cancel(self):
+        self.generation += 1
+        self.onCatalog = None
+        self.pending = []
+        replies = self.replies
+        self.replies = []
+        for reply in replies:
+            reply.abort()
+
+
+class Reachability(QtCore.QObject):
+    # Checks in background if web hosts are reachable, keeping results for a while (ttl, in seconds)
+
+    probed = QtCore.pyqtSignal(str, bool)
+
+    def __init__(self, parent=None, ttl=300, timeout=5000):
+        QtCore.QObject.__init__(self, parent)
+
+        self.ttl = ttl
+        self.timeout = timeout
+        self.manager = QtNetwork.QNetworkAccessManager(self)
+        self.results = {}
+        self.inFlight = {}
+
+    def status(self, url):
+        # True / False if known and not expired, None otherwise. Failures expire sooner, to retry soon
+        result = self.results.get(url, None)
+        if result is None or time.monotonic() - result[1] > (self.ttl if result[0] else min(self.ttl, 30)):
+            return None
+        return result[0]
+
+    def probe(self, url, force=False):
+        if url in self.inFlight:
+            return
+        status = None if force else self.status(url)
+        if status is not None:
+            self.probed.emit(url, status)
+            return
+        self.inFlight[url] = True
+        request = QtNetwork.QNetworkRequest(QtCore.QUrl(url))
+        request.setAttribute(QtNetwork.QNetworkRequest.RedirectPolicyAttribute,
+                             QtNetwork.QNetworkRequest.NoLessSafeRedirectPolicy)
+        request.setTransferTimeout(self.timeout)
+        reply = self.manager.head(request)
+        reply.finished.connect(lambda: self.onReplyFinished(reply, url))
+
+    def onReplyFinished(self, reply, url):
+        reply.deleteLater()
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        # Any HTTP answer means the host is there (some servers don't like HEAD), but not if the page doesn't exist
+        reachable = status is not None and status < 500 and status not in (404, 410)
+        self.results[url] = (reachable, time.monotonic())
+        self.inFlight.pop(url, None)
+        self.probed.emit(url, reachable)
@@ -0,0 +1,263 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Memory-mapped disk pack of already scaled carousel frames
+
+import collections
+import ctypes
+import hashlib
+import json
+import logging
+import mmap
+import os
+
+from PyQt5 import QtCore, QtGui, sip
+
+_LOGGER = logging.getLogger("jaaw")
+
+
+class ImgPackWriterSignals(QtCore.QObject):
+
+    written = QtCore.pyqtSignal()
+
+
+class ImgPackWriter(QtCore.QRunnable):
+    # Converts and writes a frame to its (already reserved) place in pack file, out of the GUI thread
+
+    def __init__(self, signals, done, seq, dataFile, offset, image, imgFormat):
+        QtCore.QRunnable.__init__(self)
+
+        self.signals = signals
+        self.done = done
+        self.seq = seq
+        self.dataFile = dataFile
+        self.offset = offset
+        self.image = image
+        self.imgFormat = imgFormat
+
+    def run(self):
+        image = self.image
+        if image.format() != self.imgFormat:
+            image = image.convertToFormat(self.imgFormat)
+        ok = True
+        try:
+            with open(self.dataFile, "r+b") as file:
+                file.seek(self.offset)
+                file.write(image.constBits().asstring(image.sizeInBytes()))
+        except OSError as e:
+            _LOGGER.warning("Unable to write images pack %s: %s" % (self.dataFile, e))
+            ok = False
+        self.done.append((self.seq, ok))
+        self.signals.written.emit()
+
+
+class ImgPack:
+    # Memory-mapped file of already scaled raw frames for a folder, size mode and resolution, so showing an image
+    # needs no decoding nor scaling. Frames are written in background, and only listed once written
+
+    _VERSION = 1
+
+    def __init__(self, cacheFolder, folder, sizeMode, width, height, budget):
+
+        self.folder = folder
+        self.sizeMode = sizeMode
+        self.width = width
+        self.height = height
+        self.budget = budget
+        # Each resolution gets its own pack, so going back and forth between screens doesn't wipe it
+        name = hashlib.sha1(("%s|%s|%dx%d" % (os.path.abspath(folder), sizeMode, width, height)).encode("utf-8"))
+        name = name.hexdigest()[:16]
+        base = os.path.join(cacheFolder, name)
+        self.dataFile = base + ".pack"
+        self.indexFile = base + ".json"
+        self.entries = {}
+        self.end = 0
+        self.dead = 0
+        self.dirty = 0
+        self.file = None
+        self.map = None
+        self.pool = QtCore.QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.signals = ImgPackWriterSignals()
+        self.signals.written.connect(self.onWritten)
+        # Results of writer (deque, so it can be appended from its thread), applied in GUI thread
+        self.done = collections.deque()
+        self.seq = 0
+        self.pending = {}
+        self.load()
+
+    def matches(self, folder, sizeMode, width, height):
+        return (self.folder, self.sizeMode, self.width, self.height) == (folder, sizeMode, width, height)
+
+    def load(self):
+        try:
+            with open(self.indexFile, encoding="UTF-8") as file:
+                index = json.load(file)
+            valid = (index["version"] == self._VERSION and index["width"] == self.width and
+                     index["height"] == self.height and index["end"] <= os.path.getsize(self.dataFile))
+        except (OSError, ValueError, KeyError):
+            valid = False
+        if valid:
+            self.entries = index["entries"]
+            self.end = index["end"]
+            self.dead = index["dead"]
+        else:
+            # Missing, corrupted or built for a different resolution
+            self.reset()
+
+    def flush(self):
+        self.pool.waitForDone()
+        self.onWritten()
+
+    def reset(self):
+        self.flush()
+        self.unmap()
+        self.entries = {}
+        self.end = 0
+        self.dead = 0
+        try:
+            open(self.dataFile, "wb").close()
+        except OSError as e:
+            _LOGGER.warning("Unable to create images pack %s: %s" % (self.dataFile, e))
+        self.save()
+
+    def save(self):
+        index = {"version": self._VERSION, "folder": self.folder, "size_mode": self.sizeMode,
+                 "width": self.width, "height": self.height, "end": self.end, "dead": self.dead,
+                 "entries": self.entries}
+        try:
+            with open(self.indexFile + ".tmp", "w", encoding="UTF-8") as file:
+                json.dump(index, file)
+            os.replace(self.indexFile + ".tmp", self.indexFile)
+            self.dirty = 0
+        except OSError as e:
+            _LOGGER.warning("Unable to save images pack index %s: %s" % (self.indexFile, e))
+
+    @staticmethod
+    def fileStamp(path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime, stat.st_size
+        except OSError:
+            return None
+
+    def contains(self, path):
+        entry = self.entries.get(path, None)
+        return entry is not None and self.fileStamp(path) == (entry["mtime"], entry["size"])
+
+    def remap(self):
+        self.unmap()
+        try:
+            self.file = open(self.dataFile, "rb")
+            if os.fstat(self.file.fileno()).st_size > 0:
+                # ACCESS_COPY: pages are shared with the file until written (never), but buffer is writable for ctypes
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, ValueError) as e:
+            _LOGGER.warning("Unable to map images pack %s: %s" % (self.dataFile, e))
+            self.unmap()
+
+    def unmap(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def getPixmap(self, path):
+        entry = self.entries.get(path, None)
+        if entry is None:
+            return None
+        if self.fileStamp(path) != (entry["mtime"], entry["size"]):
+            self.invalidate(path)
+            return None
+        end = entry["offset"] + entry["length"]
+        if self.map is None or len(self.map) < end:
+            self.remap()
+            if self.map is None or len(self.map) < end:
+                self.invalidate(path)
+                return None
+        buffer = (ctypes.c_char * entry["length"]).from_buffer(self.map, entry["offset"])
+        image = QtGui.QImage(sip.voidptr(ctypes.addressof(buffer)), entry["width"], entry["height"],
+                             entry["bpl"], QtGui.QImage.Format(entry["format"]))
+        # Copied first, since fromImage() may share pixels with the image, and pixmap must outlive the mapping
+        pixmap = QtGui.QPixmap.fromImage(image.copy())
+        del image
+        del buffer
+        return pixmap
+
+    def add(self, path, image):
+        stamp = self.fileStamp(path)
+        if stamp is None or image.isNull():
+            return
+        if path in self.entries or path in self.pending:
+            self.invalidate(path)
+        imgFormat = QtGui.QImage.Format_ARGB32_Premultiplied if image.hasAlphaChannel() else QtGui.QImage.Format_RGB32
+        # 32 bits formats, so size is known before converting (rows are already 32-bit aligned)
+        bpl = image.width() * 4
+        length = bpl * image.height()
+        if self.end + length > self.budget:
+            self.compact()
+            if self.end + length > self.budget:
+                return
+        self.seq += 1
+        self.pending[path] = (self.seq, {"mtime": stamp[0], "size": stamp[1], "offset": self.end, "length": length,
+                                         "width": image.width(), "height": image.height(), "bpl": bpl,
+                                         "format": int(imgFormat)})
+        self.pool.start(ImgPackWriter(self.signals, self.done, self.seq, self.dataFile, self.end, image, imgFormat))
+        self.end += length
+
+    def onWritten(self):
+        while self.done:
+            seq, ok = self.done.popleft()
+            path = next((path for path, (pendingSeq, _) in self.pending.items() if pendingSeq == seq), None)
+            if path is None:
+                # Invalidated while being written
+                continue
+            _, entry = self.pending.pop(path)
+            if not ok:
+                self.dead += entry["length"]
+                continue
+            self.entries[path] = entry
+            self.dirty += 1
+        if self.dirty >= 10:
+            self.save()
+
+    def invalidate(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is None and path in self.pending:
+            entry = self.pending.pop(path)[1]
+        if entry is not None:
+            self.dead += entry["length"]
+            self.dirty += 1
+
+    def compact(self):
+        # Rewrite only live frames, dropping space left by invalidated ones
+        if not self.dead:
+            return
+        self.flush()
+        self.unmap()
+        entries = {}
+        offset = 0
+        try:
+            with open(self.dataFile, "rb") as src, open(self.dataFile + ".tmp", "wb") as dst:
+                for path, entry in self.entries.items():
+                    src.seek(entry["offset"])
+                    dst.write(src.read(entry["length"]))
+                    entries[path] = dict(entry, offset=offset)
+                    offset += entry["length"]
+            os.replace(self.dataFile + ".tmp", self.dataFile)
+        except OSError as e:
+            _LOGGER.warning("Unable to compact images pack %s: %s" % (self.dataFile, e))
+            self.reset()
+            return
+        self.entries = entries
+        self.end = offset
+        self.dead = 0
+        self.save()
+
+    def close(self):
+        self.flush()
+        if self.dirty:
+            self.save()
+        self.unmap()
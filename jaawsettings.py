@@ -0,0 +1,155 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Settings file validation, repair and delayed atomic writes
+
+import copy
+import json
+import logging
+import os
+
+from PyQt5 import QtCore
+
+_LOGGER = logging.getLogger("jaaw")
+
+
+class SettingsStore(QtCore.QObject):
+    # Validated in-memory copy of settings. Writes are delayed (to coalesce bursts of changes) and atomic
+
+    _SCHEMA = {"mode": str, "img_mode": str, "img": str, "img_size_mode": str, "folder": str,
+               "Available_periods": dict, "img_period": int, "video_mode": str, "video": str, "yt_url": list,
+               "yt_index": int, "web_mode": str, "url": list, "url_index": int, "chrome_last": str, "bing_last": str}
+    # Optional settings. Invalid ones are dropped, so their readers use their own default
+    _OPTIONAL = {"folder_recursive": bool, "all_screens": bool, "backend_idle_secs": int, "pause_when_hidden": bool,
+                 "idle_pause_secs": int, "visibility_check_secs": int, "img_prefetch": int, "img_cache_mb": int,
+                 "img_pack": bool, "img_pack_mb": int, "img_anim_fps": int, "img_anim_cache_mb": int,
+                 "video_playlist": list, "video_renderers": dict, "video_fps": int, "yt_adaptive_quality": bool,
+                 "yt_max_drop_pct": int, "yt_quality_check_secs": int, "web_timeout_secs": int, "web_parallel": int,
+                 "web_cache_mb": int, "reachability_ttl_secs": int, "metrics_file": str, "metrics_format": str,
+                 "metrics_tooltip": bool, "metrics_interval_secs": int, "memory_limit_mb": int,
+                 "web_memory_limit_mb": int, "memory_check_secs": int, "web_recycle_min_secs": int,
+                 "url_pool_size": int, "web_disk_cache_mb": int, "url_snapshot": bool, "url_snapshot_secs": int}
+    # Last resort, if not even bundled settings can be read
+    _FALLBACK = {"mode": "IMAGE", "img_mode": "FIXED", "img": "", "img_size_mode": "FIT", "folder": "",
+                 "Available_periods": {"1 min": 60, "5 min": 300, "15 min": 900, "1 hour": 3600}, "img_period": 300,
+                 "video_mode": "LOCAL", "video": "", "yt_url": [], "yt_index": 0, "web_mode": "BING", "url": [],
+                 "url_index": 0, "chrome_last": "", "bing_last": ""}
+
+    def __init__(self, file, defaultFile, parent=None, delay=500):
+        QtCore.QObject.__init__(self, parent)
+
+        self.file = file
+        self.defaultFile = defaultFile
+        self.config = None
+        self.loadedFrom = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+        app = QtCore.QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.flush)
+
+    @classmethod
+    def isValid(cls, config):
+        return isinstance(config, dict) and \
+            all(isinstance(config.get(key, None), keyType) for key, keyType in cls._SCHEMA.items())
+
+    @staticmethod
+    def fileStamp(file):
+        try:
+            stat = os.stat(file)
+            return file, stat.st_mtime, stat.st_size
+        except OSError:
+            return None
+
+    @staticmethod
+    def read(file):
+        try:
+            with open(file, encoding='UTF-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            _LOGGER.error("Unable to read settings file %s: %s" % (file, e))
+            return None
+        if not isinstance(config, dict):
+            _LOGGER.error("Settings file %s is not valid" % file)
+            return None
+        return config
+
+    def getDefaults(self):
+        config = self.read(self.defaultFile)
+        if config is None or not self.isValid(config):
+            _LOGGER.error("Bundled settings file %s is not valid. Using built-in defaults" % self.defaultFile)
+            return copy.deepcopy(self._FALLBACK)
+        return config
+
+    def repair(self, config, file):
+        # Settings not valid are replaced by their default, instead of discarding the whole file
+        defaults = None
+        for key, keyType in self._SCHEMA.items():
+            if not isinstance(config.get(key, None), keyType):
+                if defaults is None:
+                    defaults = self.getDefaults()
+                _LOGGER.error("Setting %s in %s is not valid (%s). Using default value: %s" %
+                              (key, file, config.get(key, None), defaults[key]))
+                config[key] = defaults[key]
+        for key, keyType in self._OPTIONAL.items():
+            if key not in config:
+                continue
+            value = config[key]
+            if keyType is int and not isinstance(value, bool) and isinstance(value, (int, float, str)):
+                try:
+                    value = int(float(value))
+                except (ValueError, OverflowError):
+                    pass
+            if isinstance(value, keyType) and (keyType is bool or not isinstance(value, bool)):
+                config[key] = value
+            else:
+                _LOGGER.error("Setting %s in %s is not valid (%s). Using default value" % (key, file, value))
+                del config[key]
+        return config
+
+    def load(self):
+        # Parses the file only if it changed. Never fails: last good settings (or bundled ones) are used instead
+        if self.timer.isActive():
+            # Pending changes are newer than the file
+            return copy.deepcopy(self.config)
+        files = [self.file] if os.path.isfile(self.file) else []
+        if self.config is None or not files:
+            files.append(self.defaultFile)
+        for file in files:
+            stamp = self.fileStamp(file)
+            if stamp is not None and stamp == self.loadedFrom:
+                return copy.deepcopy(self.config)
+            config = self.read(file)
+            if config is not None:
+                self.config = self.repair(config, file)
+                self.loadedFrom = stamp
+                return copy.deepcopy(self.config)
+        if self.config is None:
+            _LOGGER.error("No valid settings file found (%s). Using built-in defaults" % ", ".join(files))
+            self.config = copy.deepcopy(self._FALLBACK)
+        return copy.deepcopy(self.config)
+
+    def save(self, config):
+        if not self.isValid(config):
+            _LOGGER.error("Invalid settings not saved")
+            return
+        self.config = copy.deepcopy(config)
+        self.timer.start()
+
+    @QtCore.pyqtSlot()
+    def flush(self):
+        self.timer.stop()
+        if self.config is None:
+            return
+        temp = self.file + ".tmp"
+        try:
+            with open(temp, "w", encoding='UTF-8') as file:
+                json.dump(self.config, file, ensure_ascii=False, sort_keys=False, indent=4)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp, self.file)
+            self.loadedFrom = self.fileStamp(self.file)
+        except OSError as e:
+            _LOGGER.error("Unable to save settings file %s: %s" % (self.file, e))
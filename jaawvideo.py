@@ -0,0 +1,349 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Video rendering classes. Kept apart from jaaw.py, so QtMultimedia is only imported when a video is played
+
+import time
+
+from PyQt5 import QtWidgets, QtCore, QtGui, QtMultimedia, QtMultimediaWidgets
+
+
+class CappedVideoSurface(QtMultimedia.QAbstractVideoSurface):
+    # Video surface which presents, at most, a given number of frames per second, scaled once to target size.
+    # Frames arriving too early, or while the previous one has not been painted yet, are dropped (never queued)
+
+    frameReady = QtCore.pyqtSignal(QtGui.QImage)
+
+    def __init__(self, parent=None):
+        QtMultimedia.QAbstractVideoSurface.__init__(self, parent)
+
+        self.width = 0
+        self.height = 0
+        self.aspectMode = QtCore.Qt.KeepAspectRatio
+        self.period = 1 / 24
+        self.lastPresent = 0.0
+        self.painting = False
+        self.presented = 0
+        self.dropped = 0
+
+    def supportedPixelFormats(self, handleType=QtMultimedia.QAbstractVideoBuffer.NoHandle):
+        if handleType == QtMultimedia.QAbstractVideoBuffer.NoHandle:
+            return [QtMultimedia.QVideoFrame.Format_RGB32, QtMultimedia.QVideoFrame.Format_ARGB32,
+                    QtMultimedia.QVideoFrame.Format_ARGB32_Premultiplied, QtMultimedia.QVideoFrame.Format_RGB565,
+                    QtMultimedia.QVideoFrame.Format_RGB24, QtMultimedia.QVideoFrame.Format_BGR32,
+                    QtMultimedia.QVideoFrame.Format_YUV420P, QtMultimedia.QVideoFrame.Format_NV12,
+                    QtMultimedia.QVideoFrame.Format_UYVY, QtMultimedia.QVideoFrame.Format_YUYV]
+        return []
+
+    def setTarget(self, width, height, aspectMode, fps):
+        # fps can be None to present all frames. Next frame is always presented
+        self.width = width
+        self.height = height
+        self.aspectMode = aspectMode
+        self.period = 1 / fps if fps else 0
+        self.lastPresent = 0.0
+        self.painting = False
+
+    def present(self, frame):
+        now = time.perf_counter()
+        if self.painting or now - self.lastPresent < self.period:
+            self.dropped += 1
+            return True
+        image = frame.image()
+        if image.isNull():
+            self.dropped += 1
+            return True
+        if self.width and self.height and (image.width() != self.width or image.height() != self.height):
+            image = image.scaled(self.width, self.height, self.aspectMode, QtCore.Qt.FastTransformation)
+        self.lastPresent = now
+        self.painting = True
+        self.presented += 1
+        self.frameReady.emit(image)
+        return True
+
+    def stop(self):
+        self.painting = False
+        QtMultimedia.QAbstractVideoSurface.stop(self)
+
+    @QtCore.pyqtSlot()
+    def framePainted(self):
+        self.painting = False
+
+    def stats(self):
+        return {"presented": self.presented, "dropped": self.dropped}
+
+
+class GaplessPlayer(QtCore.QObject):
+    # Plays a list of local videos in a loop without gaps: next item is pre-rolled (loaded and paused) in a second
+    # player, whose output is raised only once it has something to show. Items are (file, fps) tuples, fps being
+    # None for native rendering, or the frame rate to cap it to (see CappedVideoSurface)
+
+    itemChanged = QtCore.pyqtSignal(str)
+    itemFailed = QtCore.pyqtSignal(str, int, str)
+
+    def __init__(self, widget, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.widget = widget
+        self.items = []
+        self.width = 0
+        self.height = 0
+        self.aspectMode = QtCore.Qt.KeepAspectRatio
+        self.active = 0
+        self.paused = False
+        self.switchWhenReady = False
+        self.raiseWhenReady = False
+        self.switches = 0
+        self.players = []
+        self.surfaces = []
+        self.loaded = [None, None]
+        self.indexes = [0, 0]
+        self.outputs = [None, None]
+        self.pending = [None, None]
+        for i in range(2):
+            player = QtMultimedia.QMediaPlayer(self, QtMultimedia.QMediaPlayer.VideoSurface)
+            player.setMuted(True)
+            surface = CappedVideoSurface(self)
+            surface.frameReady.connect(self.onFrameReady)
+            widget.frameWidget.framePainted.connect(surface.framePainted)
+            player.mediaStatusChanged.connect(self.onMediaStatusChanged)
+            # Queued, so errors raised while loading a file don't change the player list in the middle of that
+            player.error.connect(self.onError, QtCore.Qt.QueuedConnection)
+            self.players.append(player)
+            self.surfaces.append(surface)
+
+    def setTarget(self, width, height, aspectMode):
+        self.width = width
+        self.height = height
+        self.aspectMode = aspectMode
+        self.widget.setAspectRatioMode(aspectMode)
+        for i in range(2):
+            self.setSurfaceTarget(i)
+
+    def setSurfaceTarget(self, i):
+        fps = self.loaded[i][1] if self.loaded[i] is not None else None
+        self.surfaces[i].setTarget(self.width, self.height, self.aspectMode, fps)
+
+    def setItems(self, items):
+        # If already playing, current video keeps showing until first item is ready to play
+        self.items = list(items)
+        if not self.items:
+            self.stop()
+            return
+        idle = 1 - self.active
+        if self.isStarted():
+            self.preroll(idle, 0)
+            if self.isReady(idle):
+                self.advance()
+            else:
+                self.switchWhenReady = True
+        else:
+            self.load(self.active, 0)
+            self.showActive()
+            if not self.paused:
+                self.players[self.active].play()
+            self.preroll(idle, self.getNext(0))
+            self.itemChanged.emit(self.items[0][0])
+
+    def isCapped(self, i):
+        return self.loaded[i] is not None and bool(self.loaded[i][1])
+
+    def load(self, i, index):
+        player = self.players[i]
+        previous = self.loaded[i]
+        self.loaded[i] = self.items[index]
+        self.indexes[i] = index
+        self.pending[i] = None
+        self.setSurfaceTarget(i)
+        file = self.loaded[i][0]
+        output = self.surfaces[i] if self.isCapped(i) else self.widget.videoOutputs[i]
+        if previous is not None and previous[0] == file and output is self.outputs[i] and \
+                player.mediaStatus() not in (QtMultimedia.QMediaPlayer.NoMedia, QtMultimedia.QMediaPlayer.InvalidMedia):
+            # Same file (e.g. looping a single video): just rewind, instead of loading it again
+            player.setPosition(0)
+        else:
+            if output is not self.outputs[i]:
+                player.setVideoOutput(output)
+                self.outputs[i] = output
+            player.setMedia(QtMultimedia.QMediaContent(QtCore.QUrl.fromLocalFile(file)))
+
+    def preroll(self, i, index):
+        self.load(i, index)
+        self.players[i].pause()
+
+    def getNext(self, index):
+        return (index + 1) % len(self.items)
+
+    def isReady(self, i):
+        return self.players[i].mediaStatus() in (QtMultimedia.QMediaPlayer.LoadedMedia,
+                                                 QtMultimedia.QMediaPlayer.BufferedMedia)
+
+    def isStarted(self):
+        return self.loaded[self.active] is not None
+
+    def advance(self):
+        # Pre-rolled player becomes the active one. Its first frame (if already presented) is shown right away
+        self.switchWhenReady = False
+        previous = self.active
+        self.active = 1 - previous
+        self.showActive()
+        if not self.paused:
+            self.players[self.active].play()
+        self.switches += 1
+        self.preroll(previous, self.getNext(self.indexes[self.active]))
+        self.itemChanged.emit(self.loaded[self.active][0])
+
+    def showActive(self):
+        # Until active player has a frame to show, previous output stays on top (showing its last frame)
+        i = self.active
+        self.raiseWhenReady = False
+        if self.isCapped(i) and self.pending[i] is not None:
+            self.widget.frameWidget.setFrame(self.pending[i])
+            self.pending[i] = None
+            self.widget.raiseOutput(self.widget.frameWidget)
+        elif not self.isCapped(i) and self.isReady(i):
+            self.widget.raiseOutput(self.widget.videoOutputs[i])
+        else:
+            self.raiseWhenReady = True
+
+    @QtCore.pyqtSlot(QtGui.QImage)
+    def onFrameReady(self, frame):
+        i = self.surfaces.index(self.sender())
+        if i == self.active:
+            self.widget.frameWidget.setFrame(frame)
+            if self.raiseWhenReady:
+                self.raiseWhenReady = False
+                self.widget.raiseOutput(self.widget.frameWidget)
+        else:
+            # Pre-rolled player is not shown yet. Keep its frame for later, and let it present next ones
+            self.pending[i] = frame
+            self.surfaces[i].framePainted()
+            if self.switchWhenReady:
+                self.advance()
+
+    @QtCore.pyqtSlot(QtMultimedia.QMediaPlayer.MediaStatus)
+    def onMediaStatusChanged(self, status):
+        i = self.players.index(self.sender())
+        if i == self.active and status == QtMultimedia.QMediaPlayer.EndOfMedia and self.items:
+            self.advance()
+        elif i == self.active and self.raiseWhenReady and not self.isCapped(i) and \
+                status == QtMultimedia.QMediaPlayer.BufferedMedia:
+            self.raiseWhenReady = False
+            self.widget.raiseOutput(self.widget.videoOutputs[i])
+        elif i != self.active and self.switchWhenReady and status == QtMultimedia.QMediaPlayer.BufferedMedia:
+            self.advance()
+
+    @QtCore.pyqtSlot()
+    def onError(self):
+        # Failed files are dropped from the list. Whatever is left goes on playing
+        i = self.players.index(self.sender())
+        player = self.players[i]
+        if self.loaded[i] is None:
+            return
+        file = self.loaded[i][0]
+        error, message = int(player.error()), player.errorString()
+        items = [item for item in self.items if item[0] != file]
+        current = self.loaded[self.active]
+        if i != self.active and not self.switchWhenReady and current in items:
+            # Failed while pre-rolling: current video goes on, and the one after the failed one is pre-rolled instead
+            self.items = items
+            self.indexes[self.active] = items.index(current)
+            self.preroll(i, self.getNext(self.indexes[self.active]))
+        else:
+            paused = self.paused
+            self.stop()
+            self.paused = paused
+            self.setItems(items)
+        self.itemFailed.emit(file, error, message)
+
+    def play(self):
+        self.paused = False
+        if self.isStarted():
+            self.players[self.active].play()
+
+    def pause(self):
+        self.paused = True
+        if self.isStarted():
+            self.players[self.active].pause()
+
+    def isPlaying(self):
+        return self.isStarted() and self.players[self.active].state() == QtMultimedia.QMediaPlayer.PlayingState
+
+    def stop(self):
+        for i, player in enumerate(self.players):
+            player.stop()
+            player.setMedia(QtMultimedia.QMediaContent())
+            self.loaded[i] = None
+            self.pending[i] = None
+        self.items = []
+        self.active = 0
+        self.paused = False
+        self.switchWhenReady = False
+        self.raiseWhenReady = False
+
+    def stats(self):
+        stats = {"presented": 0, "dropped": 0}
+        for surface in self.surfaces:
+            for key, value in surface.stats().items():
+                stats[key] += value
+        stats["switches"] = self.switches
+        return stats
+
+
+class VideoFrameWidget(QtWidgets.QWidget):
+
+    framePainted = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        QtWidgets.QWidget.__init__(self, parent)
+
+        self.frame = QtGui.QImage()
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+
+    @QtCore.pyqtSlot(QtGui.QImage)
+    def setFrame(self, frame):
+        self.frame = frame
+        self.update()
+
+    def clear(self):
+        self.frame = QtGui.QImage()
+        self.framePainted.emit()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtCore.Qt.black)
+        if not self.frame.isNull():
+            # Centered. When expanding, this crops the exceeding parts
+            painter.drawImage(int((self.width() - self.frame.width()) / 2),
+                              int((self.height() - self.frame.height()) / 2), self.frame)
+        painter.end()
+        self.framePainted.emit()
+
+
+class VideoWidget(QtWidgets.QWidget):
+    # Outputs of GaplessPlayer, stacked on top of each other: a QVideoWidget per player (native rendering), and a
+    # VideoFrameWidget shared by capped surfaces. Only the one raised on top is seen
+
+    def __init__(self, parent=None):
+        QtWidgets.QWidget.__init__(self, parent)
+
+        self.videoOutputs = [QtMultimediaWidgets.QVideoWidget(), QtMultimediaWidgets.QVideoWidget()]
+        self.frameWidget = VideoFrameWidget()
+        self.myLayout = QtWidgets.QStackedLayout()
+        self.myLayout.setStackingMode(QtWidgets.QStackedLayout.StackAll)
+        self.myLayout.setContentsMargins(0, 0, 0, 0)
+        for widget in self.videoOutputs + [self.frameWidget]:
+            self.myLayout.addWidget(widget)
+        self.setLayout(self.myLayout)
+        self.frameWidget.raise_()
+
+    def setAspectRatioMode(self, aspectMode):
+        for output in self.videoOutputs:
+            output.setAspectRatioMode(aspectMode)
+
+    def raiseOutput(self, widget):
+        widget.raise_()
+
+    def clear(self):
+        self.frameWidget.clear()
+        self.frameWidget.raise_()
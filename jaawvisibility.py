@@ -0,0 +1,292 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tells if wallpaper can be seen (not covered by a maximized window, screen not locked, user not idle), so rendering
+# can be paused meanwhile
+
+import ctypes
+import logging
+import os
+import platform
+
+import pywinctl
+from PyQt5 import QtCore
+
+_LOGGER = logging.getLogger("jaaw")
+
+_IS_WINDOWS = "Windows" in platform.platform()
+_IS_LINUX = "Linux" in platform.platform()
+_IS_MACOS = "macOS" in platform.platform() or "Darwin" in platform.platform()
+
+
+class VisibilityProvider:
+    # Base class for policy providers. isActive() must return True when the wallpaper can not be seen
+
+    name = ""
+
+    def isActive(self):
+        return False
+
+
+class OcclusionScanSignals(QtCore.QObject):
+
+    scanned = QtCore.pyqtSignal(bool, str)
+
+
+class OcclusionScan(QtCore.QRunnable):
+    # Enumerates all windows (X11 / Win32 calls, which may take tens of ms) out of the GUI thread
+
+    _DESKTOP_TITLES = ("", "Program Manager", "Desktop", "Finder")
+
+    def __init__(self, signals, ownHandle, ownTitle, width, height, margin):
+        QtCore.QRunnable.__init__(self)
+
+        self.signals = signals
+        self.ownHandle = ownHandle
+        self.ownTitle = ownTitle
+        self.width = width
+        self.height = height
+        self.margin = margin
+
+    def run(self):
+        try:
+            self.signals.scanned.emit(self.isOccluded(), "")
+        except Exception as e:
+            self.signals.scanned.emit(False, str(e) or e.__class__.__name__)
+
+    def isOccluded(self):
+        for win in pywinctl.getAllWindows():
+            title = win.title
+            if title == self.ownTitle or title in self._DESKTOP_TITLES or win.getHandle() == self.ownHandle:
+                continue
+            if not win.isVisible or win.isMinimized:
+                continue
+            if win.isMaximized or (win.left <= self.margin and win.top <= self.margin and
+                                   win.right >= self.width - self.margin and win.bottom >= self.height - self.margin):
+                return True
+        return False
+
+
+class OcclusionProvider(VisibilityProvider):
+    # Answers with the result of last scan, so it is, at most, one check late
+
+    name = "occluded"
+
+    def __init__(self, window, margin=8):
+
+        self.window = window
+        self.margin = margin
+        self.occluded = False
+        self.error = ""
+        self.scanning = False
+        self.pool = QtCore.QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.signals = OcclusionScanSignals()
+        self.signals.scanned.connect(self.onScanned)
+
+    def isActive(self):
+        if self.error:
+            raise OSError(self.error)
+        if not self.scanning:
+            self.scanning = True
+            self.pool.start(OcclusionScan(self.signals, int(self.window.winId()), self.window.windowTitle(),
+                                          self.window.xmax, self.window.ymax, self.margin))
+        return self.occluded
+
+    def onScanned(self, occluded, error):
+        self.scanning = False
+        self.occluded = occluded
+        self.error = error
+
+
+class CommandProbe(QtCore.QObject):
+    # Runs a command in background (QProcess), keeping its last output, so it never blocks the GUI thread
+
+    def __init__(self, program, args, timeout=2000, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.program = program
+        self.args = args
+        self.output = None
+        self.error = ""
+        self.process = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(timeout)
+        self.timer.timeout.connect(self.onTimeout)
+
+    def poll(self):
+        # Last output (None if there is none yet). Command is run again, unless it is still running
+        if self.error:
+            raise OSError(self.error)
+        if self.process is None:
+            self.process = QtCore.QProcess(self)
+            self.process.finished.connect(self.onFinished)
+            self.process.errorOccurred.connect(self.onError)
+            self.process.start(self.program, self.args)
+            self.timer.start()
+        return self.output
+
+    @QtCore.pyqtSlot(int, QtCore.QProcess.ExitStatus)
+    def onFinished(self, exitCode, exitStatus):
+        if self.process is None:
+            return
+        if exitStatus == QtCore.QProcess.NormalExit:
+            self.output = bytes(self.process.readAllStandardOutput()).decode("utf-8", "replace")
+        self.release()
+
+    @QtCore.pyqtSlot(QtCore.QProcess.ProcessError)
+    def onError(self, error):
+        if error == QtCore.QProcess.FailedToStart:
+            self.error = "unable to run %s: %s" % (self.program, self.process.errorString())
+            self.release()
+
+    @QtCore.pyqtSlot()
+    def onTimeout(self):
+        if self.process is not None:
+            _LOGGER.debug("%s took too long. Killed" % self.program)
+            self.process.kill()
+            self.release()
+
+    def release(self):
+        self.timer.stop()
+        process = self.process
+        self.process = None
+        if process is not None:
+            process.finished.disconnect(self.onFinished)
+            process.errorOccurred.disconnect(self.onError)
+            process.deleteLater()
+
+
+class IdleProvider(VisibilityProvider):
+
+    name = "idle"
+
+    def __init__(self, threshold):
+
+        self.threshold = threshold
+        self.xDisplay = None
+        self.xss = None
+        self.ioreg = None
+
+    def isActive(self):
+        return self.threshold > 0 and self.getIdleTime() >= self.threshold
+
+    def getIdleTime(self):
+        # Seconds since last user input (0 if unknown)
+        if _IS_WINDOWS:
+            class LASTINPUTINFO(ctypes.Structure):
+                _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+            info = LASTINPUTINFO()
+            info.cbSize = ctypes.sizeof(info)
+            if ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+                return (ctypes.windll.kernel32.GetTickCount() - info.dwTime) / 1000
+        elif _IS_MACOS:
+            if self.ioreg is None:
+                self.ioreg = CommandProbe("ioreg", ["-c", "IOHIDSystem", "-d", "4"])
+            output = self.ioreg.poll() or ""
+            for line in output.splitlines():
+                if "HIDIdleTime" in line:
+                    return int(line.split("=")[-1].strip()) / 1000000000
+        elif _IS_LINUX:
+            if self.xss is None:
+                class XScreenSaverInfo(ctypes.Structure):
+                    _fields_ = [("window", ctypes.c_ulong), ("state", ctypes.c_int), ("kind", ctypes.c_int),
+                                ("til_or_since", ctypes.c_ulong), ("idle", ctypes.c_ulong),
+                                ("eventMask", ctypes.c_ulong)]
+                xlib = ctypes.cdll.LoadLibrary("libX11.so.6")
+                xlib.XOpenDisplay.restype = ctypes.c_void_p
+                xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+                xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+                self.xss = ctypes.cdll.LoadLibrary("libXss.so.1")
+                self.xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+                self.xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                                           ctypes.POINTER(XScreenSaverInfo)]
+                self.xDisplay = xlib.XOpenDisplay(None)
+                self.xRoot = xlib.XDefaultRootWindow(self.xDisplay)
+                self.xInfo = self.xss.XScreenSaverAllocInfo()
+            if self.xDisplay and self.xss.XScreenSaverQueryInfo(self.xDisplay, self.xRoot, self.xInfo):
+                return self.xInfo.contents.idle / 1000
+        return 0
+
+
+class LockProvider(VisibilityProvider):
+
+    name = "locked"
+
+    def __init__(self):
+
+        self.loginctl = None
+
+    def isActive(self):
+        if _IS_WINDOWS:
+            user32 = ctypes.windll.user32
+            desktop = user32.OpenInputDesktop(0, False, 0x0100)  # DESKTOP_SWITCHDESKTOP
+            if not desktop:
+                return True
+            locked = not user32.SwitchDesktop(desktop)
+            user32.CloseDesktop(desktop)
+            return locked
+        elif _IS_MACOS:
+            import Quartz
+            session = Quartz.CGSessionCopyCurrentDictionary() or {}
+            return bool(session.get("CGSSessionScreenIsLocked", False))
+        elif _IS_LINUX:
+            sessionId = os.environ.get("XDG_SESSION_ID", "")
+            if sessionId:
+                if self.loginctl is None:
+                    self.loginctl = CommandProbe("loginctl", ["show-session", sessionId, "-p", "LockedHint", "--value"])
+                output = self.loginctl.poll() or ""
+                return output.strip() == "yes"
+        return False
+
+
+class VisibilityPolicy(QtCore.QObject):
+    # Periodically asks all providers, emitting paused() when any of them is active, and resumed() when none is
+
+    paused = QtCore.pyqtSignal(str)
+    resumed = QtCore.pyqtSignal()
+
+    def __init__(self, providers, interval=2000, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.providers = providers
+        self.isPaused = False
+        self.reasons = []
+        self.failed = set()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.check)
+
+    def setEnabled(self, enabled):
+        if enabled:
+            if not self.timer.isActive():
+                self.timer.start()
+        else:
+            self.timer.stop()
+            if self.isPaused:
+                self.isPaused = False
+                self.resumed.emit()
+
+    @QtCore.pyqtSlot()
+    def check(self):
+        reasons = []
+        for provider in self.providers:
+            if provider in self.failed:
+                continue
+            try:
+                if provider.isActive():
+                    reasons.append(provider.name)
+            except Exception as e:
+                # Not supported on this system: don't ask again
+                _LOGGER.info("Visibility provider '%s' disabled: %s" % (provider.name, e))
+                self.failed.add(provider)
+        self.reasons = reasons
+        if reasons and not self.isPaused:
+            self.isPaused = True
+            _LOGGER.info("Wallpaper not visible (%s). Pausing" % ", ".join(reasons))
+            self.paused.emit(", ".join(reasons))
+        elif not reasons and self.isPaused:
+            self.isPaused = False
+            _LOGGER.info("Wallpaper visible again. Resuming")
+            self.resumed.emit()
@@ -0,0 +1,583 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Web page classes. Kept apart from jaaw.py, so QtWebEngine is only imported when a web page or YouTube video is shown
+
+import collections
+import json
+import os
+import re
+import time
+
+from PyQt5 import QtCore, QtGui, QtWebChannel, QtWebEngineWidgets
+
+# States reported by YouTube IFrame player (see https://developers.google.com/youtube/iframe_api_reference)
+YT_UNSTARTED = -1
+YT_ENDED = 0
+YT_PLAYING = 1
+YT_PAUSED = 2
+YT_BUFFERING = 3
+YT_CUED = 5
+# Not reported by player: its API could not be loaded. Out of range of player states and error codes
+YT_API_ERROR = 1000
+# Playback qualities, from lowest to highest, and their video heights
+YT_QUALITIES = ("small", "medium", "large", "hd720", "hd1080", "hd1440", "hd2160")
+YT_HEIGHTS = (240, 360, 480, 720, 1080, 1440, 2160)
+_YT_SAMPLE_MS = 2000
+
+# Injected into player iframe (which page scripts can't reach): reports frames decoded and dropped, and keeps player
+# on requested quality (setPlaybackQualityRange() first, since documented setPlaybackQuality() is often ignored)
+_YT_FRAME_SCRIPT = """
+(function () {
+    if (window === window.top || !/(^|\\.)youtube(-nocookie)?\\.com$/.test(location.hostname)) {
+        return;
+    }
+    var wanted = "";
+    var unsupported = false;
+    var apply = function () {
+        var player = document.getElementById("movie_player");
+        if (!wanted || !player || !player.getPlaybackQuality || player.getPlaybackQuality() === wanted) {
+            return;
+        }
+        if (player.setPlaybackQualityRange) {
+            player.setPlaybackQualityRange(wanted, wanted);
+        } else if (player.setPlaybackQuality) {
+            player.setPlaybackQuality(wanted);
+        } else if (!unsupported) {
+            unsupported = true;
+            window.parent.postMessage({jaaw: "qualityUnsupported"}, "*");
+        }
+    };
+    window.addEventListener("message", function (event) {
+        if (event.data && event.data.jaaw === "setQuality") {
+            wanted = event.data.quality;
+            apply();
+        }
+    });
+    setInterval(function () {
+        var video = document.querySelector("video");
+        if (video && video.getVideoPlaybackQuality) {
+            var stats = video.getVideoPlaybackQuality();
+            window.parent.postMessage({jaaw: "quality", dropped: stats.droppedVideoFrames,
+                                       total: stats.totalVideoFrames, height: video.videoHeight}, "*");
+        }
+        apply();
+    }, %(interval)d);
+})();
+"""
+
+_YT_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+html, body {margin: 0; width: 100%%; height: 100%%; overflow: hidden; background-color: black}
+#player {width: 100%%; height: 100%%}
+</style>
+<script src="qrc:///qtwebchannel/qwebchannel.js"></script>
+</head>
+<body>
+<div id="player"></div>
+<script>
+var jaaw = null;
+var player = null;
+var videoId = %(video)s;
+var quality = %(quality)s;
+
+window.addEventListener("message", function (event) {
+    var data = event.data;
+    if (jaaw !== null && data && data.jaaw === "quality") {
+        jaaw.onQuality(data.dropped, data.total, data.height);
+    } else if (jaaw !== null && data && data.jaaw === "qualityUnsupported") {
+        jaaw.onQualityUnsupported();
+    }
+});
+
+new QWebChannel(qt.webChannelTransport, function (channel) {
+    jaaw = channel.objects.jaaw;
+    var tag = document.createElement("script");
+    tag.src = %(api)s;
+    tag.onerror = function () { jaaw.onError(%(apiError)d); };
+    document.head.appendChild(tag);
+});
+
+function onYouTubeIframeAPIReady() {
+    player = new YT.Player("player", {
+        width: "100%%", height: "100%%", videoId: videoId,
+        playerVars: {autoplay: 1, mute: 1, controls: 0, rel: 0, disablekb: 1, iv_load_policy: 3, playsinline: 1},
+        events: {
+            onReady: function (event) {
+                event.target.mute();
+                event.target.playVideo();
+                jaawSetQuality(quality);
+                jaaw.onReady();
+            },
+            onStateChange: function (event) {
+                // Looped here, since player's own loop only works with a playlist fixed when it is created
+                if (event.data === YT.PlayerState.ENDED) {
+                    event.target.seekTo(0);
+                    event.target.playVideo();
+                }
+                jaaw.onStateChange(event.data);
+            },
+            onError: function (event) {
+                jaaw.onError(event.data);
+            }
+        }
+    });
+}
+
+function jaawLoad(id, q) {
+    videoId = id;
+    if (player !== null && player.loadVideoById) {
+        player.loadVideoById({videoId: id, suggestedQuality: q || "default"});
+        jaawSetQuality(q);
+        return true;
+    }
+    return false;
+}
+
+function jaawSetQuality(q) {
+    quality = q;
+    if (!q || player === null) {
+        return;
+    }
+    if (player.setPlaybackQuality) {
+        player.setPlaybackQuality(q);
+    }
+    var frame = player.getIframe ? player.getIframe() : null;
+    if (frame && frame.contentWindow) {
+        frame.contentWindow.postMessage({jaaw: "setQuality", quality: q}, "*");
+    } else if (!player.setPlaybackQuality) {
+        jaaw.onQualityUnsupported();
+    }
+}
+
+function jaawPlay(play) {
+    if (player !== null && player.playVideo) {
+        if (play) {
+            player.playVideo();
+        } else {
+            player.pauseVideo();
+        }
+    }
+}
+</script>
+</body>
+</html>
+"""
+
+
+class YTBridge(QtCore.QObject):
+    # Object published to the player page through QWebChannel. Page calls these slots on player events
+
+    ready = QtCore.pyqtSignal()
+    stateChanged = QtCore.pyqtSignal(int)
+    error = QtCore.pyqtSignal(int)
+    quality = QtCore.pyqtSignal(int, int, int)
+    qualityUnsupported = QtCore.pyqtSignal()
+
+    @QtCore.pyqtSlot()
+    def onReady(self):
+        self.ready.emit()
+
+    @QtCore.pyqtSlot(int)
+    def onStateChange(self, state):
+        self.stateChanged.emit(state)
+
+    @QtCore.pyqtSlot(int)
+    def onError(self, code):
+        self.error.emit(code)
+
+    @QtCore.pyqtSlot(int, int, int)
+    def onQuality(self, dropped, total, height):
+        self.quality.emit(dropped, total, height)
+
+    @QtCore.pyqtSlot()
+    def onQualityUnsupported(self):
+        self.qualityUnsupported.emit()
+
+
+class YTPlayer(QtCore.QObject):
+    # Persistent page hosting YouTube IFrame player. Videos are switched in place (loadVideoById). Error codes are
+    # those of the player (2: invalid id, 5: HTML5 error, 100: not found, 101 / 150: not embeddable) or YT_API_ERROR
+
+    stateChanged = QtCore.pyqtSignal(str, int)
+    failed = QtCore.pyqtSignal(str, int)
+    # Frames dropped and decoded (since video element was created), and video height
+    qualitySampled = QtCore.pyqtSignal(str, int, int, int)
+    # Player offers no way to set playback quality. Only emitted once
+    qualityUnsupported = QtCore.pyqtSignal(str)
+
+    def __init__(self, view, apiUrl, baseUrl, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.view = view
+        self.page = view.page()
+        self.apiUrl = apiUrl
+        self.baseUrl = baseUrl
+        self.videoId = ""
+        self.quality = ""
+        self.pageVideoId = ""
+        self.state = YT_UNSTARTED
+        self.isReady = False
+        self.isLoading = False
+        self.canSetQuality = True
+        self.bridge = YTBridge(self)
+        self.bridge.ready.connect(self.onReady)
+        self.bridge.stateChanged.connect(self.onStateChanged)
+        self.bridge.error.connect(self.onError)
+        self.bridge.quality.connect(lambda dropped, total, height:
+                                    self.qualitySampled.emit(self.videoId, dropped, total, height))
+        self.bridge.qualityUnsupported.connect(self.onQualityUnsupported)
+        self.channel = QtWebChannel.QWebChannel(self)
+        self.channel.registerObject("jaaw", self.bridge)
+        self.page.setWebChannel(self.channel)
+        self.view.loadFinished.connect(self.onPageLoaded)
+        script = QtWebEngineWidgets.QWebEngineScript()
+        script.setName("jaawQuality")
+        script.setSourceCode(_YT_FRAME_SCRIPT % {"interval": _YT_SAMPLE_MS})
+        script.setInjectionPoint(QtWebEngineWidgets.QWebEngineScript.DocumentReady)
+        script.setWorldId(QtWebEngineWidgets.QWebEngineScript.MainWorld)
+        script.setRunsOnSubFrames(True)
+        self.page.scripts().insert(script)
+
+    @staticmethod
+    def isValidId(videoId):
+        return re.match(r"^[\w-]+$", videoId) is not None
+
+    def load(self, videoId, quality=""):
+        # Ids are checked, since they are injected in the page. Quality is left to the player if not given
+        if not self.isValidId(videoId):
+            self.failed.emit(videoId, 2)
+            return
+        self.videoId = videoId
+        self.quality = quality if quality in YT_QUALITIES else ""
+        self.state = YT_UNSTARTED
+        if self.isReady:
+            self.page.runJavaScript("jaawLoad(%s, %s)" % (json.dumps(videoId), json.dumps(self.quality)))
+        elif not self.isLoading:
+            self.isLoading = True
+            self.pageVideoId = videoId
+            page = _YT_PAGE % {"video": json.dumps(videoId), "quality": json.dumps(self.quality),
+                               "api": json.dumps(self.apiUrl), "apiError": YT_API_ERROR}
+            self.page.setHtml(page, QtCore.QUrl(self.baseUrl))
+
+    def setQuality(self, quality):
+        if quality in YT_QUALITIES:
+            self.quality = quality
+            if self.isReady:
+                self.page.runJavaScript("jaawSetQuality(%s)" % json.dumps(quality))
+
+    def play(self):
+        if self.isReady:
+            self.page.runJavaScript("jaawPlay(true)")
+
+    def pause(self):
+        if self.isReady:
+            self.page.runJavaScript("jaawPlay(false)")
+
+    def isPlaying(self):
+        return self.isReady and self.state == YT_PLAYING
+
+    @QtCore.pyqtSlot(bool)
+    def onPageLoaded(self, ok):
+        if not ok and self.isLoading:
+            self.isLoading = False
+            self.failed.emit(self.videoId, YT_API_ERROR)
+
+    @QtCore.pyqtSlot()
+    def onReady(self):
+        self.isLoading = False
+        self.isReady = True
+        if self.videoId != self.pageVideoId:
+            # Another video was requested while page was loading
+            self.page.runJavaScript("jaawLoad(%s, %s)" % (json.dumps(self.videoId), json.dumps(self.quality)))
+
+    @QtCore.pyqtSlot(int)
+    def onStateChanged(self, state):
+        self.state = state
+        self.stateChanged.emit(self.videoId, state)
+
+    @QtCore.pyqtSlot()
+    def onQualityUnsupported(self):
+        if self.canSetQuality:
+            self.canSetQuality = False
+            self.qualityUnsupported.emit(self.videoId)
+
+    @QtCore.pyqtSlot(int)
+    def onError(self, code):
+        if code == YT_API_ERROR:
+            # Player API was not loaded (e.g. no network), so next load() has to load the whole page again
+            self.isLoading = False
+            self.isReady = False
+        self.failed.emit(self.videoId, code)
+
+
+class YTQuality:
+    # Adaptive playback quality: one step down when dropped frames go over budget, one step up (never over screen
+    # size) after some checks well within it. Last good quality of each video is remembered on disk
+
+    _GOOD_CHECKS = 3
+
+    def __init__(self, file, budget=0.05, interval=10, minFrames=60):
+
+        self.file = file
+        self.budget = budget
+        self.interval = interval
+        self.minFrames = minFrames
+        self.good = {}
+        self.videoId = ""
+        self.index = 0
+        self.maxIndex = 0
+        self.baseline = None
+        self.checkStarted = 0.0
+        self.goodChecks = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.file, encoding="UTF-8") as file:
+                self.good = {videoId: quality for videoId, quality in json.load(file).items()
+                             if quality in YT_QUALITIES}
+        except (OSError, ValueError, AttributeError):
+            self.good = {}
+
+    def save(self):
+        try:
+            with open(self.file + ".tmp", "w", encoding="UTF-8") as file:
+                json.dump(self.good, file)
+            os.replace(self.file + ".tmp", self.file)
+        except OSError:
+            pass
+
+    @staticmethod
+    def getScreenIndex(width, height):
+        # Lowest quality covering the screen (16:9 videos are fit into it)
+        height = min(height, width * 9 // 16)
+        for i, videoHeight in enumerate(YT_HEIGHTS):
+            if videoHeight >= height:
+                return i
+        return len(YT_HEIGHTS) - 1
+
+    def start(self, videoId, width, height):
+        # Returns the quality to start playing videoId with
+        self.videoId = videoId
+        self.maxIndex = self.getScreenIndex(width, height)
+        self.index = self.maxIndex
+        if videoId in self.good:
+            self.index = min(self.maxIndex, YT_QUALITIES.index(self.good[videoId]))
+        self.reset()
+        return YT_QUALITIES[self.index]
+
+    def reset(self):
+        self.baseline = None
+        self.goodChecks = 0
+
+    def sample(self, dropped, total):
+        # Returns (quality, reason) when quality has to change, None otherwise
+        now = time.monotonic()
+        if self.baseline is None or total < self.baseline[1]:
+            # First sample, or a new video element (counters start again)
+            self.baseline = (dropped, total)
+            self.checkStarted = now
+            return None
+        frames = total - self.baseline[1]
+        if now - self.checkStarted < self.interval or frames < self.minFrames:
+            return None
+        ratio = (dropped - self.baseline[0]) / frames
+        self.baseline = (dropped, total)
+        self.checkStarted = now
+        reason = "%.1f%% frames dropped" % (ratio * 100)
+        if ratio > self.budget:
+            self.goodChecks = 0
+            if self.index > 0:
+                self.index -= 1
+                return YT_QUALITIES[self.index], reason
+        elif ratio <= self.budget / 4:
+            if self.good.get(self.videoId) != YT_QUALITIES[self.index]:
+                self.good[self.videoId] = YT_QUALITIES[self.index]
+                self.save()
+            self.goodChecks += 1
+            if self.goodChecks >= self._GOOD_CHECKS and self.index < self.maxIndex:
+                self.goodChecks = 0
+                self.index += 1
+                return YT_QUALITIES[self.index], reason
+        return None
+
+    def stats(self):
+        return {"video": self.videoId, "quality": YT_QUALITIES[self.index] if self.videoId else "",
+                "max_quality": YT_QUALITIES[self.maxIndex] if self.videoId else "", "remembered": len(self.good)}
+
+
+class PageSnapshot(QtCore.QObject):
+    # Renders a page offscreen and grabs it as an image. The view (and its renderer) only lives meanwhile
+
+    ready = QtCore.pyqtSignal(str, QtGui.QImage)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, profile=None, settle=1500, timeout=30000, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.profile = profile
+        self.view = None
+        self.url = ""
+        # Scripts, web fonts and images may still be drawing when page reports it has finished loading
+        self.settleTimer = QtCore.QTimer(self)
+        self.settleTimer.setSingleShot(True)
+        self.settleTimer.setInterval(settle)
+        self.settleTimer.timeout.connect(self.grab)
+        self.timeoutTimer = QtCore.QTimer(self)
+        self.timeoutTimer.setSingleShot(True)
+        self.timeoutTimer.setInterval(timeout)
+        self.timeoutTimer.timeout.connect(self.onTimeout)
+
+    def take(self, url, width, height):
+        self.cancel()
+        self.url = url
+        view = QtWebEngineWidgets.QWebEngineView()
+        view.setAttribute(QtCore.Qt.WA_DontShowOnScreen)
+        if self.profile is not None:
+            view.setPage(QtWebEngineWidgets.QWebEnginePage(self.profile, view))
+        view.page().setAudioMuted(True)
+        view.resize(width, height)
+        view.loadFinished.connect(lambda ok: self.onLoadFinished(view, ok))
+        # Not painted on screen, but it must be "shown" so page is laid out and composited
+        view.show()
+        view.load(QtCore.QUrl(url))
+        self.view = view
+        self.timeoutTimer.start()
+
+    def isBusy(self):
+        return self.view is not None
+
+    def onLoadFinished(self, view, ok):
+        if view is not self.view:
+            return
+        if ok:
+            self.settleTimer.start()
+        else:
+            self.fail()
+
+    @QtCore.pyqtSlot()
+    def grab(self):
+        if self.view is None:
+            return
+        url = self.url
+        image = self.view.grab().toImage()
+        self.cancel()
+        if image.isNull():
+            self.failed.emit(url)
+        else:
+            self.ready.emit(url, image)
+
+    @QtCore.pyqtSlot()
+    def onTimeout(self):
+        # Page is still loading (some never finish). Whatever is drawn by now is good enough, if anything
+        if self.settleTimer.isActive() or self.view is None:
+            return
+        if self.view.page().contentsSize().isEmpty():
+            self.fail()
+        else:
+            self.grab()
+
+    def fail(self):
+        url = self.url
+        self.cancel()
+        self.failed.emit(url)
+
+    def cancel(self):
+        self.settleTimer.stop()
+        self.timeoutTimer.stop()
+        if self.view is not None:
+            self.view.stop()
+            self.view.hide()
+            self.view.deleteLater()
+            self.view = None
+
+
+class WebPagePool(QtCore.QObject):
+    # Hidden pages loaded in advance, so showing one is just swapping it into the view. Frozen once loaded
+
+    def __init__(self, profile, size=2, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.profile = profile
+        self.size = size
+        self.pages = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def getKey(url):
+        return QtCore.QUrl(url).toString()
+
+    def setSize(self, size):
+        self.size = max(0, size)
+        while len(self.pages) > self.size:
+            self.drop(next(iter(self.pages)))
+
+    def preload(self, urls):
+        # Keeps pages of the first urls (as many as size), and starts loading those not loaded yet
+        wanted = []
+        for url in urls:
+            key = self.getKey(url)
+            if key not in wanted:
+                wanted.append(key)
+        wanted = wanted[:self.size]
+        for key in list(self.pages.keys()):
+            if key not in wanted:
+                self.drop(key)
+        for key in wanted:
+            if key not in self.pages:
+                page = QtWebEngineWidgets.QWebEnginePage(self.profile, self)
+                page.setAudioMuted(True)
+                page.loadFinished.connect(lambda ok, page=page: self.onLoadFinished(page, ok))
+                page.load(QtCore.QUrl(key))
+                self.pages[key] = page
+
+    def onLoadFinished(self, page, ok):
+        keys = [key for key, pooled in self.pages.items() if pooled is page]
+        if not keys:
+            return
+        if not ok:
+            self.drop(keys[0])
+        elif not page.isVisible():
+            page.setLifecycleState(QtWebEngineWidgets.QWebEnginePage.LifecycleState.Frozen)
+
+    def take(self, url):
+        page = self.pages.pop(self.getKey(url), None)
+        if page is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            page.setLifecycleState(QtWebEngineWidgets.QWebEnginePage.LifecycleState.Active)
+        return page
+
+    def give(self, url, page):
+        # Page just replaced in a view. It is kept if there is room, so switching back is also instant
+        key = self.getKey(url)
+        if key and key not in self.pages and len(self.pages) < self.size:
+            page.setParent(self)
+            self.pages[key] = page
+            if not page.isVisible():
+                page.setLifecycleState(QtWebEngineWidgets.QWebEnginePage.LifecycleState.Frozen)
+        else:
+            page.deleteLater()
+
+    def drop(self, key):
+        page = self.pages.pop(key, None)
+        if page is not None:
+            page.triggerAction(QtWebEngineWidgets.QWebEnginePage.Stop)
+            page.deleteLater()
+
+    def shrink(self):
+        # Halves pool size (until settings are loaded again), releasing pages beyond it
+        self.setSize(self.size // 2)
+
+    def clear(self):
+        for key in list(self.pages.keys()):
+            self.drop(key)
+
+    def stats(self):
+        return {"pages": len(self.pages), "size": self.size, "hits": self.hits, "misses": self.misses}
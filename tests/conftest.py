@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests run the real modules headless, under the offscreen Qt platform:
+#     python -m pytest tests
+
+import importlib
+import json
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jaaw
+import jaawnet
+from jaaw import QtWidgets, QtCore, QtGui
+
+
+@pytest.fixture(scope="session")
+def app():
+    # Web engine may be loaded later on (see web fixture), which needs this before application is created. Chromium
+    # refuses to run its sandbox as root (e.g. CI containers)
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        os.environ.setdefault("QTWEBENGINE_DISABLE_SANDBOX", "1")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+
+
+@pytest.fixture
+def spin(app):
+    # Runs event loop until condition is met (or timeout, in seconds, expires). Returns condition result
+    def spinUntil(condition=lambda: False, timeout=5):
+        end = time.monotonic() + timeout
+        while not condition() and time.monotonic() < end:
+            app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+            time.sleep(0.005)
+        return condition()
+    return spinUntil
+
+
+class HeadlessWindow(jaaw.Window):
+    # There is no desktop to attach to when running offscreen, and nobody to close message boxes
+
+    def __init__(self):
+        self.warnings = []
+        jaaw.Window.__init__(self)
+
+    def sendBehind(self):
+        pass
+
+    def showWarning(self, msg):
+        self.warnings.append(msg)
+
+
+@pytest.fixture
+def config(app, tmp_path, monkeypatch):
+    # Settings and caches go to a temporary folder, so user's ones are never touched. Offscreen platform has no
+    # desktop (nor work area) at all
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(jaaw, "_IS_MACOS", False)
+    monkeypatch.setattr(jaaw.pywinctl, "getWorkArea", lambda: (0, 0, 800, 600))
+    with open(os.path.join(os.path.dirname(os.path.abspath(jaaw.__file__)), "resources", "settings.json"),
+              encoding="UTF-8") as file:
+        config = json.load(file)
+    config.update({"pause_when_hidden": False, "img_size_mode": jaaw._FIT, "img_period": 3600,
+                   "chrome_last": "", "bing_last": ""})
+    return config
+
+
+@pytest.fixture
+def window(config, spin):
+    # Creates Window with given settings changes, and waits for its content to start
+    windows = []
+
+    def makeWindow(**changes):
+        config.update(changes)
+        with open(jaaw._SETTINGS_FILE, "w", encoding="UTF-8") as file:
+            json.dump(config, file, indent=4)
+        win = HeadlessWindow()
+        win.show()
+        spin(lambda: win.contentStarted)
+        windows.append(win)
+        return win
+
+    yield makeWindow
+    for win in windows:
+        win.closeAll()
+
+
+@pytest.fixture
+def images(tmp_path):
+    folder = os.path.join(str(tmp_path), "images")
+    os.makedirs(folder)
+    files = []
+    for i, color in enumerate((QtCore.Qt.red, QtCore.Qt.green, QtCore.Qt.blue)):
+        image = QtGui.QImage(320, 240, QtGui.QImage.Format_RGB32)
+        image.fill(color)
+        files.append(os.path.join(folder, "img%03d.jpg" % i))
+        image.save(files[-1])
+    return files
+
+
+@pytest.fixture
+def server():
+    # Local stand-in for the web hosts (see benchmark.StandInServer)
+    import benchmark
+    server = benchmark.StandInServer(benchmark.makeServerImages(4, 64, 48), delay=3.0)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fetcher(app, tmp_path, monkeypatch):
+    # Web store goes to cache folder under current one
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(jaaw, "_IS_MACOS", False)
+    fetcher = jaawnet.WebFetcher(jaaw.getCacheFolder("web"), jaaw.importWebutils)
+    fetcher.results = []
+    fetcher.imgFetched.connect(lambda mode, path, fresh: fetcher.results.append((mode, path, fresh)))
+    fetcher.fetchFailed.connect(lambda mode: fetcher.results.append((mode, None, False)))
+    yield fetcher
+    fetcher.cancel()
+
+
+@pytest.fixture
+def web(server, monkeypatch):
+    # Web pages and YouTube player come from the stand-in server. Tests using it are reported as skipped (pytest -rs)
+    # where QtWebEngine can't be loaded
+    try:
+        importlib.import_module("PyQt5.QtWebEngineWidgets")
+    except ImportError as e:
+        pytest.skip("QtWebEngine not available: %s" % e)
+    monkeypatch.setattr(jaaw, "_YT_API_URL", server.baseUrl + "/yt/iframe_api.js")
+    return server
@@ -0,0 +1,38 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+
+import jaaw
+import jaawnet
+
+
+def test_race_is_won_by_first_download(fetcher, server, spin):
+    # Slow and missing candidates go first, but they must not delay the good one
+    urls = ["%s/slow/0.jpg" % server.baseUrl, "%s/missing/1.jpg" % server.baseUrl, server.imageUrl(2)]
+    start = time.monotonic()
+    fetcher.race(jaawnet.CHROMEMODE, urls)
+    assert spin(lambda: fetcher.results, timeout=server.delay * 2)
+    assert time.monotonic() - start < server.delay
+
+    mode, path, fresh = fetcher.results[0]
+    assert (mode, fresh) == (jaawnet.CHROMEMODE, True)
+    with open(path, "rb") as file:
+        assert file.read() == server.images[2]
+
+
+def test_chrome_catalog_is_fetched_without_blocking(fetcher, server, spin, monkeypatch):
+    monkeypatch.setattr(jaaw, "_CHROME_CATALOG_URL", server.baseUrl + "/catalog.json")
+    fetcher.fetchChrome(jaaw._CHROME_CATALOG_URL)
+    # Nothing is downloaded until event loop runs
+    assert not fetcher.results
+    assert spin(lambda: fetcher.results)
+    assert fetcher.results[0][2]
+    assert len(fetcher.chromeImages) == server.catalogSize
+
+
+def test_race_fails_when_nothing_was_downloaded_before(fetcher, server, spin):
+    server.failing = True
+    fetcher.race(jaawnet.BINGMODE, [server.imageUrl(0), server.imageUrl(1)])
+    assert spin(lambda: fetcher.results)
+    assert fetcher.results == [(jaawnet.BINGMODE, None, False)]
@@ -0,0 +1,44 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import benchmark
+import jaawimages
+from jaawimages import QtCore
+
+# Full decode of this photo takes 6000 * 4000 * 4 bytes (~92 MB)
+_PHOTO_SIZE = (6000, 4000)
+_TARGET_SIZE = (800, 600)
+
+
+@pytest.fixture(scope="module")
+def photo(tmp_path_factory):
+    path = os.path.join(str(tmp_path_factory.mktemp("photo")), "photo.jpg")
+    benchmark.makeImage(path, _PHOTO_SIZE[0], _PHOTO_SIZE[1], 0)
+    return path
+
+
+def test_read_image_decodes_at_target_size(app, photo):
+    memory = benchmark.MemoryProbe()
+    memory.reset()
+    if not memory.resettable:
+        pytest.skip("peak memory can't be measured (no resettable VmHWM)")
+
+    width, height = _TARGET_SIZE
+    rss = memory.mark()
+    image = jaawimages.readImage(photo, width, height, QtCore.Qt.KeepAspectRatioByExpanding)
+    peak = memory.getPeakSince(rss)
+
+    # JPEG is decoded at 1/4 scale and then scaled to the size that covers the target (900x600). Budget is a few
+    # target-sized buffers, far below a full decode
+    assert (image.width(), image.height()) == (900, 600)
+    assert peak < 8 * width * height * 4
+
+
+def test_load_scaled_image_returns_target_size(app, photo):
+    width, height = _TARGET_SIZE
+    image = jaawimages.loadScaledImage(photo, width, height, keepAspectRatio=False)
+    assert (image.width(), image.height()) == _TARGET_SIZE
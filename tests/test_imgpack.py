@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import jaaw
+import jaawpack
+from jaaw import QtGui
+
+
+@pytest.fixture
+def cache(app, tmp_path, monkeypatch):
+    # Packs go to cache folder under current one
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(jaaw, "_IS_MACOS", False)
+
+
+def openPack(images, width=320, height=240):
+    return jaawpack.ImgPack(jaaw.getCacheFolder("packs"), os.path.dirname(images[0]), jaaw._FIT, width, height,
+                            64 * 1024 * 1024)
+
+
+def addImage(pack, path):
+    pack.add(path, QtGui.QImage(path))
+    pack.flush()
+
+
+def color(pixmap):
+    return QtGui.QColor(pixmap.toImage().pixel(10, 10)).getRgb()[:3]
+
+
+def test_pixmaps_outlive_pack_mapping(cache, images):
+    pack = openPack(images)
+    addImage(pack, images[0])
+    red = pack.getPixmap(images[0])
+    expected = color(red)
+    assert expected[0] > 200 and expected[1] < 50
+
+    # Pack grows, so it is mapped again to read the new frame
+    addImage(pack, images[1])
+    assert pack.getPixmap(images[1]) is not None
+    assert color(red) == expected
+
+    pack.close()
+    assert color(red) == expected
+
+    pack = openPack(images)
+    assert color(pack.getPixmap(images[0])) == expected
+    pack.close()
+
+
+def test_each_resolution_keeps_its_own_pack(cache, images):
+    pack = openPack(images)
+    addImage(pack, images[0])
+    pack.close()
+
+    other = openPack(images, 640, 480)
+    assert not other.contains(images[0])
+    addImage(other, images[1])
+    other.close()
+
+    pack = openPack(images)
+    assert pack.contains(images[0]) and not pack.contains(images[1])
+    pack.close()
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import socket
+
+import pytest
+
+import jaawnet
+
+
+@pytest.fixture
+def reachability(app):
+    reachability = jaawnet.Reachability(ttl=300, timeout=2000)
+    reachability.answers = []
+    reachability.probed.connect(lambda url, reachable: reachability.answers.append((url, reachable)))
+    return reachability
+
+
+def probe(reachability, spin, url, force=False):
+    reachability.answers = []
+    reachability.probe(url, force)
+    assert spin(lambda: reachability.answers)
+    return reachability.answers[0][1]
+
+
+def test_answersare_cached(reachability, server, spin):
+    url = server.pageUrl(0)
+    assert reachability.status(url) is None
+    assert probe(reachability, spin, url)
+
+    # Within ttl, host is not asked again, and the answer is given right away
+    server.failing = True
+    reachability.probe(url)
+    assert reachability.answers[-1] == (url, True) and not reachability.inFlight
+    assert reachability.status(url) is True
+
+    assert not probe(reachability, spin, url, force=True)
+
+
+def test_expired_answersare_probed_again(reachability, server, spin):
+    url = server.pageUrl(1)
+    reachability.ttl = 0
+    assert probe(reachability, spin, url)
+    server.failing = True
+    assert reachability.status(url) is None
+    assert not probe(reachability, spin, url)
+
+
+def test_missing_pages_and_hosts_are_unreachable(reachability, server, spin):
+    assert not probe(reachability, spin, server.baseUrl + "/nothing/here.html")
+
+    # Nobody listening on a port which was free a moment ago
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    assert not probe(reachability, spin, "http://127.0.0.1:%d/" % port)
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import jaaw
+from jaaw import QtCore, QtGui, QtWidgets
+
+
+class StubVideoWidget(QtWidgets.QWidget):
+
+    def clear(self):
+        pass
+
+
+class StubVideoPlayer(QtCore.QObject):
+    # Stands in for jaawvideo.GaplessPlayer, recording what Window asks it to do
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+
+        self.items = []
+        self.targets = []
+        self.loads = 0
+        self.paused = False
+
+    def setTarget(self, width, height, aspectMode):
+        self.targets.append((width, height, aspectMode))
+
+    def setItems(self, items):
+        self.items = list(items)
+        self.loads += 1
+
+    def isStarted(self):
+        return bool(self.items)
+
+    def isPlaying(self):
+        return self.isStarted() and not self.paused
+
+    def play(self):
+        self.paused = False
+
+    def pause(self):
+        self.paused = True
+
+    def stop(self):
+        self.items = []
+
+
+@pytest.fixture
+def stubVideo(monkeypatch):
+    # Video backend is replaced, so no QtMultimedia (nor video file) is needed
+    def getVideoBackend(self):
+        if self.videoPlayer is None:
+            self.videoWidget = StubVideoWidget()
+            self.addBackendWidget(self.videoWidget)
+            self.videoPlayer = StubVideoPlayer(self)
+        self.activeBackends.add("video")
+        return self.videoPlayer
+    monkeypatch.setattr(jaaw.Window, "getVideoBackend", getVideoBackend)
+
+
+def applySettings(win, **changes):
+    # Same path as the tray menu (see Window.reloadSettings), but returning which backends were touched
+    win.menu.config.update(changes)
+    win.menu.saveSettings(reload=False)
+    win.loadSettings()
+    return win.reconfigure(win.appliedConfig, win.config)
+
+
+def test_period_change_only_restarts_timer(window, images, spin):
+    win = window(mode=jaaw._IMGMODE, img_mode=jaaw._IMGCAROUSEL, folder=os.path.dirname(images[0]))
+    assert spin(lambda: win.currentImg)
+    shown = win.currentImg
+
+    assert applySettings(win, img_period=60) == ["timer"]
+    assert win.timer.interval() == 60 * 1000
+    assert win.currentImg == shown
+
+
+def test_size_mode_change_only_rescales_image(window, images):
+    win = window(mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=images[0])
+
+    assert applySettings(win, img_size_mode=jaaw._STRETCH) == ["label"]
+    assert win.currentImg == images[0]
+    assert win.bkg_label.pixmap().size() == QtCore.QSize(win.xmax, win.ymax)
+
+
+def test_size_mode_change_only_rescales_video(window, stubVideo, spin):
+    win = window(mode=jaaw._VIDMODE, video_mode=jaaw._VIDLOCAL, video="video.mp4")
+    assert spin(lambda: win.videoPlayer is not None and win.videoPlayer.isStarted())
+    player = win.videoPlayer
+
+    assert applySettings(win, img_size_mode=jaaw._STRETCH) == ["video"]
+    assert player.targets[-1] == (win.xmax, win.ymax, QtCore.Qt.IgnoreAspectRatio)
+    assert player.loads == 1
+
+
+def test_video_change_switches_in_place(window, stubVideo, spin):
+    win = window(mode=jaaw._VIDMODE, video_mode=jaaw._VIDLOCAL, video="video.mp4")
+    assert spin(lambda: win.videoPlayer is not None and win.videoPlayer.isStarted())
+    player = win.videoPlayer
+
+    assert applySettings(win, video="other.mp4") == ["video"]
+    assert win.videoPlayer is player and player.items == [("other.mp4", None)]
+
+
+def test_content_change_restarts(window, images, spin):
+    win = window(mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=images[0])
+
+    assert applySettings(win, img=images[1]) == ["restart"]
+    assert win.currentImg == images[1]
+
+    assert applySettings(win, img_mode=jaaw._IMGCAROUSEL, folder=os.path.dirname(images[0])) == ["restart"]
+    assert win.timer.isActive()
+    assert spin(lambda: win.currentImg in images)
+
+
+def test_only_images_go_to_secondary_screens(window, images, stubVideo, monkeypatch):
+    # Offscreen platform has a single screen, so it also stands in for a secondary one
+    monkeypatch.setattr(jaaw.Window, "getSecondaryScreens", lambda self: [QtGui.QGuiApplication.primaryScreen()])
+    win = window(mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=images[0])
+    assert len(win.surfaces) == 1
+    assert not list(win.surfaces.values())[0].label.pixmap().isNull()
+
+    applySettings(win, mode=jaaw._VIDMODE, video_mode=jaaw._VIDLOCAL, video="video.mp4")
+    win.updateScreens()
+    assert not win.surfaces
+
+    applySettings(win, mode=jaaw._IMGMODE)
+    win.updateScreens()
+    assert len(win.surfaces) == 1
+
+    win.menu.toggleAllScreens()
+    assert not win.surfaces and not win.menu.config["all_screens"]
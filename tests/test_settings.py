@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+import jaaw
+import jaawsettings
+
+
+@pytest.fixture
+def store(config):
+    return jaawsettings.SettingsStore(jaaw._SETTINGS_FILE, jaaw._DEFAULT_SETTINGS_FILE)
+
+
+def writeSettings(text):
+    with open(jaaw._SETTINGS_FILE, "w", encoding="UTF-8") as file:
+        file.write(text)
+
+
+def test_unreadable_file_falls_back_to_bundled_settings(store):
+    writeSettings("{ not json")
+    config = store.load()
+    with open(store.defaultFile, encoding="UTF-8") as file:
+        assert config == json.load(file)
+
+
+def test_no_settings_at_all_falls_back_to_built_in_defaults(store):
+    writeSettings("[]")
+    store.defaultFile = "missing.json"
+    config = store.load()
+    assert store.isValid(config) and config["mode"] == jaaw._IMGMODE
+
+
+def test_invalid_values_are_replaced_or_dropped(store, config):
+    config.update({"img_period": "sixty", "img_pack_mb": "512", "web_parallel": 2.0, "img_cache_mb": "lots",
+                   "img_pack": "yes", "url_pool_size": None, "video_playlist": "video.mp4"})
+    writeSettings(json.dumps(config))
+    loaded = store.load()
+
+    with open(store.defaultFile, encoding="UTF-8") as file:
+        assert loaded["img_period"] == json.load(file)["img_period"]
+    assert (loaded["img_pack_mb"], loaded["web_parallel"]) == (512, 2)
+    for key in ("img_cache_mb", "img_pack", "url_pool_size", "video_playlist"):
+        assert key not in loaded
+    assert store.isValid(loaded)
+
+
+def test_window_starts_with_invalid_settings(window, images):
+    win = window(mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=images[0], img_pack_mb="big", idle_pause_secs=[],
+                 metrics_interval_secs="30")
+    assert win.currentImg == images[0]
+    assert win.imgPackBudget == 1024 * 1024 * 1024 and win.metricsTimer.interval() == 30 * 1000
@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+
+import jaaw
+from jaaw import QtCore, QtGui
+
+_TIMEOUT = 30
+
+
+def switchTo(win, **changes):
+    win.menu.config.update(changes)
+    win.menu.saveSettings()
+
+
+def getSnapshots(win, ok):
+    return win.metrics.getHistogram("jaaw_web_load_ms", page="snapshot", ok=ok)["count"]
+
+
+def test_page_is_shown_as_snapshot(window, web, spin):
+    url = web.pageUrl(0)
+    win = window(mode=jaaw._WEBMODE, web_mode=jaaw._URLMODE, url=[url], url_index=0, url_snapshot=True)
+    snapshot = win.getSnapshotPath(url)
+    assert spin(lambda: win.currentImg == snapshot, timeout=_TIMEOUT)
+    assert os.path.isfile(snapshot) and getSnapshots(win, "true") == 1
+
+    # Renderer only lives while taking the snapshot, and no web view is ever created
+    assert spin(lambda: not win.snapshotter.isBusy())
+    assert win.webView is None and "web" not in win.activeBackends
+    assert win.snapshotTimer.isActive()
+
+
+def test_last_snapshot_is_kept_when_page_fails(window, web, images, spin):
+    # Nobody listening on a port which was free a moment ago
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    url = "http://127.0.0.1:%d/" % sock.getsockname()[1]
+    sock.close()
+
+    win = window(mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=images[0])
+    snapshot = win.getSnapshotPath(url)
+    image = QtGui.QImage(win.xmax, win.ymax, QtGui.QImage.Format_RGB32)
+    image.fill(QtCore.Qt.yellow)
+    image.save(snapshot)
+
+    switchTo(win, mode=jaaw._WEBMODE, web_mode=jaaw._URLMODE, url=[url], url_index=0, url_snapshot=True)
+    assert spin(lambda: win.currentImg == snapshot)
+    assert spin(lambda: getSnapshots(win, "false") == 1, timeout=_TIMEOUT)
+    assert win.currentImg == snapshot and not win.warnings
+    assert win.snapshotTimer.isActive()
@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import benchmark
+import jaaw
+
+
+def test_image_mode_never_loads_web_engine(window, images, spin, monkeypatch):
+    # Another test may have already imported it
+    monkeypatch.setattr(jaaw, "QtWebEngineWidgets", None)
+    win = window(mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=images[0])
+    assert win.currentImg == images[0]
+
+    # Give any deferred work (e.g. warmups queued after first paint) the chance to run
+    spin(timeout=1)
+    assert win.activeBackends == {"label"}
+    assert win.webView is None and win.videoPlayer is None
+    assert jaaw.QtWebEngineWidgets is None
+    assert benchmark.getWebEngineProcesses() == 0
+
+
+def runStartupProfile(config, **changes):
+    # Real startup, as run from command line, in its own process (so nothing is imported by other tests)
+    config.update(changes)
+    with open(jaaw._SETTINGS_FILE, "w", encoding="UTF-8") as file:
+        json.dump(config, file, indent=4)
+    # Another user name, so an instance already running (see jaawctl.getServerName) does not make it quit
+    user = "jaaw-test-%d" % os.getpid()
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", LOGNAME=user, USER=user)
+    result = subprocess.run([sys.executable, os.path.abspath(jaaw.__file__), "--startup-profile"], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60, universal_newlines=True)
+    assert result.returncode == 0, result.stderr
+    output = result.stdout
+    return json.loads(output[output.index("{"):output.rindex("}") + 1])
+
+
+def test_image_startup_skips_heavy_imports(config, images):
+    profile = runStartupProfile(config, mode=jaaw._IMGMODE, img_mode=jaaw._IMGFIXED, img=images[0])
+    assert profile["mode"] == jaaw._IMGMODE
+    assert profile["heavy_modules"] == []
+    steps = profile["startup_ms"]
+    assert "first paint" in steps
+    assert not [step for step in steps if step in ("import QtMultimedia", "import QtWebEngineWidgets")]
+
+
+def test_video_startup_paints_before_heavy_imports(config, images):
+    try:
+        importlib.import_module("PyQt5.QtMultimedia")
+    except ImportError as e:
+        pytest.skip("QtMultimedia not available: %s" % e)
+    profile = runStartupProfile(config, mode=jaaw._VIDMODE, video_mode=jaaw._VIDLOCAL, video=images[0])
+    steps = list(profile["startup_ms"].keys())
+    assert "PyQt5.QtMultimedia" in profile["heavy_modules"]
+    assert steps.index("first paint") < steps.index("import QtMultimedia")
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+
+import pytest
+
+import jaawvisibility
+
+
+class StubProvider(jaawvisibility.VisibilityProvider):
+
+    def __init__(self, name, active=False):
+
+        self.name = name
+        self.active = active
+        self.calls = 0
+
+    def isActive(self):
+        self.calls += 1
+        if isinstance(self.active, Exception):
+            raise self.active
+        return self.active
+
+
+def makePolicy(providers):
+    policy = jaawvisibility.VisibilityPolicy(providers)
+    events = []
+    policy.paused.connect(lambda reasons: events.append(("paused", reasons)))
+    policy.resumed.connect(lambda: events.append(("resumed",)))
+    return policy, events
+
+
+def test_pauses_while_any_provider_is_active(app):
+    occluded, idle = StubProvider("occluded"), StubProvider("idle")
+    policy, events = makePolicy([occluded, idle])
+
+    policy.check()
+    assert events == [] and not policy.isPaused
+
+    occluded.active = idle.active = True
+    policy.check()
+    policy.check()
+    assert events == [("paused", "occluded, idle")] and policy.isPaused
+
+    idle.active = False
+    policy.check()
+    assert events == [("paused", "occluded, idle")] and policy.reasons == ["occluded"]
+
+    occluded.active = False
+    policy.check()
+    assert events == [("paused", "occluded, idle"), ("resumed",)] and not policy.isPaused
+
+
+def test_failing_provider_is_not_asked_again(app):
+    broken, locked = StubProvider("broken", OSError("not supported")), StubProvider("locked", True)
+    policy, events = makePolicy([broken, locked])
+
+    policy.check()
+    policy.check()
+    assert broken.calls == 1 and locked.calls == 2
+    assert events == [("paused", "locked")]
+
+
+def test_disabling_policy_resumes(app):
+    idle = StubProvider("idle", True)
+    policy, events = makePolicy([idle])
+
+    policy.check()
+    policy.setEnabled(False)
+    assert events == [("paused", "idle"), ("resumed",)] and not policy.isPaused
+
+
+def test_command_probe_does_not_block(spin):
+    probe = jaawvisibility.CommandProbe(sys.executable, ["-c", "import time; time.sleep(0.5); print('yes')"])
+
+    start = time.perf_counter()
+    assert probe.poll() is None
+    assert time.perf_counter() - start < 0.2
+
+    assert spin(lambda: probe.output is not None)
+    assert probe.output.strip() == "yes"
+
+
+def test_command_probe_kills_slow_commands(spin):
+    probe = jaawvisibility.CommandProbe(sys.executable, ["-c", "import time; time.sleep(30)"], timeout=200)
+
+    probe.poll()
+    assert spin(lambda: probe.process is None)
+    assert probe.output is None
+
+
+def test_command_probe_fails_for_missing_commands(spin):
+    probe = jaawvisibility.CommandProbe("jaaw-no-such-command", [])
+
+    probe.poll()
+    assert spin(lambda: probe.error)
+    with pytest.raises(OSError):
+        probe.poll()
+
+
+class StubWindow:
+
+    xmax = 800
+    ymax = 600
+
+    def winId(self):
+        return 1
+
+    def windowTitle(self):
+        return "Jaaw!"
+
+
+class StubDesktopWindow:
+
+    def __init__(self, title, left, top, right, bottom, maximized=False):
+
+        self.title = title
+        self.left, self.top, self.right, self.bottom = left, top, right, bottom
+        self.isMaximized = maximized
+        self.isVisible = True
+        self.isMinimized = False
+
+    def getHandle(self):
+        return hash(self.title)
+
+
+def test_occlusion_is_scanned_off_gui_thread(spin, monkeypatch):
+    windows = [StubDesktopWindow("Editor", 100, 100, 400, 300)]
+
+    def getAllWindows():
+        time.sleep(0.3)
+        return list(windows)
+    monkeypatch.setattr(jaawvisibility.pywinctl, "getAllWindows", getAllWindows, raising=False)
+    provider = jaawvisibility.OcclusionProvider(StubWindow())
+
+    start = time.perf_counter()
+    assert not provider.isActive()
+    assert time.perf_counter() - start < 0.2
+    assert spin(lambda: not provider.scanning)
+    assert not provider.isActive()
+    assert spin(lambda: not provider.scanning)
+
+    # Answer comes with next check
+    windows.append(StubDesktopWindow("Browser", 0, 0, 800, 600))
+    assert not provider.isActive()
+    assert spin(lambda: not provider.scanning)
+    assert provider.isActive()
+
+
+def test_occlusion_scan_errors_disable_provider(spin, monkeypatch):
+    def getAllWindows():
+        raise NotImplementedError("no window manager")
+    monkeypatch.setattr(jaawvisibility.pywinctl, "getAllWindows", getAllWindows, raising=False)
+    provider = jaawvisibility.OcclusionProvider(StubWindow())
+    policy, events = makePolicy([provider])
+
+    policy.check()
+    assert spin(lambda: not provider.scanning)
+    policy.check()
+    assert provider in policy.failed and events == []
@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import jaaw
+
+_TIMEOUT = 30
+
+
+def switchTo(win, **changes):
+    win.menu.config.update(changes)
+    win.menu.saveSettings()
+
+
+def getWebLoads(win, **match):
+    return win.metrics.getHistogram("jaaw_web_load_ms", page="url", **match)["count"]
+
+
+def isPreloaded(win, url):
+    # Pages are frozen once loaded
+    page = win.webPool.pages.get(win.webPool.getKey(url), None) if win.webPool is not None else None
+    return page is not None and \
+        page.lifecycleState() == jaaw.QtWebEngineWidgets.QWebEnginePage.LifecycleState.Frozen
+
+
+def test_saved_pages_are_swapped_in_from_pool(window, web, spin):
+    urls = [web.pageUrl(0), web.pageUrl(1)]
+    win = window(mode=jaaw._WEBMODE, web_mode=jaaw._URLMODE, url=urls, url_index=0, url_snapshot=False,
+                 url_pool_size=2)
+    assert spin(lambda: getWebLoads(win, source="load", ok="true") == 1, timeout=_TIMEOUT)
+    assert spin(lambda: isPreloaded(win, urls[1]), timeout=_TIMEOUT)
+    page = win.webPool.pages[win.webPool.getKey(urls[1])]
+
+    switchTo(win, url_index=1)
+    assert spin(lambda: getWebLoads(win, source="pool") == 1)
+    assert win.webView.page() is page
+
+    # Page just replaced is kept, so switching back is instant too
+    assert spin(lambda: isPreloaded(win, urls[0]))
+    switchTo(win, url_index=0)
+    assert spin(lambda: getWebLoads(win, source="pool") == 2)
+    assert getWebLoads(win, source="load") == 1
+    assert win.webPool.stats()["hits"] == 2
+
+
+def test_pool_size_bounds_preloaded_pages(window, web, spin):
+    urls = [web.pageUrl(i) for i in range(4)]
+    win = window(mode=jaaw._WEBMODE, web_mode=jaaw._URLMODE, url=urls, url_index=0, url_snapshot=False,
+                 url_pool_size=1)
+    assert spin(lambda: isPreloaded(win, urls[1]), timeout=_TIMEOUT)
+    assert list(win.webPool.pages.keys()) == [win.webPool.getKey(urls[1])]
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+
+import jaaw
+import jaawnet
+
+
+def fetch(fetcher, spin, mode, urls):
+    fetcher.results = []
+    fetcher.race(mode, urls)
+    assert spin(lambda: fetcher.results)
+    return fetcher.results[0]
+
+
+def test_downloads_are_revalidated(fetcher, server, spin):
+    url = server.imageUrl(1)
+    _, path, fresh = fetch(fetcher, spin, jaawnet.BINGMODE, [url])
+    assert fresh and fetcher.store.stats()["misses"] == 1
+    assert fetcher.store.validators(url)[0]
+
+    # Server answers "304 Not Modified": same file, nothing written
+    _, again, fresh = fetch(fetcher, spin, jaawnet.BINGMODE, [url])
+    assert fresh and again == path
+    stats = fetcher.store.stats()
+    assert (stats["hits"], stats["misses"], stats["objects"]) == (1, 1, 1)
+
+
+def test_same_image_from_other_url_is_stored_once(fetcher, server, spin):
+    # Images repeat every len(server.images) indexes
+    _, path, _ = fetch(fetcher, spin, jaawnet.CHROMEMODE, [server.imageUrl(0)])
+    _, other, _ = fetch(fetcher, spin, jaawnet.CHROMEMODE, [server.imageUrl(len(server.images))])
+    assert other == path
+    assert fetcher.store.stats()["objects"] == 1
+
+
+def test_offline_fallback_uses_history(fetcher, server, spin):
+    _, path, _ = fetch(fetcher, spin, jaawnet.CHROMEMODE, [server.imageUrl(0)])
+    server.failing = True
+    mode, offline, fresh = fetch(fetcher, spin, jaawnet.CHROMEMODE, [server.imageUrl(1), server.imageUrl(2)])
+    assert (mode, offline, fresh) == (jaawnet.CHROMEMODE, path, False)
+
+    # History is kept per mode
+    assert fetch(fetcher, spin, jaawnet.BINGMODE, [server.imageUrl(1)]) == (jaawnet.BINGMODE, None, False)
+
+
+def test_store_survives_restart(fetcher, server, spin):
+    url = server.imageUrl(3)
+    _, path, _ = fetch(fetcher, spin, jaawnet.BINGMODE, [url])
+    store = jaawnet.WebStore(jaaw.getCacheFolder("web"))
+    assert store.get(url) == path and os.path.isfile(path)
+    assert store.latest(jaawnet.BINGMODE) == path
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import jaaw
+
+# Page loading and web engine startup may be slow on CI machines
+_TIMEOUT = 30
+
+
+def ytUrls(*videoIds):
+    return ["https://youtube.com/watch?v=%s" % videoId for videoId in videoIds]
+
+
+def isPlaying(win, videoId):
+    return win.ytPlayer is not None and win.ytPlayer.isPlaying() and win.ytPlayer.videoId == videoId
+
+
+def switchTo(win, **changes):
+    # Same path as the tray menu
+    win.menu.config.update(changes)
+    win.menu.saveSettings()
+
+
+def test_videos_are_switched_in_place(window, web, spin):
+    win = window(mode=jaaw._VIDMODE, video_mode=jaaw._VIDYT, yt_url=ytUrls("stubA", "stubB"), yt_index=0)
+    assert spin(lambda: isPlaying(win, "stubA"), timeout=_TIMEOUT)
+    player, view, page = win.ytPlayer, win.ytView, win.ytView.page()
+    pageLoads = []
+    view.loadStarted.connect(lambda: pageLoads.append(True))
+
+    switchTo(win, yt_index=1)
+    assert spin(lambda: isPlaying(win, "stubB"), timeout=_TIMEOUT)
+    assert win.ytPlayer is player and win.ytView is view and view.page() is page
+    assert not pageLoads
+    assert win.metrics.getHistogram("jaaw_web_load_ms", page="youtube", ok="true")["count"] == 2
+
+
+def test_failed_video_falls_back_to_default(window, web, spin):
+    win = window(mode=jaaw._VIDMODE, video_mode=jaaw._VIDYT, yt_url=ytUrls("badVideo"), yt_index=0)
+    assert spin(lambda: isPlaying(win, jaaw._YT_DEFAULT), timeout=_TIMEOUT)
+    assert win.warnings == [jaaw._YT_WARNING]
+
+
+def test_player_is_loaded_again_once_api_is_reachable(window, web, spin, monkeypatch):
+    monkeypatch.setattr(jaaw, "_YT_RETRY_SECS", (1, 1))
+    web.failing = True
+    win = window(mode=jaaw._VIDMODE, video_mode=jaaw._VIDYT, yt_url=ytUrls("stubA"), yt_index=0)
+    assert spin(lambda: win.ytRetrying, timeout=_TIMEOUT)
+    assert not win.ytPlayer.isPlaying()
+
+    web.failing = False
+    assert spin(lambda: isPlaying(win, "stubA"), timeout=_TIMEOUT)
+
+
+def test_player_without_quality_control_is_logged(window, web, spin, caplog):
+    # Stand-in player has no setPlaybackQuality() for these videos (and no iframe to ask instead)
+    win = window(mode=jaaw._VIDMODE, video_mode=jaaw._VIDYT, yt_url=ytUrls("noqualityA"), yt_index=0,
+                 yt_adaptive_quality=True)
+    assert spin(lambda: isPlaying(win, "noqualityA"), timeout=_TIMEOUT)
+    assert spin(lambda: not win.ytPlayer.canSetQuality)
+    assert [record for record in caplog.records if "no way to set playback quality" in record.getMessage()]